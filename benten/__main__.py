@@ -7,8 +7,11 @@ import pathlib
 from .configuration import Configuration
 
 from benten.version import __version__
-from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter, TCPReadWriter
+from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter, TCPReadWriter, codec
 from benten.langserver.server import LangServer
+from benten.langserver import prefork
+from benten.code import fastyaml
+from benten.code.yaml import loaders
 
 from cwlformat.version import __version__ as __cwl_fmt_version__
 from ruamel.yaml import __version__ as __ruamel_version__
@@ -58,6 +61,29 @@ def main():
         "--mode", default="stdio", help="communication (stdio|tcp)")
     parser.add_argument(
         "--addr", default=4389, help="server listen (tcp)", type=int)
+    parser.add_argument(
+        "--preload", nargs="*", default=[], metavar="CWL_VERSION",
+        help="CWL versions to load in the background after the client initializes. "
+             "Others are loaded when first needed")
+    parser.add_argument(
+        "--analysis-delay", default=300, type=int, metavar="MS",
+        help="wait this long after the last change before re-analyzing a document")
+    parser.add_argument(
+        "--analysis-workers", default=2, type=int, metavar="N",
+        help="number of threads analyzing documents")
+    parser.add_argument(
+        "--full-analysis", action="store_true",
+        help="re-analyze every workflow step after each change, even unchanged ones")
+    parser.add_argument(
+        "--yaml-loader", default="fast", choices=loaders,
+        help="YAML loader for the analysis. 'fast' needs PyYAML, 'rt' is ruamel's round trip loader")
+    parser.add_argument(
+        "--message-loop", default="threads", choices=["threads", "asyncio"],
+        help="read and handle messages on threads, or read them on an asyncio event loop")
+    parser.add_argument(
+        "--workers", default=0, type=int, metavar="N",
+        help="tcp: serve connections on N forked processes sharing the language models. "
+             "0 serves them all on threads of one process")
     parser.add_argument("--debug", action="store_true")
 
     args = parser.parse_args()
@@ -68,17 +94,46 @@ def main():
     logger.info(f"Benten {__version__}: CWL Language Server from Rabix (Seven Bridges)")
     logger.info(f"ruamel.yaml: {__ruamel_version__}")
     logger.info(f"cwl-format: {__cwl_fmt_version__}")
-
+    if fastyaml.available():
+        logger.info(f"PyYAML: {fastyaml.pyyaml.__version__} (libyaml: {fastyaml.pyyaml.__with_libyaml__})")
+    logger.info(f"JSON codec: {codec.name}")
+
+    config.preload_versions = args.preload
+    config.analysis_delay = args.analysis_delay / 1000
+    config.analysis_workers = args.analysis_workers
+    config.incremental_analysis = not args.full_analysis
+    config.yaml_loader = args.yaml_loader
+    config.workers = args.workers
+    if config.yaml_loader == "fast" and not fastyaml.available():
+        logger.warning("PyYAML is not installed, using the round trip YAML loader")
+        config.yaml_loader = "rt"
     config.initialize()
 
-    if args.mode == "stdio":
+    if args.message_loop == "asyncio":
+        import asyncio
+        from benten.langserver.aioserver import serve_stdio, serve_tcp
+
+        if args.mode == "stdio":
+            logger.info("Reading on stdin, writing on stdout (asyncio)")
+            asyncio.run(serve_stdio(config))
+        elif args.mode == "tcp":
+            logger.info("Accepting TCP connections on %s:%s (asyncio)", "0.0.0.0", args.addr)
+            asyncio.run(serve_tcp(config, "0.0.0.0", args.addr))
+    elif args.mode == "stdio":
         logger.info("Reading on stdin, writing on stdout")
         s = LangServer(
             conn=JSONRPC2Connection(ReadWriter(sys.stdin.buffer, sys.stdout.buffer)),
             config=config)
         s.run()
+    elif args.mode == "tcp" and config.workers > 0 and prefork.available():
+        host, addr = "0.0.0.0", args.addr
+        logger.info("Accepting TCP connections on %s:%s with %s workers", host, addr, config.workers)
+        LangserverTCPTransport.config = config
+        prefork.PreforkServer(config, host, addr, config.workers, LangserverTCPTransport).serve_forever()
     elif args.mode == "tcp":
         host, addr = "0.0.0.0", args.addr
+        if config.workers > 0:
+            logger.warning("Forked workers are not available on this platform, using threads")
         logger.info("Accepting TCP connections on %s:%s", host, addr)
         ForkingTCPServer.allow_reuse_address = True
         ForkingTCPServer.daemon_threads = True
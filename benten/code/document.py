@@ -1,16 +1,21 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+from typing import List, Tuple
 import time
 import pathlib
+import threading
 
 from .yaml import parse_yaml
+from .textbuffer import TextBuffer, split_lines
 from .intelligence import Intelligence
 from .intelligencecontext import IntelligenceContext
+from .remotefetcher import remote_fetcher
+from .stepreuse import StepReuse
 from ..cwl.specification import latest_published_cwl_version, process_types
 from ..cwl.typeinference import infer_type
 from .symbols import extract_symbols, extract_step_symbols
 from .workflowgraph import cwl_graph
-from ..langserver.lspobjects import Position
+from ..langserver.lspobjects import Position, Range
 
 import logging
 logger = logging.getLogger(__name__)
@@ -23,59 +28,167 @@ class Document:
                  scratch_path: pathlib.Path,  # Needed for ExecutionContext's example input file
                  text: str,
                  version: int,
-                 type_dicts: dict):
+                 type_dicts: dict,
+                 analyze: bool = True,
+                 wait_for_remote: bool = True,
+                 incremental: bool = True,
+                 yaml_loader: str = "rt"):
         self.doc_uri = doc_uri
         self.config = scratch_path
-        self.text = text
+        self.buffer = TextBuffer(text)
         self.version = version
         self.type_dicts = type_dicts
+        # If False, remote linked files that have not been fetched yet are
+        # skipped and the caller re-analyzes the document when they arrive
+        self.wait_for_remote = wait_for_remote
+        # If True, unchanged workflow steps are taken over from the previous analysis
+        self.incremental = incremental
+        # See code.yaml.loaders
+        self.yaml_loader = yaml_loader
 
         self.problems = None
         self.code_intelligence = None
         self.symbols = None
         self.wf_graph = None
-
-        self.update(text)
-
-    def update(self, new_text):
-        self.text = new_text
-        self.code_intelligence = Intelligence()
-        self.symbols = []
+        # Number of repairs made to the text to load it (see code.yaml.YAMLRecovery)
+        self.yaml_recoveries = 0
+
+        # Edits are counted so that an analysis can be matched to the text it was
+        # run on. For each edit made after the current analysis we keep the first
+        # line it touched: lookups above that line can still use the old analysis
+        self._lock = threading.RLock()
+        self._revision = 0
+        self._analyzed_revision = -1
+        # The latest revision whose analysis raised
+        self._failed_revision = -1
+        self._edits: List[Tuple[int, int]] = []
+
+        # The caller may prefer to run the first analysis elsewhere
+        if analyze:
+            self.update()
+
+    @property
+    def text(self):
+        return self.buffer.text
+
+    def apply_change(self, _range: Range, new_text: str):
+        # Only edits the text. Call update() to re-analyze
+        with self._lock:
+            if _range is None:
+                first_line = _first_changed_line(self.buffer.lines, new_text)
+                self.buffer.set_text(new_text)
+            else:
+                first_line = _range.start.line
+                self.buffer.apply_change(_range, new_text)
+            self._revision += 1
+            self._edits += [(self._revision, first_line)]
+
+    def invalidate(self):
+        """Mark the analysis out of date without touching the text, e.g. when a
+        linked file has changed. The old analysis stays usable until then"""
+        with self._lock:
+            self._revision += 1
+
+    @property
+    def is_stale(self):
+        return self._analyzed_revision < self._revision
+
+    @property
+    def analysis_failed(self):
+        """True if the analysis of the current text was tried and failed"""
+        return self._failed_revision == self._revision
+
+    def analysis_valid_at(self, loc: Position):
+        """True if the current analysis can answer a request at this location
+        despite any edits made after it was run"""
+        with self._lock:
+            if self._analyzed_revision < 0:
+                return False
+            return all(loc.line < first_line for _, first_line in self._edits)
+
+    def update(self, new_text: str = None):
+        with self._lock:
+            if new_text is not None:
+                self.apply_change(None, new_text)
+            text, revision = self.buffer.text, self._revision
+            line_count = self.buffer.line_count
+
+        try:
+            return self._analyze(text, revision, line_count)
+        except Exception:
+            with self._lock:
+                self._failed_revision = max(self._failed_revision, revision)
+            raise
+
+    def _analyze(self, text: str, revision: int, line_count: int):
+        code_intelligence = Intelligence()
+        if self.incremental:
+            previous = self.code_intelligence.step_reuse if self.code_intelligence is not None else None
+            # Lines as the client counts them (see TextBuffer), not as str.splitlines does
+            lines = [line.rstrip("\r\n") for line in split_lines(text)]
+            code_intelligence.step_reuse = StepReuse(lines, previous)
 
         t0 = time.time()
-        cwl, self.problems = parse_yaml(self.text)
+        recoveries = []
+        cwl, problems = parse_yaml(text, loader=self.yaml_loader, recoveries=recoveries)
         t1 = time.time()
         logger.debug(f"Took {t1 - t0:1.3}s to load {self.doc_uri}")
+        if recoveries:
+            logger.debug(f"Repaired YAML of {self.doc_uri}: {', '.join(recoveries)}")
+
+        symbols, wf_graph = [], self.wf_graph
+        if isinstance(cwl, dict):
+            t2 = time.time()
+            code_intelligence.load_namespaces(cwl)
+            code_intelligence.prepare_execution_context(self.doc_uri, cwl, self.config)
+
+            with remote_fetcher.non_blocking(not self.wait_for_remote):
+                self.parse(cwl, code_intelligence, problems)
+            t3 = time.time()
+            logger.debug(f"Took {t3 - t2:1.3}s to parse {self.doc_uri}")
 
-        if not isinstance(cwl, dict):
-            return
+            symbols, wf_graph = self.symbology(cwl, line_count)
 
-        t2 = time.time()
-        self.code_intelligence.load_namespaces(cwl)
-        self.code_intelligence.prepare_execution_context(self.doc_uri, cwl, self.config)
+        # Done here, so lookups made on the message thread don't have to
+        code_intelligence.build_index()
 
-        self.parse(cwl)
-        t3 = time.time()
-        logger.debug(f"Took {t3 - t2:1.3}s to parse {self.doc_uri}")
+        with self._lock:
+            # A slower analysis of older text must not replace a newer one
+            if revision < self._analyzed_revision:
+                return False
 
-        self.symbology(cwl)
+            self.code_intelligence = code_intelligence
+            self.problems = problems
+            self.symbols = symbols
+            self.wf_graph = wf_graph
+            self.yaml_recoveries = len(recoveries)
+            self._analyzed_revision = revision
+            self._edits = [e for e in self._edits if e[0] > revision]
+
+        return True
 
     def definition(self, loc: Position):
+        if self.code_intelligence is None:
+            return None
         de = self.code_intelligence.get_doc_element(loc)
         if de is not None:
             return de.definition()
 
     def completion(self, loc: Position):
+        if self.code_intelligence is None:
+            return None
         de = self.code_intelligence.get_doc_element(loc)
         if de is not None:
             return de.completion()
 
     def hover(self, loc: Position):
+        if self.code_intelligence is None:
+            return None
         de = self.code_intelligence.get_doc_element(loc)
         if de is not None:
             return de.hover()
 
-    def parse(self, cwl):
+    def parse(self, cwl, code_intelligence: Intelligence, problems: list):
         cwl_v = cwl.get("cwlVersion")
         if cwl_v not in self.type_dicts:
             logger.error(f"No language model for cwl version {str(cwl_v)}. "
@@ -83,6 +196,8 @@ class Document:
             cwl_v = latest_published_cwl_version
 
         lm = self.type_dicts.get(cwl_v)
+        if code_intelligence.step_reuse is not None:
+            code_intelligence.step_reuse.cwl_version = cwl_v
         inferred_type = infer_type(
             node=cwl,
             allowed_types=[lm.get(t) for t in process_types])
@@ -90,12 +205,11 @@ class Document:
             doc_uri=self.doc_uri,
             node=cwl,
             intel_context=IntelligenceContext(path=[]),
-            code_intel=self.code_intelligence,
-            problems=self.problems)
-
-    def symbology(self, cwl):
-        line_count = self.text.count("\n")
+            code_intel=code_intelligence,
+            problems=problems)
 
+    @staticmethod
+    def symbology(cwl, line_count):
         symbols = {}
         _typ = cwl.get("class")
         if _typ in process_types:
@@ -104,5 +218,12 @@ class Document:
             if _typ == "Workflow":
                 symbols = extract_step_symbols(cwl, symbols)
 
-        self.symbols = list(symbols.values())
-        self.wf_graph = cwl_graph(cwl)
+        return list(symbols.values()), cwl_graph(cwl)
+
+
+def _first_changed_line(old_lines: List[str], new_text: str):
+    new_lines = split_lines(new_text)
+    for n, (old, new) in enumerate(zip(old_lines, new_lines)):
+        if old != new:
+            return n
+    return min(len(old_lines), len(new_lines))
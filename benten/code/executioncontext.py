@@ -3,24 +3,40 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 import pathlib
+import hashlib
+import json
+import threading
 
 from ..cwl.lib import un_mangle_uri, list_as_map
 from .sampledata import (
     get_sample_runtime,
-    get_sample_data,
+    generate_sample_inputs,
+    generate_sample_outputs,
+    generate_sample_intermediate_results,
     get_sample_globbed_files)
-
-from ruamel.yaml import YAML
+from .jobfile import job_files
+from .lrucache import LRUCache
 
 import logging
 logger = logging.getLogger(__name__)
 
-fast_yaml_io = YAML(typ='safe')
-fast_yaml_io.default_flow_style = False
-
 job_inputs_ext = ".benten.test.job.yml"
 
 
+class SampleJob:
+    """Sample values handed out for a document's inputs and outputs. Kept across
+    analyses of the document for as long as its ports and types stay the same"""
+
+    def __init__(self, signature: str):
+        self.signature = signature
+        self.inputs = {}
+        self.outputs = {}
+        self.lock = threading.Lock()
+
+
+sample_jobs = LRUCache(max_items=64)
+
+
 class ExecutionContext:
     """Carries the job object (sample inputs), expression lib and, if a workflow, simulated
     outputs for each step"""
@@ -31,38 +47,123 @@ class ExecutionContext:
         self.user_types = user_types
         self.scratch_path = scratch_path
         self.expression_lib = []
-        self._sample_data = None
-        # self._intermediate_outputs = None
+        self._sample_job = None
 
     def runtime(self, doc_path: tuple):
         return get_sample_runtime(self.cwl, doc_path)
 
     @property
     def sample_data(self):
+        """The complete sample job: the user's, if they have customized the job file,
+        or one we generate (including the values handed out so far)"""
+        custom = job_files.custom_job(self.get_sample_data_file_path())
+        if custom is not None:
+            return custom
+
+        job = self.sample_job()
+        with job.lock:
+            job.inputs.update(generate_sample_inputs(
+                self.cwl, self.user_types, self._missing(self.cwl.get("inputs"), job.inputs),
+                seed=self.doc_uri))
+            job.outputs.update(generate_sample_outputs(
+                self.cwl, self.user_types, self._missing(self.cwl.get("outputs"), job.outputs),
+                seed=self.doc_uri))
+            inputs, outputs = dict(job.inputs), dict(job.outputs)
+
+        return {
+            "inputs": {
+                **inputs,
+                **generate_sample_intermediate_results(self.doc_uri, self.cwl, self.user_types)
+            },
+            "outputs": outputs
+        }
+
+    def sample_inputs(self, names: list = None):
+        """Sample values for these inputs, or all the process inputs if names is None.
+        Outputs of workflow steps are named "step_id/port". Only the values asked
+        for are generated"""
+        custom = job_files.custom_job(self.get_sample_data_file_path())
+        if custom is not None:
+            return custom.get("inputs") or {}
+
+        if names is None:
+            names = list(list_as_map(self.cwl.get("inputs"), key_field="id", problems=[]).keys())
+
+        job = self.sample_job()
+        with job.lock:
+            missing = [n for n in names if "/" not in n and n not in job.inputs]
+            if missing:
+                job.inputs.update(generate_sample_inputs(
+                    self.cwl, self.user_types, missing, seed=self.doc_uri))
+            values = {n: job.inputs[n] for n in names if n in job.inputs}
+
+        # These come from a cache of their own, which knows when the step changes
+        values.update(generate_sample_intermediate_results(
+            self.doc_uri, self.cwl, self.user_types,
+            list({n.split("/")[0] for n in names if "/" in n})))
+
+        return {n: values[n] for n in names if n in values}
+
+    def sample_outputs(self, names: list):
+        custom = job_files.custom_job(self.get_sample_data_file_path())
+        if custom is not None:
+            return custom.get("outputs") or {}
+
+        job = self.sample_job()
+        with job.lock:
+            missing = [n for n in names if n not in job.outputs]
+            if missing:
+                job.outputs.update(generate_sample_outputs(
+                    self.cwl, self.user_types, missing, seed=self.doc_uri))
+            values = {n: job.outputs[n] for n in names if n in job.outputs}
+
+        return values
+
+    def sample_job(self) -> SampleJob:
+        if self._sample_job is None:
+            signature = hashlib.sha256(json.dumps(
+                [self.cwl.get("inputs"), self.cwl.get("outputs"), self.user_types],
+                sort_keys=True, default=str).encode()).hexdigest()
+            job = sample_jobs.get(self.doc_uri)
+            if job is None or job.signature != signature:
+                job = SampleJob(signature)
+                sample_jobs.put(self.doc_uri, job)
+            self._sample_job = job
+        return self._sample_job
+
+    def write_sample_data_file(self) -> pathlib.Path:
+        """Write out the complete sample job, unless the user has customized it.
+        This is the only time values are generated for every port and step: the
+        values are the same ones hovers have been using, since they are kept
+        (and seeded) per document"""
         ex_job_file = self.get_sample_data_file_path()
-        if ex_job_file.exists():
-            if ex_job_file.open().readline().startswith("#custom"):
-                self._sample_data = fast_yaml_io.load(ex_job_file.open().read() or "")
-                return self._sample_data
-
-        if self._sample_data is None:
-            self._sample_data = get_sample_data(self.doc_uri, self.cwl, self.user_types)
-            ex_job_file.parent.mkdir(parents=True, exist_ok=True)
-            fast_yaml_io.dump(self._sample_data, ex_job_file)
+        job_files.write(ex_job_file, lambda: self.sample_data)
+        job_files.wait(ex_job_file)
+        return ex_job_file
 
-        return self._sample_data
+    @staticmethod
+    def _missing(ports, values: dict):
+        return [k for k in list_as_map(ports, key_field="id", problems=[]).keys() if k not in values]
 
     def get_workflow_step_inputs(self, doc_path: tuple):
         step_id = doc_path[1]
-        step_sample_outputs = self.sample_data["inputs"]
         step_obj = list_as_map(self.cwl.get("steps"), key_field="id", problems=[]).get(step_id)
-        input_obj = {}
+        sources = {}
         for k, in_obj in list_as_map(step_obj.get("in"), key_field="id", problems=[]).items():
             if isinstance(in_obj, dict):
                 src = in_obj.get("source")
             else:
                 src = in_obj
+            sources[k] = src
+
+        # Only the outputs of the steps feeding this one are generated
+        step_sample_outputs = self.sample_inputs([
+            s for src in sources.values()
+            for s in (src if isinstance(src, list) else [src])
+            if isinstance(s, str)])
 
+        input_obj = {}
+        for k, src in sources.items():
             if isinstance(src, list):
                 input_obj[k] = [step_sample_outputs.get(s) for s in src]
             else:
@@ -0,0 +1,275 @@
+"""A faster YAML loader for the analysis.
+
+The round trip loader builds CommentedMap/CommentedSeq objects that carry
+comments, formatting and a LineCol object for every node, almost all of
+which the analysis never looks at. This loader has libyaml (via PyYAML)
+compose the document and builds plain dicts and lists from the nodes. Each
+map and list carries, as .lc, a table of the (line, column) of its keys,
+values or items, so that get_range_for_key/get_range_for_value and the
+symbol extraction work on either loader's output.
+
+Scalars are resolved with the YAML 1.2 rules the round trip loader uses
+(yes/no/on/off are strings, 1:20 is a string ...) and, as with the round
+trip loader, the first of a set of duplicate keys wins.
+
+PyYAML is optional: available() is False if it is not installed and the
+caller should use the round trip loader."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import math
+
+from ruamel.yaml.resolver import implicit_resolvers
+
+try:
+    import yaml as pyyaml
+    from yaml.nodes import ScalarNode, SequenceNode, MappingNode
+    from yaml.constructor import SafeConstructor, ConstructorError
+except ImportError:
+    pyyaml = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MapPositions:
+    """(line, column) of the keys and values of a map, in the manner of ruamel's LineCol"""
+
+    __slots__ = ("line", "col", "_table")
+
+    def __init__(self, line: int, col: int, table: dict):
+        self.line = line
+        self.col = col
+        # key -> (key line, key column, value line, value column)
+        self._table = table
+
+    def key(self, k):
+        return self._table[k][:2]
+
+    def value(self, k):
+        return self._table[k][2:]
+
+
+class SeqPositions:
+    """(line, column) of the items of a list, in the manner of ruamel's LineCol"""
+
+    __slots__ = ("line", "col", "_table")
+
+    def __init__(self, line: int, col: int, table: list):
+        self.line = line
+        self.col = col
+        # One (line, column) per item
+        self._table = table
+
+    def item(self, n):
+        return self._table[n]
+
+
+class PositionalMap(dict):
+    __slots__ = ("lc",)
+
+
+class PositionalSeq(list):
+    __slots__ = ("lc",)
+
+
+def available():
+    return pyyaml is not None
+
+
+if pyyaml is not None:
+
+    _str_tag = "tag:yaml.org,2002:str"
+    _int_tag = "tag:yaml.org,2002:int"
+    _float_tag = "tag:yaml.org,2002:float"
+    _bool_tag = "tag:yaml.org,2002:bool"
+    _null_tag = "tag:yaml.org,2002:null"
+    _timestamp_tag = "tag:yaml.org,2002:timestamp"
+    _merge_tag = "tag:yaml.org,2002:merge"
+
+    class _Resolver(pyyaml.resolver.BaseResolver):
+        yaml_implicit_resolvers = {}
+
+    # The same rules as the round trip loader, which reads YAML 1.2 by default
+    for _versions, _tag, _regexp, _first in implicit_resolvers:
+        if (1, 2) in _versions:
+            _Resolver.add_implicit_resolver(_tag, _regexp, _first)
+
+    if pyyaml.__with_libyaml__:
+        class _Composer(pyyaml.cyaml.CParser, _Resolver):
+            def __init__(self, stream):
+                pyyaml.cyaml.CParser.__init__(self, stream)
+                _Resolver.__init__(self)
+    else:
+        logger.info("PyYAML was built without libyaml. The fast YAML loader will not be much faster")
+
+        class _Composer(pyyaml.reader.Reader, pyyaml.scanner.Scanner, pyyaml.parser.Parser,
+                        pyyaml.composer.Composer, _Resolver):
+            def __init__(self, stream):
+                pyyaml.reader.Reader.__init__(self, stream)
+                pyyaml.scanner.Scanner.__init__(self)
+                pyyaml.parser.Parser.__init__(self)
+                pyyaml.composer.Composer.__init__(self)
+                _Resolver.__init__(self)
+
+    # Only used for timestamps, which need no state
+    _timestamp_constructor = SafeConstructor()
+
+
+def load(text: str):
+    """Load a single YAML document. Raises yaml.MarkedYAMLError (PyYAML's) if the
+    text is not valid YAML"""
+    composer = _Composer(text)
+    try:
+        node = composer.get_single_node()
+    finally:
+        composer.dispose()
+
+    if node is None:
+        return None
+    return _Builder(text).build(node)
+
+
+class _Builder:
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = None
+        # Anchored nodes are only built once
+        self.built = {}
+
+    def build(self, node):
+        if isinstance(node, ScalarNode):
+            return _scalar(node)
+
+        built = self.built.get(id(node))
+        if built is not None:
+            return built
+
+        if isinstance(node, MappingNode):
+            return self._map(node)
+        if isinstance(node, SequenceNode):
+            return self._seq(node)
+
+        raise ConstructorError(None, None, f"unexpected node {node.id}", node.start_mark)
+
+    def _map(self, node):
+        obj = PositionalMap()
+        table = {}
+        obj.lc = MapPositions(node.start_mark.line, node.start_mark.column, table)
+        self.built[id(node)] = obj
+
+        merged = []
+        for key_node, value_node in node.value:
+            if key_node.tag == _merge_tag:
+                merged += [value_node]
+                continue
+
+            key = self.build(key_node)
+            if isinstance(key, list):
+                key = tuple(key)
+            try:
+                hash(key)
+            except TypeError:
+                raise ConstructorError("while constructing a mapping", node.start_mark,
+                                       "found unhashable key", key_node.start_mark)
+
+            if key in obj:
+                continue
+
+            obj[key] = self.build(value_node)
+            km, vm = key_node.start_mark, value_node.start_mark
+            if value_node.tag == _null_tag and value_node.value == "" and not node.flow_style:
+                table[key] = (km.line, km.column) + self._next_token(vm.line, vm.column)
+            else:
+                table[key] = (km.line, km.column, vm.line, vm.column)
+
+        # Keys given explicitly take precedence over those merged in (<<: *anchor)
+        for value_node in merged:
+            sources = value_node.value if isinstance(value_node, SequenceNode) else [value_node]
+            for source_node in sources:
+                source = self.build(source_node)
+                if not isinstance(source, PositionalMap):
+                    raise ConstructorError("while constructing a mapping", node.start_mark,
+                                           "expected a mapping for merging", source_node.start_mark)
+                for k, v in source.items():
+                    if k not in obj:
+                        obj[k] = v
+                        table[k] = source.lc.key(k) + source.lc.value(k)
+
+        return obj
+
+    def _seq(self, node):
+        obj = PositionalSeq()
+        table = []
+        obj.lc = SeqPositions(node.start_mark.line, node.start_mark.column, table)
+        self.built[id(node)] = obj
+
+        for item_node in node.value:
+            obj.append(self.build(item_node))
+            table.append((item_node.start_mark.line, item_node.start_mark.column))
+
+        return obj
+
+    def _next_token(self, line: int, col: int):
+        # libyaml places a missing value right after the ":", the round trip
+        # loader at whatever comes next. We go with the round trip loader
+        if self.lines is None:
+            self.lines = self.text.splitlines()
+
+        while line < len(self.lines):
+            text = self.lines[line]
+            while col < len(text) and text[col] in " \t":
+                col += 1
+            if col < len(text) and text[col] != "#":
+                return line, col
+            line, col = line + 1, 0
+
+        # The end of the text
+        if self.lines and not self.text.endswith(("\n", "\r")):
+            return len(self.lines) - 1, len(self.lines[-1])
+        return line, col
+
+
+def _scalar(node):
+    tag, value = node.tag, node.value
+    if tag == _str_tag:
+        return value
+    if tag == _null_tag:
+        return None
+    if tag == _bool_tag:
+        return value.lower() == "true"
+    if tag == _int_tag:
+        return _int(value)
+    if tag == _float_tag:
+        return _float(value)
+    if tag == _timestamp_tag:
+        return _timestamp_constructor.construct_yaml_timestamp(node)
+    # Anything else (!!binary, local tags ...) is left as the text it was written as
+    return value
+
+
+def _int(value: str):
+    value = value.replace("_", "")
+    sign = 1
+    if value[0] in "+-":
+        sign = -1 if value[0] == "-" else 1
+        value = value[1:]
+
+    if value.startswith("0b"):
+        return sign * int(value[2:], 2)
+    if value.startswith("0x"):
+        return sign * int(value[2:], 16)
+    if value.startswith("0o"):
+        return sign * int(value[2:], 8)
+    return sign * int(value)
+
+
+def _float(value: str):
+    value = value.replace("_", "").lower()
+    sign = -1 if value.startswith("-") else 1
+    if value.lstrip("+-") == ".inf":
+        return sign * math.inf
+    if value == ".nan":
+        return math.nan
+    return float(value)
@@ -9,7 +9,7 @@ For details see ../../docs/document-model.md
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from typing import List
+from typing import Dict, List
 import pathlib
 
 from ..langserver.lspobjects import (Position, Range, CompletionItem, Hover)
@@ -20,6 +20,7 @@ logger = logging.getLogger(__name__)
 
 
 class LookupNode:
+    __slots__ = ("loc", "intelligence_node")
 
     def __init__(self, loc: Range):
         self.loc = loc
@@ -51,12 +52,16 @@ class Intelligence:
 
     def __init__(self):
         self.lookup_table: List[LookupNode] = []
+        self._line_index: Dict[int, List[LookupNode]] = None
         self.type_defs = {}
         self.namespaces = {}
         self.execution_context: ExecutionContext = None
+        # Set when the analysis may take over unchanged steps from the previous one
+        self.step_reuse = None
 
     def add_lookup_node(self, node: LookupNode):
         self.lookup_table.append(node)
+        self._line_index = None
 
     def load_namespaces(self, cwl: dict):
         if "$namespaces" in cwl:
@@ -72,13 +77,30 @@ class Intelligence:
     def prepare_expression_lib(self, expression_lib: list):
         self.execution_context.set_expression_lib(expression_lib)
 
+    def build_index(self):
+        self._line_index = build_line_index(self.lookup_table)
+
     def get_doc_element(self, loc: Position):
-        # O(n) algorithm, but should do fine for our file sizes
-        # For now doing exact matches on lines, which is sufficient
-        for n in self.lookup_table:
-            if n.loc.start.line <= loc.line <= n.loc.end.line:
-                if loc.line > n.loc.start.line or loc.character >= n.loc.start.character:
-                    if loc.line < n.loc.end.line or loc.character <= n.loc.end.character:
-                        return n.intelligence_node
-
-        return None
+        # Lookup nodes are bucketed by the lines they span, so we only have to
+        # look at the handful of nodes on the cursor line. When nodes nest, the
+        # innermost one (latest start, then earliest end) wins
+        if self._line_index is None:
+            self.build_index()
+
+        best, best_key = None, None
+        for n in self._line_index.get(loc.line, []):
+            if loc.line > n.loc.start.line or loc.character >= n.loc.start.character:
+                if loc.line < n.loc.end.line or loc.character <= n.loc.end.character:
+                    key = (n.loc.start.line, n.loc.start.character, -n.loc.end.line, -n.loc.end.character)
+                    if best_key is None or key > best_key:
+                        best, best_key = n, key
+
+        return best.intelligence_node if best is not None else None
+
+
+def build_line_index(lookup_table: List[LookupNode]) -> Dict[int, List[LookupNode]]:
+    index = {}
+    for n in lookup_table:
+        for line in range(n.loc.start.line, n.loc.end.line + 1):
+            index.setdefault(line, []).append(n)
+    return index
@@ -0,0 +1,136 @@
+"""Reads and writes the sample job files kept in the scratch directory.
+
+A job file the user has customized (first line starts with "#custom") is
+parsed once per change of the file, going by its modification time and size.
+Generated jobs are written on a background thread: bursts of writes to the
+same file are coalesced and the job is produced when the write runs, so the
+file always holds the latest values."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import Callable, Dict
+from concurrent.futures import ThreadPoolExecutor, Future
+import os
+import pathlib
+import threading
+
+from ruamel.yaml import YAML
+
+from .lrucache import LRUCache
+
+import logging
+logger = logging.getLogger(__name__)
+
+custom_job_marker = "#custom"
+
+
+class JobFiles:
+
+    def __init__(self):
+        # path -> (stamp, parsed custom job or None if the job is not custom)
+        self._parsed = LRUCache(max_items=64)
+        self._pending: Dict[str, Future] = {}
+        self._queued = set()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def custom_job(self, path: pathlib.Path):
+        """The job in this file if the user has customized it, otherwise None"""
+        key = str(path)
+        stamp = _stamp(key)
+        if stamp is None:
+            return None
+
+        entry = self._parsed.get(key, validate=lambda e: e[0] == stamp)
+        if entry is not None:
+            return entry[1]
+
+        job = None
+        try:
+            with open(key, "r") as f:
+                text = f.read()
+            self.reads += 1
+            if text.startswith(custom_job_marker):
+                job = _yaml_io().load(text) or {}
+        except Exception as e:
+            logger.error(f"Could not read job file {key}: {e}")
+
+        self._parsed.put(key, (stamp, job))
+        return job
+
+    def write(self, path: pathlib.Path, produce_job: Callable[[], dict]) -> Future:
+        """Write the job returned by produce_job() to this file, in the background,
+        unless the user has customized it in the mean time"""
+        key = str(path)
+        with self._lock:
+            if key in self._queued:
+                return self._pending[key]
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="benten-job-file")
+            self._queued.add(key)
+            future = self._executor.submit(self._write, path, produce_job)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key: str, future: Future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def wait(self, path: pathlib.Path):
+        """Wait for any pending write of this file"""
+        with self._lock:
+            future = self._pending.get(str(path))
+        if future is not None:
+            future.result()
+
+    def _write(self, path: pathlib.Path, produce_job: Callable[[], dict]):
+        key = str(path)
+        with self._lock:
+            self._queued.discard(key)
+
+        try:
+            if self.custom_job(path) is not None:
+                return
+
+            job = produce_job()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = path.with_suffix(f".{os.getpid()}.tmp")
+            with tmp_file.open("w") as f:
+                _yaml_io().dump(job, f)
+            os.replace(tmp_file, path)
+            self.writes += 1
+
+            # We know what is in there, no need to read it back
+            self._parsed.put(key, (_stamp(key), None))
+        except Exception as e:
+            logger.error(f"Could not write job file {key}: {e}", exc_info=True)
+
+    def info(self):
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "pending": len(self._pending)
+        }
+
+
+# YAML objects are not thread safe
+def _yaml_io():
+    yaml_io = YAML(typ='safe')
+    yaml_io.default_flow_style = False
+    return yaml_io
+
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+job_files = JobFiles()
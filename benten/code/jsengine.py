@@ -0,0 +1,181 @@
+"""Evaluates CWL expressions in long lived JavaScript interpreters.
+
+Creating an interpreter and running the document's expressionLib used to be
+done for every expression fragment. Here each worker keeps one interpreter per
+expressionLib (keyed by its hash) that has already run the library, and an
+evaluation only binds `inputs`, `runtime` and `self` before running the
+fragment.
+
+The interpreters live in child processes so that an expression that does not
+finish (`while(true){}`) can be stopped: after `timeout` seconds the worker is
+killed and a fresh one is started for the next evaluation."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from collections import OrderedDict
+import atexit
+import hashlib
+import json
+import multiprocessing
+import queue
+import threading
+
+import dukpy
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Interpreters kept per worker, one per expressionLib
+max_interpreters = 8
+
+
+class ExpressionTimeout(dukpy.JSRuntimeError):
+    pass
+
+
+class JSWorkerFailed(dukpy.JSRuntimeError):
+    pass
+
+
+def library_key(expression_lib: list):
+    return hashlib.sha256("\0".join(expression_lib).encode()).hexdigest()
+
+
+def _worker_main(conn):
+    interpreters = OrderedDict()
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+
+        lib_key, expression_lib, code, js_vars = msg
+        try:
+            interpreter = interpreters.get(lib_key)
+            if interpreter is None:
+                if expression_lib is None:
+                    # We no longer have it. Ask for the library
+                    conn.send((None, None))
+                    continue
+                interpreter = dukpy.JSInterpreter()
+                if expression_lib:
+                    interpreter.evaljs(expression_lib)
+                interpreters[lib_key] = interpreter
+                if len(interpreters) > max_interpreters:
+                    interpreters.popitem(last=False)
+            else:
+                interpreters.move_to_end(lib_key)
+
+            conn.send((True, interpreter.evaljs(code, **json.loads(js_vars))))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+class JSWorker:
+
+    def __init__(self):
+        self.conn = None
+        self.process = None
+        # expressionLibs this worker probably has an interpreter for, so we can
+        # skip sending the library. The worker asks for it if it does not
+        self.libs = OrderedDict()
+
+    def evaljs(self, expression_lib: list, code: str, js_vars: str, timeout: float):
+        lib_key = library_key(expression_lib)
+        if self.process is None:
+            self._start()
+
+        self.conn.send((lib_key, None if lib_key in self.libs else expression_lib, code, js_vars))
+        ok, res = self._receive(timeout)
+        if ok is None:
+            self.conn.send((lib_key, expression_lib, code, js_vars))
+            ok, res = self._receive(timeout)
+
+        if ok:
+            self.libs[lib_key] = True
+            self.libs.move_to_end(lib_key)
+            if len(self.libs) > max_interpreters:
+                self.libs.popitem(last=False)
+            return res
+        else:
+            self.libs.pop(lib_key, None)
+            raise dukpy.JSRuntimeError(res)
+
+    def _receive(self, timeout: float):
+        if not self.conn.poll(timeout):
+            self.stop()
+            raise ExpressionTimeout(f"Expression took longer than {timeout}s to evaluate")
+        return self.conn.recv()
+
+    def _start(self):
+        # "spawn" since forking a process with running threads is not safe
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.libs.clear()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.conn.close()
+        self.process, self.conn = None, None
+        self.libs.clear()
+
+
+class JSEngine:
+
+    def __init__(self, workers: int = 2, timeout: float = 2.0):
+        self.timeout = timeout
+        self.evaluations = 0
+        self.timeouts = 0
+        self._idle = queue.LifoQueue()
+        for _ in range(workers):
+            self._idle.put(JSWorker())
+        self._workers = list(self._idle.queue)
+        self._lock = threading.Lock()
+
+    def evaljs(self, expression_lib: list, code: str, **kwargs):
+        """Like dukpy.evaljs(expression_lib + [code], **kwargs), but raises
+        ExpressionTimeout if the code runs for longer than `timeout` seconds
+        and JSWorkerFailed if the worker process died"""
+        expression_lib = expression_lib or []
+        js_vars = json.dumps(kwargs)
+        worker = self._idle.get()
+        try:
+            return worker.evaljs(expression_lib, code, js_vars, self.timeout)
+        except ExpressionTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except (OSError, EOFError) as e:
+            # The worker died. It is started again on its next use
+            logger.error(f"JavaScript worker failed: {e}")
+            worker.stop()
+            raise JSWorkerFailed(f"JavaScript worker failed: {e}")
+        finally:
+            with self._lock:
+                self.evaluations += 1
+            self._idle.put(worker)
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+
+    def info(self):
+        return {
+            "evaluations": self.evaluations,
+            "timeouts": self.timeouts,
+            "running": sum(1 for w in self._workers if w.process is not None)
+        }
+
+
+# Shared by every session in the process (TCP serves several), so it is only
+# stopped when the process exits
+js_engine = JSEngine()
+atexit.register(js_engine.shutdown)
@@ -0,0 +1,109 @@
+"""Server wide cache of linked files (run: targets, $import and $include files).
+
+A workflow's linked files are loaded every time the workflow is analyzed, and
+they are loaded again to generate sample data and to look up type definitions.
+Here each file is read and parsed once and then shared until its modification
+time or size changes. Callers share the parsed object and must not modify it."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import pathlib
+import urllib.parse
+
+from .lrucache import LRUCache
+from .yaml import fast_yaml_load
+
+import logging
+logger = logging.getLogger(__name__)
+
+link_keys = ["run", "$import", "$include"]
+
+
+class LinkedFile:
+
+    def __init__(self, stamp: tuple, contents: str, node_dict):
+        self.stamp = stamp
+        self.contents = contents
+        self.node_dict = node_dict
+        self._links = None
+
+    def links(self):
+        """The run:, $import and $include targets in this file, as written"""
+        if self._links is None:
+            self._links = list(dict.fromkeys(_links(self.node_dict)))
+        return self._links
+
+
+def _links(node):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k in link_keys and isinstance(v, str):
+                yield v
+            else:
+                yield from _links(v)
+    elif isinstance(node, list):
+        for v in node:
+            yield from _links(v)
+
+
+class LinkedFileCache:
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self._cache = LRUCache(max_weight=max_bytes)
+
+    def load(self, path: pathlib.Path) -> LinkedFile:
+        """Return the contents and parsed YAML of this file. The file is only
+        read if it changed since we last saw it. Raises OSError as open() would"""
+        key = str(path)
+        st = os.stat(key)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        linked_file = self._cache.get(key, validate=lambda lf: lf.stamp == stamp)
+        if linked_file is not None:
+            return linked_file
+
+        with open(key, "r") as f:
+            contents = f.read()
+        linked_file = LinkedFile(stamp, contents, fast_yaml_load(contents))
+        self._cache.put(key, linked_file, weight=len(contents))
+        return linked_file
+
+    def stamp(self, path: pathlib.Path):
+        """(mtime, size) of the file or None if it is missing"""
+        try:
+            st = os.stat(str(path))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def stamps(self, path: pathlib.Path):
+        """(path, stamp) of this file and of every file it links to, directly or
+        not, or None if any of them is remote"""
+        stamps, todo = {}, [pathlib.Path(path)]
+        while todo:
+            path = todo.pop()
+            if str(path) in stamps:
+                continue
+            stamp = self.stamp(path)
+            stamps[str(path)] = stamp
+            if stamp is None:
+                continue
+            try:
+                links = self.load(path).links()
+            except (OSError, UnicodeDecodeError):
+                continue
+            for link in links:
+                if urllib.parse.urlparse(link).scheme not in ["file", ""]:
+                    return None
+                todo.append((path.parent / urllib.parse.urlparse(link).path).resolve())
+        return tuple(sorted(stamps.items()))
+
+    def clear(self):
+        self._cache.clear()
+
+    def info(self):
+        return self._cache.info()
+
+
+linked_file_cache = LinkedFileCache()
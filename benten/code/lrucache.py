@@ -0,0 +1,81 @@
+"""A small thread safe LRU cache, bounded by number of items and/or total weight"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+
+    def __init__(self, max_items: int = None, max_weight: int = None):
+        self.max_items = max_items
+        self.max_weight = max_weight
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, validate=None):
+        """If `validate` is given, an entry it rejects is dropped and counts as a miss"""
+        with self._lock:
+            try:
+                value, weight = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if validate is not None and not validate(value):
+                del self._data[key]
+                self._weight -= weight
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, weight: int = 1):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._weight -= old[1]
+
+            # Something bigger than the whole cache is not worth evicting everything for
+            if self.max_weight is not None and weight > self.max_weight:
+                return
+
+            self._data[key] = (value, weight)
+            self._weight += weight
+
+            while self._data and (
+                    (self.max_items is not None and len(self._data) > self.max_items) or
+                    (self.max_weight is not None and self._weight > self.max_weight)):
+                _, (_, w) = self._data.popitem(last=False)
+                self._weight -= w
+
+    def pop(self, key, default=None):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is None:
+                return default
+            self._weight -= old[1]
+            return old[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._data),
+            "weight": self._weight
+        }
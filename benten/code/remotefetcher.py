@@ -0,0 +1,378 @@
+"""Fetches remote linked files (run: and $import URLs) off the analysis path.
+
+Fetches run on a small thread pool with a timeout, reusing one connection per
+host and thread. Results, including failures, are kept in memory and
+successful ones also on disk together with their ETag/Last-Modified so a
+restarted server can revalidate them with a conditional request instead of
+downloading them again.
+
+By default a fetch blocks the caller. Inside `non_blocking()` an URL we have
+never seen returns None right away and the document that asked for it is
+passed to the subscribers once the fetch is done, so they can re-analyze it."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import Callable, Dict, Set
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+import base64
+import contextvars
+import hashlib
+import http.client
+import json
+import os
+import pathlib
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from .yaml import fast_yaml_load
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+_blocking = contextvars.ContextVar("benten_blocking_fetch", default=True)
+
+max_redirects = 5
+
+
+class RemoteFile:
+
+    def __init__(self, url: str, contents: str = None, error: str = None, missing: bool = False,
+                 etag: str = None, last_modified: str = None, fetched_at: float = None):
+        self.url = url
+        self.contents = contents or ""
+        self.error = error
+        self.missing = missing
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at or time.time()
+        self.node_dict = fast_yaml_load(self.contents) if contents else {}
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def stale_copy(self, error: str):
+        """This file's contents, for when fetching it again failed"""
+        stale = RemoteFile.__new__(RemoteFile)
+        stale.__dict__.update(self.__dict__)
+        stale.error = error
+        stale.fetched_at = time.time()
+        return stale
+
+
+class RemoteFetcher:
+
+    def __init__(self,
+                 cache_dir: pathlib.Path = None,
+                 timeout: float = 10,
+                 max_age: float = 300,
+                 retry_after: float = 60,
+                 workers: int = 4):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        # Seconds a fetched file is used without checking back with the host
+        self.max_age = max_age
+        # Seconds a failed fetch is remembered before we try again
+        self.retry_after = retry_after
+        self.workers = workers
+
+        self.fetches = 0
+        self.revalidated = 0
+
+        self._files: Dict[str, RemoteFile] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._waiting: Dict[str, Set[str]] = {}
+        self._subscribers = []
+        self._executor = None
+        self._connections = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def non_blocking(self, enabled: bool = True):
+        token = _blocking.set(not enabled)
+        try:
+            yield
+        finally:
+            _blocking.reset(token)
+
+    def subscribe(self, callback: Callable[[str, Set[str]], None]):
+        """callback(url, doc_uris) is called, on a fetcher thread, when a fetch that
+        documents did not wait for completes"""
+        with self._lock:
+            self._subscribers += [callback]
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def get(self, url: str, doc_uri: str = None) -> RemoteFile:
+        with self._lock:
+            remote_file = self._files.get(url)
+
+        if remote_file is None:
+            # Disk and YAML parsing, so not under the lock
+            remote_file = self._read_cache(url)
+
+        with self._lock:
+            if remote_file is not None:
+                remote_file = self._files.setdefault(url, remote_file)
+            else:
+                remote_file = self._files.get(url)
+
+            if remote_file is not None and self._is_fresh(remote_file):
+                return remote_file
+
+            future = self._start(url, remote_file)
+            if not _blocking.get():
+                if remote_file is not None:
+                    # Use what we have while it is revalidated
+                    return remote_file
+                if doc_uri is not None:
+                    self._waiting.setdefault(url, set()).add(doc_uri)
+                return None
+
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+
+    def info(self):
+        return {
+            "files": len(self._files),
+            "in_flight": len(self._in_flight),
+            "fetches": self.fetches,
+            "revalidated": self.revalidated
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _is_fresh(self, remote_file: RemoteFile):
+        age = time.time() - remote_file.fetched_at
+        return age < (self.max_age if remote_file.ok else self.retry_after)
+
+    def _start(self, url: str, previous: RemoteFile) -> Future:
+        # Must hold self._lock
+        future = self._in_flight.get(url)
+        if future is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="benten-fetch")
+            future = self._executor.submit(self._fetch_and_store, url, previous)
+            self._in_flight[url] = future
+        return future
+
+    def _fetch_and_store(self, url: str, previous: RemoteFile) -> RemoteFile:
+        try:
+            remote_file = self._fetch(url, previous)
+        except Exception as e:
+            logger.error(f"Unexpected error fetching {url}: {e}", exc_info=True)
+            remote_file = RemoteFile(url, error=str(e))
+
+        # A file we could not fetch again, but did not go missing either, is
+        # still worth having
+        if not remote_file.ok and not remote_file.missing and previous is not None and previous.contents:
+            remote_file = previous.stale_copy(remote_file.error)
+
+        with self._lock:
+            self._files[url] = remote_file
+            self._in_flight.pop(url, None)
+            doc_uris = self._waiting.pop(url, set())
+            subscribers = list(self._subscribers)
+
+        if remote_file.ok and remote_file is not previous:
+            self._write_cache(remote_file)
+
+        if doc_uris:
+            for callback in subscribers:
+                try:
+                    callback(url, doc_uris)
+                except Exception as e:
+                    logger.error(f"Error handling fetch of {url}: {e}", exc_info=True)
+
+        return remote_file
+
+    def _fetch(self, url: str, previous: RemoteFile) -> RemoteFile:
+        t0 = time.time()
+        with self._lock:
+            self.fetches += 1
+
+        if urllib.parse.urlparse(url).scheme not in ["http", "https"]:
+            try:
+                with urllib.request.urlopen(url, timeout=self.timeout) as f:
+                    return RemoteFile(url, contents=f.read().decode("utf-8"))
+            except OSError as e:
+                return RemoteFile(url, error=str(e), missing=True)
+
+        headers = {}
+        if previous is not None and previous.contents:
+            if previous.etag is not None:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified is not None:
+                headers["If-Modified-Since"] = previous.last_modified
+
+        location = url
+        for _ in range(max_redirects + 1):
+            try:
+                status, response_headers, body = self._request(location, headers)
+            except (OSError, http.client.HTTPException) as e:
+                logger.warning(f"Could not fetch {url}: {e}")
+                return RemoteFile(url, error=str(e) or e.__class__.__name__)
+
+            if status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                location = urllib.parse.urljoin(location, response_headers["location"])
+                continue
+            break
+        else:
+            return RemoteFile(url, error="Too many redirects")
+
+        logger.debug(f"Fetched {url} ({status}) in {time.time() - t0:1.3}s")
+
+        if status == 304 and previous is not None:
+            with self._lock:
+                self.revalidated += 1
+            if not previous.ok:
+                # Written out by _fetch_and_store
+                return previous.stale_copy(None)
+            previous.fetched_at = time.time()
+            self._write_cache(previous)
+            return previous
+
+        if status >= 400:
+            return RemoteFile(url, error=f"HTTP {status}", missing=status in (404, 410))
+
+        try:
+            contents = body.decode("utf-8")
+        except UnicodeDecodeError as e:
+            return RemoteFile(url, error=str(e))
+
+        return RemoteFile(
+            url, contents=contents,
+            etag=response_headers.get("etag"),
+            last_modified=response_headers.get("last-modified"))
+
+    def _request(self, url: str, headers: dict):
+        parsed = urllib.parse.urlparse(url)
+
+        # http.client connections are not thread safe, so each fetcher thread
+        # keeps its own, one per host
+        connections = self._connections.__dict__.setdefault("by_host", {})
+        key = (parsed.scheme, parsed.netloc)
+
+        # A kept-alive connection may have been closed by the host since we
+        # last used it, in which case we retry once on a fresh one
+        for attempt in range(2):
+            reused = key in connections
+            if not reused:
+                connections[key] = self._connect(parsed)
+            conn, path, proxy_headers = connections[key]
+            try:
+                conn.request("GET", path, headers={**headers, **proxy_headers})
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                connections.pop(key, None)
+                if reused and attempt == 0:
+                    continue
+                raise
+
+            if response.will_close:
+                conn.close()
+                connections.pop(key, None)
+
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, body
+
+    def _connect(self, parsed: urllib.parse.ParseResult):
+        """A connection to the host, going through the proxy set in the
+        environment (http_proxy, https_proxy, no_proxy) if there is one, with
+        the path to ask for and the headers the proxy needs"""
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+
+        proxy = urllib.request.getproxies().get(parsed.scheme)
+        if proxy is not None and urllib.request.proxy_bypass(parsed.hostname or ""):
+            proxy = None
+
+        if proxy is None:
+            conn_class = http.client.HTTPSConnection if parsed.scheme == "https" \
+                else http.client.HTTPConnection
+            return conn_class(parsed.netloc, timeout=self.timeout), path, {}
+
+        if "://" not in proxy:
+            proxy = "http://" + proxy
+        proxy = urllib.parse.urlparse(proxy)
+        proxy_headers = {}
+        if proxy.username is not None:
+            credentials = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+            proxy_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+        proxy_host = proxy.hostname + (f":{proxy.port}" if proxy.port else "")
+
+        if parsed.scheme == "https":
+            # Tunneled with CONNECT, so the proxy never sees the request
+            conn = http.client.HTTPSConnection(proxy_host, timeout=self.timeout)
+            conn.set_tunnel(parsed.hostname, parsed.port, headers=proxy_headers)
+            return conn, path, {}
+
+        # Plain http is asked of the proxy, with the full URL
+        conn = http.client.HTTPConnection(proxy_host, timeout=self.timeout)
+        return conn, parsed._replace(fragment="").geturl(), proxy_headers
+
+    def _cache_file(self, url: str):
+        return self.cache_dir / (hashlib.sha256(url.encode()).hexdigest()[:32] + ".json")
+
+    def _read_cache(self, url: str):
+        if self.cache_dir is None:
+            return None
+
+        cache_file = self._cache_file(url)
+        if not cache_file.exists():
+            return None
+
+        try:
+            entry = json.loads(cache_file.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read HTTP cache {cache_file}: {e}")
+            return None
+
+        if entry.get("url") != url:
+            return None
+
+        return RemoteFile(
+            url, contents=entry.get("contents"),
+            etag=entry.get("etag"), last_modified=entry.get("last_modified"),
+            fetched_at=entry.get("fetched_at"))
+
+    def _write_cache(self, remote_file: RemoteFile):
+        if self.cache_dir is None:
+            return
+
+        cache_file = self._cache_file(remote_file.url)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file.write_text(json.dumps({
+                "url": remote_file.url,
+                "etag": remote_file.etag,
+                "last_modified": remote_file.last_modified,
+                "fetched_at": remote_file.fetched_at,
+                "contents": remote_file.contents
+            }))
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.warning(f"Could not write HTTP cache {cache_file}: {e}")
+            if tmp_file.exists():
+                tmp_file.unlink()
+
+
+remote_fetcher = RemoteFetcher()
@@ -1,7 +1,8 @@
 """
 Generate inputs, outputs for processes, including intermediate outputs for workflows
 
-The sample data is stored in a dictionary with the following structure
+The sample data (see ExecutionContext.sample_data) is a dictionary with the
+following structure
 
 {
     "inputs":
@@ -17,10 +18,18 @@ The sample data is stored in a dictionary with the following structure
 
 import random
 import string
+import json
+import hashlib
 
 from ..cwl.lib import resolve_file_path, list_as_map
 from .schemadef import extract_schemadef
-from .yaml import fast_load
+from .linkedfilecache import linked_file_cache
+from .lrucache import LRUCache
+
+
+# Sample outputs of workflow steps. They are kept across edits of the
+# workflow until the process the step runs changes
+step_outputs_cache = LRUCache(max_items=256)
 
 
 def get_sample_runtime(cwl: dict, doc_path: tuple):
@@ -44,82 +53,107 @@ def get_sample_runtime(cwl: dict, doc_path: tuple):
     return runtime
 
 
-def get_sample_data(doc_uri: str, cwl: dict, user_types: dict):
-    return {
-        "inputs": {
-            **generate_sample_inputs(cwl, user_types),
-            **generate_sample_intermediate_results(doc_uri, cwl, user_types)
-        },
-        "outputs": generate_sample_outputs(cwl, user_types)
-    }
-
-
 def get_sample_globbed_files(name):
+    rng = random.Random(name)
     return [
-        basic_example_value(name + "/globbed_file_" + str(i), "File")
-        for i in range(random.randint(0, 4))
+        basic_example_value(name + "/globbed_file_" + str(i), "File", rng)
+        for i in range(rng.randint(0, 4))
     ]
 
 
-def generate_sample_inputs(cwl: dict, user_types: dict):
-    return generate_values(cwl.get("inputs"), user_types)
+def generate_sample_inputs(cwl: dict, user_types: dict, names: list = None, seed: str = ""):
+    return generate_values(cwl.get("inputs"), user_types, names, seed)
 
 
-def generate_sample_outputs(cwl: dict, user_types: dict):
-    return generate_values(cwl.get("outputs"), user_types)
+def generate_sample_outputs(cwl: dict, user_types: dict, names: list = None, seed: str = ""):
+    return generate_values(cwl.get("outputs"), user_types, names, seed)
 
 
-def generate_sample_intermediate_results(doc_uri: str, cwl: dict, parent_user_types):
+def generate_sample_intermediate_results(doc_uri: str, cwl: dict, parent_user_types, step_ids: list = None):
+    steps = list_as_map(cwl.get("steps"), key_field="id", problems=[])
     return {
-        step_id + "/" + k: v
-        for step_id, step in list_as_map(cwl.get("steps"), key_field="id", problems=[]).items()
-        for k, v in extract_step_sample_outputs(doc_uri, step.get("run"), parent_user_types).items()
+        k: v
+        for step_id in (steps.keys() if step_ids is None else step_ids)
+        if isinstance(steps.get(step_id), dict)
+        for k, v in generate_step_sample_outputs(
+            doc_uri, step_id, steps[step_id].get("run"), parent_user_types).items()
     }
 
 
-def generate_values(_ports: dict, user_types: dict):
+def generate_step_sample_outputs(doc_uri: str, step_id: str, run_field, parent_user_types):
+    """Sample outputs of one step, named "step_id/port\""""
+    key = _run_target_key(doc_uri, step_id, run_field, parent_user_types)
+    outputs = step_outputs_cache.get(key)
+    if outputs is None:
+        outputs = extract_step_sample_outputs(doc_uri, run_field, parent_user_types, seed=doc_uri + "#" + step_id)
+        step_outputs_cache.put(key, outputs)
+    return {step_id + "/" + k: v for k, v in outputs.items()}
+
+
+def _run_target_key(doc_uri: str, step_id: str, run_field, parent_user_types):
+    if isinstance(run_field, str):
+        linked_file = resolve_file_path(doc_uri, run_field)
+        return doc_uri, step_id, str(linked_file), linked_file_cache.stamp(linked_file)
+
+    # An inlined process (or garbage) changes with the workflow text
+    digest = hashlib.sha256(
+        json.dumps([run_field, parent_user_types], sort_keys=True, default=str).encode()).hexdigest()
+    return doc_uri, step_id, digest
+
+
+def generate_values(_ports: dict, user_types: dict, names: list = None, seed: str = ""):
+    """Each port's value is generated from a random generator seeded with the
+    seed and the port id, so a port gets the same value every time, however
+    many other ports are generated along with it"""
     if not isinstance(_ports, (list, dict)):
         _ports = {}
+    ports = list_as_map(_ports, key_field="id", problems=[])
+    if names is not None:
+        ports = {k: ports[k] for k in names if k in ports}
     return {
-        k: example_value(k, _type_v, user_types)
-        for k, _type_v in list_as_map(_ports, key_field="id", problems=[]).items()
+        k: example_value(k, _type_v, user_types, rng=random.Random(f"{seed}#{k}"))
+        for k, _type_v in ports.items()
     }
 
 
 # This should be invoked when we arrive at the "run" field of a workflow
-def extract_step_sample_outputs(doc_uri: str, run_field, parent_user_types):
+def extract_step_sample_outputs(doc_uri: str, run_field, parent_user_types, seed: str = ""):
 
     # todo: verify this works with inlined steps
     user_types = parent_user_types
     if isinstance(run_field, str):
         linked_file = resolve_file_path(doc_uri, run_field)
         if linked_file.exists() and linked_file.is_file():
-            run_field = fast_load.load(linked_file)
+            run_field = linked_file_cache.load(linked_file).node_dict
             user_types = extract_schemadef(linked_file.as_uri(), run_field)
 
     outputs = {}
     if isinstance(run_field, dict):
-        outputs = generate_sample_outputs(run_field, user_types)
+        outputs = generate_sample_outputs(run_field, user_types, seed=seed)
 
     return outputs
 
 
-def basic_example_value(name, _type):
-    name = name + "_" + "".join(random.choices(string.ascii_letters, k=5))
+# File contents are cut from this, rather than built for every file
+_file_contents = string.ascii_letters * 2
+
+
+def basic_example_value(name, _type, rng: random.Random = random):
+    name = name + "_" + "".join(rng.choices(string.ascii_letters, k=5))
     if _type == 'null':
         return 'null'
     elif _type == 'Any':
         return 'Any'
     elif _type == 'boolean':
-        return random.randint(0, 1) > 0
+        return rng.randint(0, 1) > 0
     elif _type == 'int' or _type == 'long':
-        return random.randint(-1000, 1000)
+        return rng.randint(-1000, 1000)
     elif _type == 'float' or _type == 'double':
-        return random.random() * 100 - 50
+        return rng.random() * 100 - 50
     elif _type == 'string':
         return name
     elif _type == 'File':
-        return file_example_value(name, _type)
+        return file_example_value(name, _type, rng=rng)
     elif _type == 'Directory':
         return {
             'class': 'Directory',
@@ -127,19 +161,18 @@ def basic_example_value(name, _type):
         }
 
 
-def file_example_value(name, cwl_type, ext=".ext"):
-    ex_file = _example_file(name, ext)
+def file_example_value(name, cwl_type, ext=".ext", rng: random.Random = random):
+    ex_file = _example_file(name, ext, rng)
     if isinstance(cwl_type, dict) and "secondaryFiles" in cwl_type:
         ex_file["secondaryFiles"] = [
-            _example_file(name, sec_ext)
+            _example_file(name, sec_ext, rng)
             for sec_ext in cwl_type.get("secondaryFiles")
         ]
     return ex_file
 
 
-def _example_file(name, ext):
-    fsize = random.randint(0, 100)
-    contents = "".join(random.choices(string.ascii_letters, k=fsize))
+def _example_file(name, ext, rng: random.Random = random):
+    fsize = rng.randint(0, 100)
     return {
         'class': 'File',
         'path': f'/path/to/{name}.ext',
@@ -151,41 +184,51 @@ def _example_file(name, ext):
         'checksum': "sha1$deadbeef",
         'size': fsize,
         'format': 'someformat',
-        'contents': contents
+        'contents': _file_contents[:fsize]
     }
 
 
-def enum_example_value(symbols):
-    return symbols[random.randint(0, len(symbols) - 1)]
+def enum_example_value(symbols, rng: random.Random = random):
+    return symbols[rng.randint(0, len(symbols) - 1)]
 
 
-def record_example_value(name, _type, user_types):
+def record_example_value(name, _type, user_types, rng: random.Random = random, expanding: set = None):
     return {
-        k: example_value(f"{name}/{k}", _type_v, user_types)
+        k: example_value(f"{name}/{k}", _type_v, user_types, rng=rng, expanding=expanding)
         for k, _type_v in list_as_map(_type.get("fields"), key_field="name", problems=[]).items()
     }
 
 
-def example_value(name, cwl_type, user_types, array_of=False):
+def example_value(name, cwl_type, user_types, array_of=False,
+                  rng: random.Random = None, expanding: set = None):
+    # A user defined type that is being generated further up is not expanded
+    # again: that would never end for a type that refers to itself
+    if rng is None:
+        rng = random.Random(name)
+    if expanding is None:
+        expanding = set()
+
     if array_of:
-        return [example_value(name + "/" + str(i), cwl_type, user_types) for i in range(4)]
+        return [example_value(f"{name}/{i}", cwl_type, user_types, rng=rng, expanding=expanding)
+                for i in range(4)]
 
     if isinstance(cwl_type, list):
         l = len(cwl_type)
-        return example_value(name, cwl_type[random.randint(0, l - 1)], user_types)
+        return example_value(name, cwl_type[rng.randint(0, l - 1)], user_types, rng=rng, expanding=expanding)
 
     elif isinstance(cwl_type, dict) and "type" in cwl_type:
         _type = cwl_type.get("type")
         if _type == "array":
-            return example_value(name, cwl_type.get("items"), user_types, array_of=True)
+            return example_value(name, cwl_type.get("items"), user_types, array_of=True,
+                                 rng=rng, expanding=expanding)
         elif _type == "enum":
-            return enum_example_value(cwl_type.get("symbols"))
+            return enum_example_value(cwl_type.get("symbols"), rng)
         elif _type == "record":
-            return record_example_value(name, cwl_type, user_types)
+            return record_example_value(name, cwl_type, user_types, rng=rng, expanding=expanding)
         elif _type == "File":
-            return file_example_value(name, cwl_type)
+            return file_example_value(name, cwl_type, rng=rng)
         else:
-            return example_value(name, _type, user_types)
+            return example_value(name, _type, user_types, rng=rng, expanding=expanding)
 
     elif isinstance(cwl_type, str):
         # desugar
@@ -197,9 +240,14 @@ def example_value(name, cwl_type, user_types, array_of=False):
                 "type": "array",
                 "items": [cwl_type[:-2]]
             }
-            return example_value(name, cwl_type, user_types)
+            return example_value(name, cwl_type, user_types, rng=rng, expanding=expanding)
 
         if cwl_type in user_types:
-            return example_value(name, user_types.get(cwl_type), user_types)
-
-        return basic_example_value(name, cwl_type)
+            if cwl_type in expanding:
+                return None
+            expanding.add(cwl_type)
+            value = example_value(name, user_types.get(cwl_type), user_types, rng=rng, expanding=expanding)
+            expanding.discard(cwl_type)
+            return value
+
+        return basic_example_value(name, cwl_type, rng)
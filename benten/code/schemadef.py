@@ -1,13 +1,7 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from ruamel.yaml import YAML
-from ruamel.yaml.parser import ParserError
-from ruamel.yaml.scanner import ScannerError
-
 from ..cwl.lib import resolve_file_path
-
-
-fast_load = YAML(typ='safe')
+from .linkedfilecache import linked_file_cache
 
 
 def extract_schemadef(doc_uri: str, cwl: dict):
@@ -32,12 +26,13 @@ def extract_schemadef(doc_uri: str, cwl: dict):
                     _type = load_typedefs_from_file(doc_uri, path)
                     if isinstance(_type, dict):
                         if "name" in _type:
-                            name = path + "#" + _type.pop("name")
+                            name = path + "#" + _type.get("name")
                 else:
-                    name = _type.pop("name", None)
+                    name = _type.get("name")
 
                 if name is not None:
-                    types_dict[name] = _type
+                    # The loaded documents are shared, so we copy rather than pop
+                    types_dict[name] = {k: v for k, v in _type.items() if k != "name"}
 
     return types_dict
 
@@ -46,9 +41,8 @@ def load_typedefs_from_file(doc_uri, path):
     linked_file = resolve_file_path(doc_uri, path)
     type_def = {}
     if linked_file.exists() and linked_file.is_file():
-        try:
-            type_def = fast_load.load(linked_file.open("r").read())
-        except (ParserError, ScannerError) as e:
+        type_def = linked_file_cache.load(linked_file).node_dict
+        if type_def is None:
             type_def = {}
             # todo: flag errors in imported typedefs
     else:
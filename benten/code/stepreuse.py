@@ -0,0 +1,182 @@
+"""Reuse of the analysis of workflow steps that did not change.
+
+Editing one step of a large workflow used to re-infer and re-validate every
+step and reload their run: files. When a document is re-analyzed, we
+compare each step's text with its text at the previous analysis. A step
+whose text is the same, whose run: target and the files that links to
+have not changed on disk, and that sees the same user types and namespaces
+is not parsed again: its lookup nodes and diagnostics are taken over from
+the previous analysis (moved by the number of lines the step moved)
+together with its WFStepIntelligence. The workflow level checks
+(validate_connections) always run in full.
+
+Only steps written as a block style map entry (steps: {step_id: ...}) whose
+text does not have side effects on the rest of the analysis (type
+definitions, expression libraries, $import/$include) are reused."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import Dict, List
+import copy
+import hashlib
+import json
+import urllib.parse
+
+from ..langserver.lspobjects import Position, Range, Diagnostic
+from ..cwl.lib import resolve_file_path
+from .linkedfilecache import linked_file_cache
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Steps mentioning these have effects beyond the step, or depend on files
+# we do not track
+not_reusable_markers = ["SchemaDefRequirement", "expressionLib", "$import", "$include", "$mixin"]
+
+
+class StepAnalysis:
+
+    def __init__(self, key: tuple, first_line: int, lookup_nodes: list, problems: list, step_intel):
+        self.key = key
+        self.first_line = first_line
+        self.lookup_nodes = lookup_nodes
+        self.problems = problems
+        self.step_intel = step_intel
+
+
+class StepReuse:
+
+    def __init__(self, lines: List[str], previous: 'StepReuse' = None):
+        self.lines = lines
+        self.cwl_version = None
+        self.steps: Dict[str, StepAnalysis] = {}
+        self.reused = 0
+        # Many steps share a run target and they all see the same types
+        self._run_keys = {}
+        self._context = (None, None)
+
+        self._previous_steps = {}
+        self._previous_version = None
+        if previous is not None:
+            self._previous_steps = previous.steps
+            self._previous_version = previous.cwl_version
+
+    def step_key(self, doc_uri: str, step, key_range: Range, code_intel):
+        """What the analysis of this step depends on, or None if it can not be reused"""
+        if not isinstance(step, dict):
+            return None
+
+        text = self._step_text(key_range)
+        if text is None or any(m in text for m in not_reusable_markers):
+            return None
+
+        run = step.get("run")
+        if isinstance(run, str):
+            if run not in self._run_keys:
+                if urllib.parse.urlparse(run).scheme not in ["file", ""]:
+                    self._run_keys[run] = None
+                else:
+                    # Includes the files the run target $imports, $includes or runs
+                    self._run_keys[run] = linked_file_cache.stamps(resolve_file_path(doc_uri, run))
+            run_key = self._run_keys[run]
+            if run_key is None:
+                return None
+        else:
+            run_key = None
+
+        return text, run_key, self._context_key(code_intel)
+
+    def _context_key(self, code_intel):
+        # Type definitions are only ever added during an analysis
+        size = (len(code_intel.type_defs), len(code_intel.namespaces))
+        if self._context[0] != size:
+            self._context = (size, hashlib.sha256(json.dumps(
+                [code_intel.type_defs, code_intel.namespaces], sort_keys=True, default=str).encode()).hexdigest())
+        return self._context[1]
+
+    def reuse(self, step_id: str, key: tuple, key_range: Range, code_intel, problems: list):
+        """If the step is unchanged since the previous analysis, add its lookup nodes
+        and problems and return its WFStepIntelligence. Otherwise None"""
+        if key is None or self.cwl_version != self._previous_version:
+            return None
+
+        previous = self._previous_steps.get(step_id)
+        if previous is None or previous.key != key:
+            return None
+
+        first_line = key_range.start.line
+        delta = first_line - previous.first_line
+        lookup_nodes = [_moved_lookup_node(ln, delta, code_intel.execution_context)
+                        for ln in previous.lookup_nodes]
+        step_problems = [_moved_diagnostic(p, delta) for p in previous.problems]
+
+        for ln in lookup_nodes:
+            code_intel.add_lookup_node(ln)
+        problems += step_problems
+
+        self.steps[step_id] = StepAnalysis(key, first_line, lookup_nodes, step_problems, previous.step_intel)
+        self.reused += 1
+        return previous.step_intel
+
+    def record(self, step_id: str, key: tuple, key_range: Range, lookup_nodes: list, problems: list, step_intel):
+        if key is not None:
+            self.steps[step_id] = StepAnalysis(key, key_range.start.line, lookup_nodes, problems, step_intel)
+
+    def _step_text(self, key_range: Range):
+        # The step runs from its key to the next line that is not indented
+        # deeper than the key
+        first_line, column = key_range.start.line, key_range.start.character
+        if first_line >= len(self.lines):
+            return None
+
+        last_line = first_line
+        for n in range(first_line + 1, len(self.lines)):
+            line = self.lines[n]
+            stripped = line.lstrip()
+            if not stripped:
+                continue
+            if len(line) - len(stripped) <= column:
+                break
+            last_line = n
+
+        # A step in flow style, or sharing its line with anything else, is not
+        # something we can cut out by lines
+        if last_line == first_line and "{" in self.lines[first_line]:
+            return None
+
+        return "\n".join(self.lines[first_line:last_line + 1])
+
+
+def _moved_range(_range: Range, delta: int):
+    return Range(
+        Position(_range.start.line + delta, _range.start.character),
+        Position(_range.end.line + delta, _range.end.character))
+
+
+def _moved_diagnostic(diagnostic: Diagnostic, delta: int):
+    if delta == 0:
+        return diagnostic
+    moved = copy.copy(diagnostic)
+    moved.range = _moved_range(diagnostic.range, delta)
+    return moved
+
+
+def _moved_lookup_node(ln, delta: int, execution_context):
+    intelligence_node = ln.intelligence_node
+
+    # Expressions carry their own range (for hover highlighting) and the
+    # execution context of the analysis that created them
+    if hasattr(intelligence_node, "execution_context"):
+        intelligence_node = copy.copy(intelligence_node)
+        intelligence_node.execution_context = execution_context
+        if delta != 0 and getattr(intelligence_node, "range", None) is not None:
+            intelligence_node.range = _moved_range(intelligence_node.range, delta)
+
+    if delta == 0 and intelligence_node is ln.intelligence_node:
+        return ln
+
+    moved = copy.copy(ln)
+    moved.loc = _moved_range(ln.loc, delta) if delta != 0 else ln.loc
+    moved.intelligence_node = intelligence_node
+    return moved
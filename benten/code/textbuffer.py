@@ -0,0 +1,76 @@
+"""Line array backed document text that can be edited in place by LSP ranged
+changes. Only the lines touched by an edit are rebuilt, the full text is joined
+lazily when it is asked for."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import List
+import re
+
+from ..langserver.lspobjects import Range
+
+# LSP only counts \n, \r\n and \r as line breaks. str.splitlines also breaks
+# on \x0b, \x0c, \x1c-\x1e, \x85, \u2028 and \u2029
+_line_break = re.compile(r"(?<=\n)|(?<=\r)(?!\n)")
+
+
+def split_lines(text: str) -> List[str]:
+    """The lines of the text, with their line breaks"""
+    lines = _line_break.split(text)
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+class TextBuffer:
+
+    def __init__(self, text: str = ""):
+        self.lines: List[str] = []
+        self._text = None
+        self.set_text(text)
+
+    def set_text(self, text: str):
+        self.lines = split_lines(text)
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self.lines)
+        return self._text
+
+    @property
+    def line_count(self) -> int:
+        return self.text.count("\n")
+
+    def apply_change(self, _range: Range, new_text: str):
+        start_line, end_line = _range.start.line, _range.end.line
+        if start_line >= len(self.lines):
+            start_line = len(self.lines)
+        if end_line >= len(self.lines):
+            end_line = len(self.lines)
+
+        start_txt = self._line(start_line)
+        end_txt = self._line(end_line)
+        prefix = start_txt[:_to_index(start_txt, _range.start.character)]
+        suffix = end_txt[_to_index(end_txt, _range.end.character):]
+
+        self.lines[start_line:end_line + 1] = split_lines(prefix + new_text + suffix)
+        self._text = None
+
+    def _line(self, n: int) -> str:
+        return self.lines[n] if n < len(self.lines) else ""
+
+
+# LSP columns count UTF-16 code units. Characters outside the BMP take two
+def _to_index(line: str, character: int) -> int:
+    content = line.rstrip("\r\n")
+    if content.isascii():
+        return min(character, len(content))
+
+    units = 0
+    for n, c in enumerate(content):
+        if units >= character:
+            return n
+        units += 2 if ord(c) > 0xFFFF else 1
+    return len(content)
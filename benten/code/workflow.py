@@ -99,6 +99,9 @@ class WFStepIntelligence:
         self.step_id = step_id
         self.step_interface: StepInterface = StepInterface()
         self.workflow = None
+        # The run: file is remote and still being fetched, so we do not know
+        # the step's ports yet. The document is analyzed again when it arrives
+        self.run_pending = False
 
     def set_step_interface(self, step_interface: StepInterface):
         self.step_interface = step_interface
@@ -108,12 +111,24 @@ class WFStepIntelligence:
             raise RuntimeError("Need to attach workflow first")
 
         for port_id, port in inputs.as_dict.items():
-            if port_id not in self.step_interface.inputs:
+            if self.run_pending:
+                # Only to mark the sources used. Problems are reported once the
+                # step's ports are known
+                _validate_source(
+                    port=port,
+                    src_key="source",
+                    value_range=inputs.get_range_for_value(port_id),
+                    step_id=self.step_id,
+                    workflow=self.workflow,
+                    unused_ports=unused_ports,
+                    problems=[])
+
+            elif port_id not in self.step_interface.inputs:
                 problems += [
                     Diagnostic(
                         _range=inputs.get_range_for_id(port_id),
                         message=
-                        f"Expecting one of: {self.step_interface.inputs}"
+                        f"Expecting one of: {sorted(self.step_interface.inputs)}"
                         if self.step_interface.inputs else
                         "No input ports found for this step",
                         severity=DiagnosticSeverity.Error)
@@ -239,7 +254,7 @@ def _validate_one_source(src, value_range, step_id, workflow, unused_ports, prob
     if src in workflow.wf_inputs:
         return
 
-    err_msg = f"No such workflow input. Expecting one of {workflow.wf_inputs}"
+    err_msg = f"No such workflow input. Expecting one of {sorted(workflow.wf_inputs)}"
 
     if isinstance(src, str) and "/" in src:
         src_step, src_port = src.split("/")
@@ -248,7 +263,8 @@ def _validate_one_source(src, value_range, step_id, workflow, unused_ports, prob
             err_msg = f"No step called {src_step}"
             if src_step in workflow.step_intels:
                 err_msg = f"{src_step} has no port called {src_port}"
-                if src_port in workflow.step_intels[src_step].step_interface.outputs:
+                src_step_intel = workflow.step_intels[src_step]
+                if src_step_intel.run_pending or src_port in src_step_intel.step_interface.outputs:
                     return
 
     problems += [
@@ -0,0 +1,354 @@
+"""Index of the CWL files in the workspace folders, for workspace/symbol and
+textDocument/references.
+
+For each file we keep its class and id, its inputs, outputs, steps and the
+types it defines (SchemaDefRequirement) with their positions, and its links
+to other files (run:, $import, $include). Files are only parsed again if
+their modification time or size changed: a refresh is a walk of the folders
+and a stat of each file. The index is kept under the scratch directory as
+compact JSON (lists rather than objects), so a new session only parses the
+files that changed since the last one."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import Dict, List
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+import urllib.parse
+
+from .yaml import parse_yaml
+from ..cwl.lib import resolve_file_path, un_mangle_uri
+from ..langserver.lspobjects import Position, Range, Location, SymbolKind, SymbolInformation
+
+import logging
+logger = logging.getLogger(__name__)
+
+index_version = 1
+
+# Directories we never look into
+skipped_dirs = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".tox", ".venv", "venv"}
+
+link_keys = ["run", "$import", "$include"]
+
+port_kinds = {
+    "inputs": SymbolKind.Interface,
+    "outputs": SymbolKind.Interface,
+    "steps": SymbolKind.Class
+}
+
+
+class IndexedFile:
+    """What the index knows of a file. symbols are (name, kind, line, column,
+    container) and links (target path, key, line, column, length)"""
+    __slots__ = ("stamp", "process_class", "symbols", "links")
+
+    def __init__(self, stamp: tuple, process_class: str, symbols: list, links: list):
+        self.stamp = stamp
+        self.process_class = process_class
+        self.symbols = symbols
+        self.links = links
+
+    def to_list(self):
+        return [list(self.stamp), self.process_class, self.symbols, self.links]
+
+    @classmethod
+    def from_list(cls, data: list):
+        stamp, process_class, symbols, links = data
+        return cls(tuple(stamp), process_class, [tuple(s) for s in symbols], [tuple(k) for k in links])
+
+
+class WorkspaceIndex:
+
+    def __init__(self, index_path: pathlib.Path = None, yaml_loader: str = "rt"):
+        self.index_path = index_path
+        self.yaml_loader = yaml_loader
+        self.roots: List[pathlib.Path] = []
+        self.files: Dict[str, IndexedFile] = {}
+        # target path -> paths of the files that link to it
+        self._linked_from: Dict[str, set] = {}
+        self.parsed = 0
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def set_roots(self, roots: List[pathlib.Path]):
+        with self._lock:
+            self.roots = [pathlib.Path(r).resolve() for r in roots]
+            self.last_refresh = None
+
+    def load(self):
+        """Take up the index saved by an earlier session, if there is one"""
+        if self.index_path is None or not self.index_path.exists():
+            return
+        try:
+            data = json.loads(self.index_path.read_text())
+            if data.get("version") != index_version:
+                return
+            files = {path: IndexedFile.from_list(entry) for path, entry in data["files"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Could not read workspace index {self.index_path}: {e}")
+            return
+
+        with self._lock:
+            self.files = files
+            self._rebuild_links()
+
+    def save(self):
+        if self.index_path is None:
+            return
+        with self._lock:
+            data = {
+                "version": index_version,
+                "files": {path: entry.to_list() for path, entry in self.files.items()}
+            }
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            # Sessions in one process (TCP) may share the index of a workspace
+            tmp_file = self.index_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_file.write_text(json.dumps(data, separators=(",", ":")))
+            os.replace(tmp_file, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not write workspace index {self.index_path}: {e}")
+
+    def refresh(self, max_age: float = None, wait: bool = True):
+        """Bring the index up to date with the files on disk. If the last refresh
+        was less than max_age seconds ago, do nothing. If another refresh is
+        under way and we are not to wait for it, do nothing"""
+        if not self._refresh_lock.acquire(blocking=wait):
+            return
+        try:
+            self._refresh(max_age)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, max_age: float):
+        if max_age is not None and self.last_refresh is not None and \
+                time.monotonic() - self.last_refresh < max_age:
+            return
+
+        t0 = time.perf_counter()
+        parsed = self.parsed
+        stamps = {}
+        for root in list(self.roots):
+            for path in _cwl_files(root):
+                stamp = _stamp(path)
+                if stamp is not None:
+                    stamps[path] = stamp
+
+        with self._lock:
+            current = dict(self.files)
+        changed = {}
+        for path, stamp in stamps.items():
+            entry = current.get(path)
+            if entry is None or entry.stamp != stamp:
+                changed[path] = self._index_file(path, stamp)
+
+        removed = current.keys() - stamps.keys()
+        if changed or removed:
+            with self._lock:
+                self.files.update(changed)
+                for path in removed:
+                    self.files.pop(path, None)
+                self._rebuild_links()
+            self.save()
+
+        self.last_refresh = time.monotonic()
+        logger.info(f"Workspace index: {len(stamps)} files, {self.parsed - parsed} parsed, "
+                    f"{len(removed)} removed in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    def refresh_file(self, path: pathlib.Path):
+        """Index this file again, e.g. after it was saved"""
+        path = str(pathlib.Path(path).resolve())
+        if not any(_is_under(path, root) for root in self.roots):
+            return
+        # A refresh under way may have read this file before it was saved. We
+        # wait for it, so it does not put back what it read
+        with self._refresh_lock:
+            stamp = _stamp(path)
+            entry = self._index_file(path, stamp) if stamp is not None else None
+            with self._lock:
+                if entry is None:
+                    self.files.pop(path, None)
+                else:
+                    self.files[path] = entry
+                self._rebuild_links()
+            self.save()
+
+    def symbols(self, query: str, limit: int = 500) -> List[SymbolInformation]:
+        """Symbols whose name contains the query (ignoring case)"""
+        query = query.lower()
+        found = []
+        with self._lock:
+            for path, entry in sorted(self.files.items()):
+                uri = None
+                for name, kind, line, column, container in entry.symbols:
+                    if query in name.lower():
+                        uri = uri or pathlib.Path(path).as_uri()
+                        found += [SymbolInformation(
+                            name=name, kind=kind,
+                            location=Location(uri, Range(Position(line, column), Position(line, column + len(name)))),
+                            container_name=container)]
+                        if len(found) >= limit:
+                            return found
+        return found
+
+    def link_at(self, path: pathlib.Path, loc: Position):
+        """The file linked to at this position of this file, if any"""
+        with self._lock:
+            entry = self.files.get(str(path))
+        if entry is None:
+            return None
+        for target, key, line, column, length in entry.links:
+            if line == loc.line and column <= loc.character <= column + length:
+                return target
+        return None
+
+    def references(self, target: pathlib.Path) -> List[Location]:
+        """Where the files of the workspace link to this file"""
+        target = str(target)
+        locations = []
+        with self._lock:
+            for path in sorted(self._linked_from.get(target, [])):
+                uri = pathlib.Path(path).as_uri()
+                for _target, key, line, column, length in self.files[path].links:
+                    if _target == target:
+                        locations += [Location(uri, Range(Position(line, column), Position(line, column + length)))]
+        return locations
+
+    def _rebuild_links(self):
+        linked_from = {}
+        for path, entry in self.files.items():
+            for target, *_ in entry.links:
+                linked_from.setdefault(target, set()).add(path)
+        self._linked_from = linked_from
+
+    def _index_file(self, path: str, stamp: tuple) -> IndexedFile:
+        self.parsed += 1
+        try:
+            with open(path, "r") as f:
+                text = f.read()
+            cwl, _ = parse_yaml(text, loader=self.yaml_loader)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Could not index {path}: {e}")
+            cwl = None
+
+        if not isinstance(cwl, dict):
+            return IndexedFile(stamp, None, [], [])
+
+        doc_uri = pathlib.Path(path).as_uri()
+        symbols, links = [], []
+        process_class = cwl.get("class") if isinstance(cwl.get("class"), str) else None
+        process_id = cwl.get("id") if isinstance(cwl.get("id"), str) else pathlib.Path(path).stem
+        try:
+            _process_symbols(cwl, process_id, symbols)
+            _links(cwl, doc_uri, links)
+        except (AttributeError, KeyError, IndexError, TypeError) as e:
+            # A node without positions, or a document in a shape we do not expect
+            logger.debug(f"Could not fully index {path}: {e}")
+        return IndexedFile(stamp, process_class, symbols, links)
+
+
+def _process_symbols(cwl: dict, process_id: str, symbols: list):
+    if "class" in cwl:
+        line, column = cwl.lc.key("class")
+        if "id" in cwl and isinstance(cwl["id"], str):
+            line, column = cwl.lc.value("id")
+        symbols += [(process_id, SymbolKind.File, line, column, cwl.get("class"))]
+
+    for field, kind in port_kinds.items():
+        for name, (line, column) in _named_entries(cwl.get(field)):
+            symbols += [(name, kind, line, column, process_id)]
+
+    for req_field in ["requirements", "hints"]:
+        requirements = cwl.get(req_field)
+        if isinstance(requirements, dict):
+            requirements = [requirements.get("SchemaDefRequirement")]
+        elif isinstance(requirements, list):
+            requirements = [req for req in requirements
+                            if isinstance(req, dict) and req.get("class") == "SchemaDefRequirement"]
+        else:
+            continue
+        for req in requirements:
+            if isinstance(req, dict):
+                _type_symbols(req.get("types"), process_id, symbols)
+
+
+def _type_symbols(types, process_id: str, symbols: list):
+    if not isinstance(types, list):
+        return
+    for _type in types:
+        if isinstance(_type, dict) and isinstance(_type.get("name"), str):
+            line, column = _type.lc.value("name")
+            symbols += [(_type["name"], SymbolKind.Struct, line, column, process_id)]
+
+
+def _named_entries(node):
+    # Ports and steps, written as a map (name: ...) or a list (- id: name)
+    if isinstance(node, dict):
+        for k in node.keys():
+            if isinstance(k, str):
+                yield k, node.lc.key(k)
+    elif isinstance(node, list):
+        for item in node:
+            if isinstance(item, dict) and isinstance(item.get("id"), str):
+                yield item["id"], item.lc.value("id")
+
+
+def _links(node, doc_uri: str, links: list):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k in link_keys and isinstance(v, str):
+                if urllib.parse.urlparse(v).scheme in ["file", ""]:
+                    target = str(resolve_file_path(doc_uri, urllib.parse.urlparse(v).path))
+                    line, column = node.lc.value(k)
+                    links += [(target, k, line, column, len(v))]
+            else:
+                _links(v, doc_uri, links)
+    elif isinstance(node, list):
+        for v in node:
+            _links(v, doc_uri, links)
+
+
+def _cwl_files(root: pathlib.Path):
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [d for d in dir_names if d not in skipped_dirs and not d.startswith(".")]
+        for f in file_names:
+            if f.endswith(".cwl"):
+                yield os.path.join(dir_path, f)
+
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _is_under(path: str, root: pathlib.Path):
+    try:
+        pathlib.Path(path).relative_to(root)
+        return True
+    except ValueError:
+        return False
+
+
+def index_path_for(scratch_path: pathlib.Path, roots: List[pathlib.Path]):
+    """Where to keep the index of these workspace folders"""
+    key = hashlib.sha256("\n".join(sorted(str(pathlib.Path(r).resolve()) for r in roots)).encode()).hexdigest()[:16]
+    return pathlib.Path(scratch_path, "workspace-index", f"{key}.json")
+
+
+def roots_from_initialize(params: dict) -> List[pathlib.Path]:
+    folders = params.get("workspaceFolders") or []
+    if folders:
+        return [un_mangle_uri(f["uri"]) for f in folders if "uri" in f]
+    if params.get("rootUri"):
+        return [un_mangle_uri(params["rootUri"])]
+    if params.get("rootPath"):
+        return [pathlib.Path(params["rootPath"])]
+    return []
@@ -9,13 +9,21 @@ from ruamel.yaml.parser import ParserError
 from ruamel.yaml.scanner import ScannerError
 from ruamel.yaml.composer import ComposerError
 from ruamel.yaml.compat import StringIO
+from ruamel.yaml.comments import CommentedMap
 
 from ..langserver.lspobjects import Diagnostic, DiagnosticSeverity, Range, Position
+from . import fastyaml
+from .lrucache import LRUCache
 
 
 import logging
 logger = logging.getLogger(__name__)
 
+# The fast loader's errors (PyYAML's) carry the same information as ruamel's
+yaml_errors = (ParserError, ScannerError, ComposerError)
+if fastyaml.available():
+    yaml_errors += (fastyaml.pyyaml.MarkedYAMLError,)
+
 _yaml_loader = YAML(typ="rt")
 # TODO: allow checking for duplicate keys, perhaps with self healing
 _yaml_loader.allow_duplicate_keys = True
@@ -23,12 +31,18 @@ _yaml_loader.allow_duplicate_keys = True
 fast_load = YAML(typ='safe')
 fast_load.indent(mapping=2, sequence=4, offset=2)
 fast_load.default_flow_style = False
+# The fast loader's maps and lists are written out as plain ones
+fast_load.Representer.add_representer(fastyaml.PositionalMap, fast_load.Representer.represent_dict)
+fast_load.Representer.add_representer(fastyaml.PositionalSeq, fast_load.Representer.represent_list)
 
 
 def fast_yaml_load(txt):
+    """Plain dicts and lists, for linked files. None if the YAML is not valid"""
     try:
+        if fastyaml.available():
+            return fastyaml.load(txt)
         return fast_load.load(txt)
-    except (ParserError, ScannerError) as e:
+    except yaml_errors:
         pass
 
 
@@ -38,51 +52,219 @@ def yaml_to_string(v: dict):
     return s.getvalue()
 
 
-def parse_yaml(text, retries=3) -> Tuple[dict, List[Diagnostic]]:
-    problems = []
-    try:
-        cwl = _yaml_loader.load(text)
-    except (ParserError, ScannerError, ComposerError) as e:
+# "rt": ruamel's round trip loader. "fast": see fastyaml
+loaders = ["rt", "fast"]
+
 
-        if retries:
+# Top level blocks parsed while recovering from an error, keyed by
+# (loader, first line, text). While the user is typing in one block, the
+# others come from here
+yaml_blocks = LRUCache(max_items=256)
 
-            # TODO: refactor - cleanup healing code
-            if e.problem == "could not find expected ':'":
-                return parse_yaml(heal_incomplete_key(text, e), retries - 1)
 
-            if e.problem == "mapping values are not allowed here":
-                return parse_yaml(heal_incomplete_key_typeB(text, e), retries - 1)
+def parse_yaml(text, retries=3, loader="rt", recoveries: list = None) -> Tuple[dict, List[Diagnostic]]:
+    """If the text is not valid YAML we try to repair it (see YAMLRecovery).
+    A description of each repair made is added to recoveries, if given"""
+    try:
+        return _load(text, loader), []
+    except yaml_errors as e:
+        error = e
+
+    recovery = YAMLRecovery(text, loader, retries)
+    cwl, error = recovery.recover(error)
+    if recoveries is not None:
+        recoveries += recovery.recoveries
 
-        cwl = None
-        problems = [
+    if cwl is None:
+        return None, [
             Diagnostic(
-                _range=Range(start=Position(e.problem_mark.line, e.problem_mark.column),
-                             end=Position(e.problem_mark.line, e.problem_mark.column)),
-                message=str(e),
+                _range=Range(start=Position(error.problem_mark.line, error.problem_mark.column),
+                             end=Position(error.problem_mark.line, error.problem_mark.column)),
+                message=str(error),
                 severity=DiagnosticSeverity.Error,
                 code="YAML err",
                 source="Benten")]
 
-    return cwl, problems
+    return cwl, []
+
+
+def _load(text, loader):
+    if loader == "fast" and fastyaml.available():
+        return fastyaml.load(text)
+    return _yaml_loader.load(text)
+
+
+class YAMLRecovery:
+    """Repairs the common errors of a document that is being typed in (a key
+    missing its ":") without parsing the whole document again for each try.
+
+    The document is cut into top level blocks (a top level key and the lines
+    under it). The block(s) the error is in are repaired and parsed on their
+    own, padded with empty lines so the positions are those in the document.
+    The other blocks are parsed on their own too, or taken from yaml_blocks
+    if they have not changed since the last recovery. A document that is not
+    a block style map is repaired as a whole"""
+
+    def __init__(self, text: str, loader: str, retries: int):
+        self.lines = text.splitlines()
+        self.loader = loader
+        self.retries = retries
+        self.recoveries = []
+
+    def recover(self, error):
+        """Returns (cwl, None) or, if the text could not be repaired, (None, error)"""
+        blocks = self._top_level_blocks()
+        if blocks is None:
+            return self._recover_whole(error)
+
+        regions, damaged = self._regions(blocks, error)
+        parts = []
+        for n, (start, end) in enumerate(regions):
+            part, part_error = self._load_region(start, end)
+            if part_error is not None:
+                if n != damaged:
+                    # We cut the document in the wrong place (e.g. in a flow
+                    # style list written across lines)
+                    return self._recover_whole(error)
+                # The error as it is in the user's text
+                return None, error
+            if not isinstance(part, dict):
+                return None, error
+            parts += [part]
+
+        return _merged(parts), None
+
+    def _top_level_blocks(self):
+        starts = []
+        for n, line in enumerate(self.lines):
+            if not line or line[0] in " \t#]},":
+                continue
+            if line == "-" or line.startswith(("- ", "[", "{", "? ", "%", "---", "...")):
+                return None
+            starts += [n]
+
+        if not starts:
+            return None
+        # Leading comments go with the first block
+        starts[0] = 0
+        return list(zip(starts, starts[1:] + [len(self.lines)]))
+
+    @staticmethod
+    def _regions(blocks, error):
+        # An error can involve more than one block, e.g. a key missing its ":"
+        # is only noticed at the next key
+        marks = [m.line for m in [error.problem_mark, error.context_mark] if m is not None]
+        marks += [error.problem_mark.line - 1]
+        damaged = [n for n, (start, end) in enumerate(blocks)
+                   if any(start <= line < end for line in marks)]
+        if not damaged:
+            damaged = [len(blocks) - 1]
+
+        first, last = min(damaged), max(damaged)
+        return blocks[:first] + [(blocks[first][0], blocks[last][1])] + blocks[last + 1:], first
 
+    def _load_region(self, start: int, end: int):
+        lines = self.lines[start:end]
+        key = (self.loader, start, "\n".join(lines))
+        cached = yaml_blocks.get(key)
+        if cached is not None:
+            self.recoveries += cached[1]
+            return cached[0], None
 
-def heal_incomplete_key(original_text, e):
+        recoveries = []
+        for attempt in range(self.retries + 1):
+            try:
+                part = _load(_padded(lines, start), self.loader)
+            except yaml_errors as e:
+                healed = heal(lines, e, start) if attempt < self.retries else None
+                if healed is None:
+                    return None, e
+                recoveries += [healed]
+                continue
+
+            yaml_blocks.put(key, (part, recoveries))
+            self.recoveries += recoveries
+            return part, None
+
+    def _recover_whole(self, error):
+        lines = list(self.lines)
+        for attempt in range(self.retries):
+            healed = heal(lines, error)
+            if healed is None:
+                break
+            self.recoveries += [healed]
+            try:
+                return _load("\n".join(lines), self.loader), None
+            except yaml_errors as e:
+                error = e
+
+        return None, error
+
+
+# Stands in for the blocks above the one being parsed, so that the parser sees
+# the block as part of a top level map, as it is in the document
+_placeholder_key = "__benten_preceding_blocks__"
+
+
+def _padded(lines: List[str], first_line: int):
+    if first_line == 0:
+        return "\n".join(lines) + "\n"
+    return "\n" * (first_line - 1) + f"{_placeholder_key}: \n" + "\n".join(lines) + "\n"
+
+
+def _merged(parts: list):
+    # As with the loaders, the first of a set of duplicate keys wins
+    fast = fastyaml.available() and isinstance(parts[0], fastyaml.PositionalMap)
+    merged = fastyaml.PositionalMap() if fast else CommentedMap()
+    table = {}
+    for part in parts:
+        for k, v in part.items():
+            if k not in merged and k != _placeholder_key:
+                merged[k] = v
+                table[k] = part.lc.key(k) + part.lc.value(k)
+
+    if fast:
+        merged.lc = fastyaml.MapPositions(0, 0, table)
+    else:
+        merged.lc.line, merged.lc.col = 0, 0
+        for k, pos in table.items():
+            merged.lc.add_kv_line_col(k, list(pos))
+    return merged
+
+
+def heal(lines: List[str], e, first_line: int = 0):
+    """Repair, in place, the lines (starting at first_line of the document) for
+    this error. Returns a description of the repair or None if we can't"""
+    if e.problem == "could not find expected ':'":
+        return heal_incomplete_key(lines, e, first_line)
+
+    if e.problem in ["mapping values are not allowed here",
+                     "mapping values are not allowed in this context"]:
+        return heal_incomplete_key_typeB(lines, e, first_line)
+
+    return None
+
+
+def heal_incomplete_key(lines: List[str], e, first_line: int = 0):
     logger.debug("Attempting to heal incomplete key")
-    lines = original_text.splitlines(keepends=False)
     # TODO: This only works for block style, but it does the job
-    lines[e.context_mark.line] = lines[e.context_mark.line] + ":"
-    return "\n".join(lines)
+    ln = e.context_mark.line - first_line
+    if not 0 <= ln < len(lines):
+        return None
+
+    lines[ln] = lines[ln] + ":"
+    return f"Added ':' to line {ln + first_line + 1}"
 
 
-def heal_incomplete_key_typeB(original_text, e):
+def heal_incomplete_key_typeB(lines: List[str], e, first_line: int = 0):
     logger.debug("Attempting to heal incomplete key")
-    lines = original_text.splitlines(keepends=False)
     # Walk back up to first non-empty line and slap a ":" on the end
-    ln = e.problem_mark.line - 1
+    ln = min(e.problem_mark.line - first_line, len(lines)) - 1
     while ln > 0 and len(lines[ln].strip()) == 0:
         ln -= 1
 
-    if len(lines[ln]):
-        lines[ln] = lines[ln] + ":"
+    if ln < 0 or not len(lines[ln]):
+        return None
 
-    return "\n".join(lines)
+    lines[ln] = lines[ln] + ":"
+    return f"Added ':' to line {ln + first_line + 1}"
@@ -3,11 +3,13 @@
 import os
 import sys
 from pathlib import Path as P
+import time
+import threading
 import configparser
-import json
+from collections.abc import Mapping
 
-from pkg_resources import resource_stream
-from .cwl.specification import parse_schema
+from pkg_resources import resource_string
+from .cwl.modelcache import load_language_model
 
 import logging
 
@@ -40,6 +42,7 @@ class Configuration(configparser.ConfigParser):
         self.cfg_path = P(user_dir, sbg_config_dir)
         self.log_path = P(user_dir, sbg_config_dir, "logs")
         self.scratch_path = P(user_dir, sbg_config_dir, "scratch")
+        self.cache_path = P(user_dir, sbg_config_dir, "cache")
 
         if not self.cfg_path.exists():
             self.cfg_path.mkdir(parents=True)
@@ -50,13 +53,31 @@ class Configuration(configparser.ConfigParser):
         if not self.scratch_path.exists():
             self.scratch_path.mkdir(parents=True)
 
-        self.lang_models = {}
+        if not self.cache_path.exists():
+            self.cache_path.mkdir(parents=True)
+
+        self.lang_models = LanguageModels(cache_path=self.cache_path)
+
+        # Language models to build in the background right after the client
+        # initializes. The rest are built the first time a document needs them
+        self.preload_versions = []
+
+        # Seconds of quiet after a change before a document is re-analyzed
+        self.analysis_delay = 0.3
+        self.analysis_workers = 2
+        # Take over the analysis of unchanged workflow steps when re-analyzing
+        self.incremental_analysis = True
+        # "fast" loads documents into plain dicts and lists with a table of
+        # positions (needs PyYAML), "rt" uses ruamel's round trip loader
+        self.yaml_loader = "fast"
+        # TCP mode: the number of processes forked to serve connections. With
+        # 0, every connection is served on a thread of this process
+        self.workers = 0
 
     # We do this separately to give the caller a chance to set up logging
     def initialize(self):
         # TODO: allow multiple language specifications
-        logging.info("Loading language model ...")
-        self._load_language_files()
+        logging.info("Language models will be loaded on demand")
 
     # https://stackoverflow.com/questions/1611799/preserve-case-in-configparser
     def optionxform(self, optionstr):
@@ -74,10 +95,72 @@ class Configuration(configparser.ConfigParser):
         else:
             return P(self.cfg_path, path)
 
-    def _load_language_files(self):
-        for version in supported_versions:
-            rsc = resource_stream("benten_schemas", f"schema-{version}.json")
-            schema = json.load(rsc)
-            rsc.close()
-            self.lang_models[version] = parse_schema(schema)
-            logger.info(f"Loaded language schema {version}")
+
+class LanguageModels(Mapping):
+    """Maps CWL version to the type dictionary for that version. A type dictionary
+    is only loaded the first time it is asked for."""
+
+    def __init__(self, cache_path: P = None, versions: list = None):
+        self.cache_path = cache_path
+        self.versions = list(versions or supported_versions)
+        self._models = {}
+        self._version_locks = {v: threading.Lock() for v in self.versions}
+
+    def __getitem__(self, version):
+        model = self._models.get(version)
+        if model is not None:
+            return model
+
+        if version not in self._version_locks:
+            raise KeyError(version)
+
+        # One lock per version so that a background pre-warm of one version does
+        # not hold up a document that needs another
+        with self._version_locks[version]:
+            if version not in self._models:
+                self._models[version] = self._load(version)
+            return self._models[version]
+
+    def __contains__(self, version):
+        return version in self._version_locks
+
+    def __iter__(self):
+        return iter(self.versions)
+
+    def __len__(self):
+        return len(self.versions)
+
+    def loaded(self):
+        return [v for v in self.versions if v in self._models]
+
+    def load(self, versions: list = None):
+        """Load the given versions (all, if None) now"""
+        for v in (self.versions if versions is None else versions):
+            _ = self[v]
+
+    def prewarm(self, versions: list = None):
+        """Load the given versions (all, if None) on a background thread"""
+        versions = [v for v in (self.versions if versions is None else versions)
+                    if v in self and v not in self._models]
+        if not versions:
+            return None
+
+        def _load_all():
+            for v in versions:
+                _ = self[v]
+
+        t = threading.Thread(target=_load_all, name="benten-lang-model-prewarm", daemon=True)
+        t.start()
+        return t
+
+    def _load(self, version):
+        t0 = time.perf_counter()
+        schema_text = resource_string("benten_schemas", f"schema-{version}.json")
+        t_read = time.perf_counter() - t0
+
+        model, timings = load_language_model(version, schema_text, self.cache_path)
+
+        source = "parsed" if "parse" in timings else "cached"
+        breakdown = ", ".join(f"{k}: {v * 1000:.1f}ms" for k, v in timings.items())
+        logger.info(f"Loaded language schema {version} ({source}) read: {t_read * 1000:.1f}ms, {breakdown}")
+        return model
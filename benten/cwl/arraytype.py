@@ -3,7 +3,7 @@
 from .basetype import CWLBaseType, Intelligence, MapSubjectPredicate, TypeCheck, Match
 from ..langserver.lspobjects import Range
 from ..code.intelligencecontext import IntelligenceContext
-from .typeinference import infer_type
+from .typeinference import infer_type, TypeList
 from .lib import get_range_for_value
 
 
@@ -13,7 +13,7 @@ class CWLArrayType(CWLBaseType):
         super().__init__(name)
         if not isinstance(allowed_types, list):
             allowed_types = [allowed_types]
-        self.types = allowed_types
+        self.types = TypeList(allowed_types)
 
     def check(self, node, node_key: str=None, map_sp: MapSubjectPredicate=None) -> TypeCheck:
         if isinstance(node, list):
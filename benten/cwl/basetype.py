@@ -21,6 +21,29 @@ class Match(IntEnum):
     No = 2
 
 
+class NodeKind(IntEnum):
+    Null = 0
+    String = 1
+    Number = 2
+    List = 3
+    Map = 4
+    Other = 5
+
+
+def node_kind(node) -> NodeKind:
+    if node is None:
+        return NodeKind.Null
+    if isinstance(node, str):
+        return NodeKind.String
+    if isinstance(node, (bool, int)):
+        return NodeKind.Number
+    if isinstance(node, list):
+        return NodeKind.List
+    if isinstance(node, dict):
+        return NodeKind.Map
+    return NodeKind.Other
+
+
 @dataclass
 class TypeCheck:
     cwl_type: 'CWLBaseType'
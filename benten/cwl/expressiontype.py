@@ -1,6 +1,11 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 import re
+import os
+import json
+import hashlib
+import pathlib
+import threading
 from enum import IntEnum
 
 import dukpy
@@ -9,6 +14,8 @@ from .basetype import (CWLBaseType, MapSubjectPredicate, TypeCheck, Match,
                        Intelligence, IntelligenceContext)
 from ..langserver.lspobjects import Range, Hover, Location
 from ..code.intelligence import LookupNode
+from ..code.jsengine import js_engine, library_key, ExpressionTimeout, JSWorkerFailed
+from ..code.lrucache import LRUCache
 
 import logging
 logger = logging.getLogger(__name__)
@@ -18,6 +25,7 @@ parameter_ref = re.compile(r"\$\(((.(?<!\$({|\()))*)\)", flags=re.DOTALL | re.M)
 expression_ref = re.compile(r"\${((.(?<!\$({|\()))*)}", flags=re.DOTALL | re.M)
 
 inputs_scan = re.compile(r"inputs\.([\w]*)", flags=re.DOTALL | re.M)
+inputs_word = re.compile(r"\binputs\b")
 
 
 class CWLExpressionType(CWLBaseType):
@@ -48,6 +56,14 @@ class CWLExpression(CWLBaseType):
     def guess_inputs(self):
         return [inp.groups()[0] for inp in inputs_scan.finditer(self.text)]
 
+    def referenced_inputs(self):
+        """The inputs this expression uses, or None if we can't tell (inputs["x"],
+        for k in inputs ...) or it uses none"""
+        names = self.guess_inputs()
+        if not names or len(names) != len(inputs_word.findall(self.text)):
+            return None
+        return names
+
     def parse(self,
               doc_uri: str,
               node,
@@ -89,17 +105,24 @@ class CWLExpression(CWLBaseType):
             else:
                 return False
 
-        job_inputs = self.execution_context.sample_data["inputs"]
-        job_outputs = self.execution_context.sample_data["outputs"]
+        # Sample values are only generated for the inputs the expression uses
+        # and for the port it belongs to. In a step, the inputs are the step's
+        input_names = self.referenced_inputs()
+        job_inputs = {} if _self_is_in_step(self.intel_context.path) \
+            else self.execution_context.sample_inputs(input_names)
         cwl_self = None
 
         # Deal with filling out self
         try:
             if _self_is_io(self.intel_context.path):
                 if "inputs" in self.intel_context.path:
-                    cwl_self = job_inputs.get(self.intel_context.path[1])
+                    port_id = self.intel_context.path[1]
+                    if input_names is not None:
+                        job_inputs = self.execution_context.sample_inputs(input_names + [port_id])
+                    cwl_self = job_inputs.get(port_id)
                 elif "outputs" in self.intel_context.path:
-                    cwl_self = job_outputs[self.intel_context.path[1]]
+                    port_id = self.intel_context.path[1]
+                    cwl_self = self.execution_context.sample_outputs([port_id]).get(port_id)
 
             elif _self_is_outputEval(self.intel_context.path):
                 # todo: Need to check for `glob`
@@ -112,6 +135,8 @@ class CWLExpression(CWLBaseType):
         except (ValueError, IndexError) as e:
             pass
 
+        expression_results.check_job_file(self.execution_context.get_sample_data_file_path())
+
         if job_inputs:
             res = "".join(
                 evaluate_expression(
@@ -130,7 +155,7 @@ class CWLExpression(CWLBaseType):
 
     def definition(self):
         # Hijacking this to show the sample inputs file
-        return Location(self.execution_context.get_sample_data_file_path().as_uri())
+        return Location(self.execution_context.write_sample_data_file().as_uri())
 
     def _split_fragments(self) -> list:
         refs = parameter_ref.finditer(self.text)
@@ -207,6 +232,52 @@ function benten_eval_func() {{
 benten_eval_func()"""
 
 
+class ExpressionResults:
+    """Results of evaluated expressions, keyed by everything the result depends on:
+    the expression, the expressionLib, runtime, inputs and self"""
+
+    def __init__(self, max_items: int = 2048):
+        self._cache = LRUCache(max_items=max_items)
+        self._job_stamps = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(expression: str, exp_type: ExpressionType,
+            expression_lib: list, runtime: dict, inputs: dict, cwl_self: dict):
+        job = json.dumps([runtime, inputs, cwl_self], sort_keys=True, default=str)
+        return (exp_type, expression, library_key(expression_lib or []),
+                hashlib.sha256(job.encode()).hexdigest())
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def put(self, key, result: str):
+        self._cache.put(key, result)
+
+    def check_job_file(self, job_file: pathlib.Path):
+        """Drop all results if this sample job file was edited since we last looked"""
+        try:
+            st = os.stat(str(job_file))
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+
+        with self._lock:
+            old_stamp = self._job_stamps.get(str(job_file))
+            self._job_stamps[str(job_file)] = stamp
+        if old_stamp is not None and old_stamp != stamp:
+            self._cache.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    def info(self):
+        return self._cache.info()
+
+
+expression_results = ExpressionResults()
+
+
 def evaluate_expression(
         expression: str, exp_type: ExpressionType,
         expression_lib: list, runtime: dict, inputs: dict, cwl_self: dict):
@@ -214,25 +285,38 @@ def evaluate_expression(
         return expression
 
     if inputs:
+        key = expression_results.key(expression, exp_type, expression_lib, runtime, inputs, cwl_self)
+        res = expression_results.get(key)
+        if res is not None:
+            return res
+
         if exp_type == ExpressionType.ParameterReference:
             full_expression = parameter_reference_template(expression)
         else:
             full_expression = js_template(expression)
 
         try:
-            res = dukpy.evaljs(expression_lib + [full_expression],
-                               runtime=runtime,
-                               inputs=inputs,
-                               cwl_self=cwl_self)
+            res = js_engine.evaljs(expression_lib, full_expression,
+                                   runtime=runtime,
+                                   inputs=inputs,
+                                   cwl_self=cwl_self)
 
             if res is None and exp_type == ExpressionType.JSExpression:
                 res = "Got a 'null' result. Do you have a `return` for your JS expression?"
             else:
                 res = str(res)
 
+        except (ExpressionTimeout, JSWorkerFailed) as e:
+            # Not kept: the next hover may well get a result
+            res = str(e).splitlines()[0]
+            logger.error(res)
+            return res
+
         except dukpy.JSRuntimeError as e:
             res = str(e).splitlines()[0]
             logger.error(res)
+
+        expression_results.put(key, res)
     else:
         res = "Job inputs have not been filled out"
 
@@ -2,11 +2,10 @@
 
 import pathlib
 import urllib.parse
-import urllib.request
-import urllib.error
 
 from ..langserver.lspobjects import Diagnostic, DiagnosticSeverity, Range, Position
-from ..code.yaml import fast_yaml_load
+from ..code.linkedfilecache import linked_file_cache
+from ..code.remotefetcher import remote_fetcher
 
 
 def get_range_for_key(parent, key):
@@ -116,23 +115,34 @@ def list_as_map(node, key_field, problems):
 
 
 def validate_and_load_linked_file(doc_uri: str, path: str, loc: Range, problems: list) -> (str, str, dict):
+    """(path, contents, parsed contents). The parsed contents are None if the
+    file is remote and still being fetched"""
 
     link_url = urllib.parse.urlparse(path)
     full_path, contents, node_dict = link_url.path, "", {}
 
     if link_url.scheme not in ["file://", ""]:
-        try:
-            contents = urllib.request.urlopen(path).read().decode('utf-8')
-            node_dict = fast_yaml_load(contents)
-        except urllib.error.HTTPError:
+        remote = remote_fetcher.get(path, doc_uri=doc_uri)
+        if remote is None:
+            # Still being fetched. The document will be analyzed again once it arrives
+            return path, contents, None
+
+        if remote.missing:
             problems += [
                 Diagnostic(
                     _range=loc,
                     message=f"Missing URL: {path}",
                     severity=DiagnosticSeverity.Error)
             ]
+        elif not remote.ok:
+            problems += [
+                Diagnostic(
+                    _range=loc,
+                    message=f"Could not fetch {path}: {remote.error}",
+                    severity=DiagnosticSeverity.Warning)
+            ]
 
-        return path, contents, node_dict
+        return path, remote.contents, remote.node_dict or {}
 
     linked_file = resolve_file_path(doc_uri, path)
     if not linked_file.exists():
@@ -150,8 +160,8 @@ def validate_and_load_linked_file(doc_uri: str, path: str, loc: Range, problems:
                 severity=DiagnosticSeverity.Error)
         ]
     else:
-        contents = linked_file.open("r").read()
-        node_dict = fast_yaml_load(contents)
+        _linked = linked_file_cache.load(linked_file)
+        contents, node_dict = _linked.contents, _linked.node_dict
 
     return linked_file, contents, node_dict
 
@@ -20,6 +20,8 @@ class CWLLinkedFile(CWLBaseType):
         self.full_path: pathlib.Path = None
         self._contents: str = None
         self.node_dict: dict = None
+        # A remote file that is still being fetched
+        self.pending = False
         self.extension: str = extension
 
     def parse(self,
@@ -36,6 +38,9 @@ class CWLLinkedFile(CWLBaseType):
 
         self.full_path, self._contents, self.node_dict = \
             validate_and_load_linked_file(doc_uri, self.prefix, value_range, problems)
+        self.pending = self.node_dict is None
+        if self.pending:
+            self.node_dict = {}
         ln = LookupNode(loc=value_range)
         ln.intelligence_node = self
         code_intel.add_lookup_node(ln)
@@ -7,7 +7,7 @@ from ..langserver.lspobjects import Range
 from ..code.intelligence import LookupNode, IntelligenceNode
 from ..code.intelligencecontext import copy_context
 from .lib import ListOrMap
-from .typeinference import infer_type
+from .typeinference import infer_type, TypeList
 from ..code import workflow
 
 
@@ -30,7 +30,7 @@ class CWLListOrMapType(CWLBaseType):
         self.map_subject_predicate = map_sp
         if not isinstance(allowed_types, list):
             allowed_types = [allowed_types]
-        self.types = allowed_types
+        self.types = TypeList(allowed_types)
         self.enclosing_workflow = None
 
     def check(self, node, node_key: str=None, map_sp: MapSubjectPredicate=None) -> TypeCheck:
@@ -101,6 +101,16 @@ class CWLListOrMapType(CWLBaseType):
             if self.name == "steps":
                 this_intel_context.workflow_step_intelligence = workflow.WFStepIntelligence(step_id=k)
 
+                # An unchanged step is taken over from the previous analysis
+                step_reuse, step_key = code_intel.step_reuse, None
+                if step_reuse is not None and obj.was_dict:
+                    step_key = step_reuse.step_key(doc_uri, v, obj.get_range_for_id(k), code_intel)
+                    step_intel = step_reuse.reuse(k, step_key, obj.get_range_for_id(k), code_intel, problems)
+                    if step_intel is not None:
+                        intel_context.workflow.add_step_intel(k, step_intel)
+                        continue
+                n_lookup_nodes, n_problems = len(code_intel.lookup_table), len(problems)
+
             inferred_type.parse(
                 doc_uri=doc_uri,
                 node=v,
@@ -115,6 +125,11 @@ class CWLListOrMapType(CWLBaseType):
 
             if self.name == "steps":
                 intel_context.workflow.add_step_intel(k, this_intel_context.workflow_step_intelligence)
+                if step_key is not None:
+                    step_reuse.record(
+                        k, step_key, obj.get_range_for_id(k),
+                        code_intel.lookup_table[n_lookup_nodes:], problems[n_problems:],
+                        this_intel_context.workflow_step_intelligence)
 
             if obj.was_dict:
                 # The keys get fancy completions
@@ -0,0 +1,149 @@
+"""On-disk cache of the parsed language models.
+
+Parsing the bundled schemas is the bulk of the server's start up time. The
+parsed type graph is pickled into the configuration directory and reused on
+later starts. A cache file is keyed by a digest of the schema text, the Benten
+version and the source of the type classes, so editing either the schema or
+the code silently invalidates it."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import pathlib
+
+from .specification import parse_schema
+from ..version import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+cache_format = b"benten-lang-model-1"
+_code_digest = None
+
+
+def pickled_sources():
+    # The pickled objects are instances of the classes in this package, of
+    # IntelligenceNode subclasses (RecordKeyIntelligence) and, once completions
+    # and docs are filled in, of the LSP objects. A change to any of them has
+    # to invalidate the cache
+    benten_dir = pathlib.Path(__file__).parent.parent
+    return sorted(pathlib.Path(__file__).parent.glob("*.py")) + [
+        benten_dir / "code" / "intelligence.py",
+        benten_dir / "langserver" / "lspobjects.py"
+    ]
+
+
+def code_digest():
+    global _code_digest
+    if _code_digest is None:
+        h = hashlib.sha256(__version__.encode())
+        for src in pickled_sources():
+            h.update(src.read_bytes())
+        _code_digest = h.hexdigest()
+    return _code_digest
+
+
+def cache_key(schema_text: bytes):
+    h = hashlib.sha256(cache_format)
+    h.update(code_digest().encode())
+    h.update(schema_text)
+    return h.hexdigest()
+
+
+def load_language_model(version: str, schema_text: bytes, cache_dir: pathlib.Path = None):
+    """Return the type dictionary for this schema, from the cache if possible.
+    Also returns a dictionary of timings (in seconds) for the log."""
+    timings = {}
+
+    t0 = time.perf_counter()
+    key = cache_key(schema_text)
+    timings["hash"] = time.perf_counter() - t0
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = pathlib.Path(cache_dir, f"schema-{version}-{key[:16]}.pickle")
+
+        t0 = time.perf_counter()
+        type_dict = _read_cache(cache_file, key)
+        timings["cache-read"] = time.perf_counter() - t0
+        if type_dict is not None:
+            return type_dict, timings
+
+    t0 = time.perf_counter()
+    schema = json.loads(schema_text)
+    timings["json"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    type_dict = parse_schema(schema)
+    timings["parse"] = time.perf_counter() - t0
+
+    if cache_file is not None:
+        t0 = time.perf_counter()
+        _write_cache(cache_file, key, type_dict)
+        timings["cache-write"] = time.perf_counter() - t0
+
+    return type_dict, timings
+
+
+def _read_cache(cache_file: pathlib.Path, key: str):
+    if not cache_file.exists():
+        return None
+
+    try:
+        with cache_file.open("rb") as f:
+            header = f.readline().split()
+            payload = f.read()
+    except OSError as e:
+        logger.warning(f"Could not read language model cache {cache_file}: {e}")
+        return None
+
+    if len(header) != 3 or header[0] != cache_format or header[1].decode() != key:
+        logger.info(f"Ignoring stale language model cache {cache_file}")
+        return None
+
+    if hashlib.sha256(payload).hexdigest() != header[2].decode():
+        logger.warning(f"Checksum mismatch in language model cache {cache_file}")
+        return None
+
+    try:
+        return pickle.loads(payload)
+    except Exception as e:
+        logger.warning(f"Could not unpickle language model cache {cache_file}: {e}")
+        return None
+
+
+def _write_cache(cache_file: pathlib.Path, key: str, type_dict: dict):
+    try:
+        payload = pickle.dumps(type_dict, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.warning(f"Could not pickle language model: {e}")
+        return
+
+    header = b" ".join([cache_format, key.encode(), hashlib.sha256(payload).hexdigest().encode()])
+
+    # Old cache files for this version are now useless
+    version_prefix = cache_file.name.rsplit("-", 1)[0]
+    for old in cache_file.parent.glob(version_prefix + "-*.pickle"):
+        if old != cache_file and old.name.rsplit("-", 1)[0] == version_prefix:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    # Write to a temporary file and move it into place so that a concurrently
+    # starting server never sees a half written cache
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with tmp_file.open("wb") as f:
+            f.write(header + b"\n")
+            f.write(payload)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write language model cache {cache_file}: {e}")
+        if tmp_file.exists():
+            tmp_file.unlink()
@@ -13,7 +13,7 @@ from ..langserver.lspobjects import Range, CompletionItem, Diagnostic, Diagnosti
 from ..code.intelligence import LookupNode
 from ..code.intelligencecontext import copy_context
 from ..code.workflow import Workflow
-from .typeinference import infer_type
+from .typeinference import infer_type, TypeList
 from .lib import get_range_for_key, get_range_for_value
 from ..code import workflow
 
@@ -26,12 +26,15 @@ class CWLRecordType(CWLBaseType):
     def __init__(self, name: str, doc: str, fields: Dict[str, 'CWLFieldType']):
         super().__init__(name, doc=doc)
         self.fields = fields
-        self.required_fields = set((k for k, v in self.fields.items() if v.required))
-        self.all_fields = set(self.fields.keys())
+        self.init()
 
     def init(self):
         self.required_fields = set((k for k, v in self.fields.items() if v.required))
         self.all_fields = set(self.fields.keys())
+        self.field_names = list(self.fields.keys())
+        # Shared by every key of every document that is of this type
+        self.key_intelligence = {k: RecordKeyIntelligence(self, k) for k in self.fields.keys()}
+        self.unknown_key_intelligence = RecordKeyIntelligence(self)
 
     def check(self, node, node_key: str=None, map_sp: MapSubjectPredicate=None) -> TypeCheck:
 
@@ -109,15 +112,8 @@ class CWLRecordType(CWLBaseType):
                 value_range = get_range_for_value(node, k)
 
                 # key completer
-                _field = self.fields.get(k)
-                _key_doc = (_field.doc or "") if _field is not None else ""
-                _key_doc += "\n---\n## Sibling fields\n\n```" + \
-                            "\n".join(f"- {k}" for k in self.fields.keys()) + \
-                            "\n```\n"
-                _key_doc += f"\n---\n## {self.name or '-'}\n\n" + (self.doc or "")
                 ln = LookupNode(loc=key_range)
-                ln.intelligence_node = IntelligenceNode(
-                    completions=list(self.fields.keys()), doc=_key_doc) # self
+                ln.intelligence_node = self.key_intelligence.get(k, self.unknown_key_intelligence)
                 code_intel.add_lookup_node(ln)
 
             # TODO: looks like this logic and the logic in lomtype can be combined
@@ -191,6 +187,7 @@ class CWLRecordType(CWLBaseType):
             if self.name == "WorkflowStep" and k == "run":
                 if isinstance(inferred_type, CWLLinkedFile):
                     linked_process = inferred_type.node_dict
+                    intel_context.workflow_step_intelligence.run_pending = inferred_type.pending
                 else:
                     linked_process = child_node
 
@@ -205,6 +202,31 @@ class CWLRecordType(CWLBaseType):
         return [CompletionItem(label=k) for k in self.fields.keys()]
 
 
+class RecordKeyIntelligence(IntelligenceNode):
+    """Completions and documentation for a key of a record. Made once per
+    (record type, field) with the language model. The documentation is only
+    put together the first time it is asked for"""
+
+    def __init__(self, record: CWLRecordType, field_name: str = None):
+        # The completions are the record's fields, as is
+        self._completions = record.field_names
+        self.record = record
+        self.field_name = field_name
+        self._doc = None
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            _field = self.record.fields.get(self.field_name)
+            _key_doc = (_field.doc or "") if _field is not None else ""
+            _key_doc += "\n---\n## Sibling fields\n\n```" + \
+                        "\n".join(f"- {k}" for k in self.record.fields.keys()) + \
+                        "\n```\n"
+            _key_doc += f"\n---\n## {self.record.name or '-'}\n\n" + (self.record.doc or "")
+            self._doc = _key_doc
+        return self._doc
+
+
 # Our sources can be singular or a list: we need to handle both
 def set_port_completers(code_intel, node, value_range, get_source_completer):
     if isinstance(node, list):
@@ -226,7 +248,7 @@ class CWLFieldType(CWLBaseType):
         self.required = required
         if not isinstance(allowed_types, list):
             allowed_types = [allowed_types]
-        self.types = allowed_types
+        self.types = TypeList(allowed_types)
 
 
 def _put_this_field_first(_field_iterator, field_name):
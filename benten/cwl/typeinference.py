@@ -2,15 +2,153 @@
 
 from typing import List
 
-from .basetype import CWLBaseType, MapSubjectPredicate, TypeCheck, Match
+from .basetype import CWLBaseType, MapSubjectPredicate, TypeCheck, Match, NodeKind, node_kind
 from .unknowntype import CWLUnknownType
 from .anytype import CWLAnyType
 from .namespacedtype import CWLNameSpacedType
 from .importincludetype import CWLImportInclude, is_import, is_include
 
 
+class TypeList(list):
+    """The types allowed for a field. Nodes that state their class are looked
+    up by name. For other nodes, the type decided is remembered for each shape
+    of node (see node_shape). The checks of the types depend only on the shape
+    of a node, so a tool's dozens of inputBinding: {position: N, prefix: ...}
+    are decided once"""
+
+    def __init__(self, types=()):
+        super().__init__(types)
+        # Made with the list, when the schema is loaded, and pickled with the model
+        self.names = {}
+        self.first_any = None
+        for n, _type in enumerate(self):
+            if isinstance(_type.name, str):
+                self.names.setdefault(_type.name, n)
+            if self.first_any is None and isinstance(_type, CWLAnyType):
+                self.first_any = n
+        self.memo = {}
+
+    def __getstate__(self):
+        # The memo is not pickled with the language model
+        state = dict(self.__dict__)
+        state["memo"] = {}
+        return state
+
+
+# Shapes remembered per list of allowed types
+memo_size = 1024
+
+
+def node_shape(node, kind: NodeKind, key: str, map_sp: MapSubjectPredicate):
+    """Everything the choice of type for a node depends on, once its class is
+    not stated: the kind of node, the keys of a map, whether a string holds an
+    expression and where the node sits (key, map_sp). None if we can not tell
+    (unhashable keys)"""
+    if kind == NodeKind.Map:
+        try:
+            detail = frozenset(node)
+        except TypeError:
+            return None
+    elif kind == NodeKind.String:
+        detail = "$(" in node or "${" in node
+    else:
+        detail = None
+
+    sp = (map_sp.subject, map_sp.predicate) if map_sp is not None else None
+    return kind, detail, key is None, sp
+
+
 def infer_type(node, allowed_types,
                key: str = None, map_sp: MapSubjectPredicate = None) -> CWLBaseType:
+    if not isinstance(allowed_types, TypeList):
+        return infer_type_by_checks(node, allowed_types, key, map_sp)
+
+    explicit_type = get_explicit_type_str(node, key, map_sp)
+    if explicit_type is not None:
+        res = _by_name(explicit_type, allowed_types)
+        return res if res is not None else infer_type_by_checks(node, allowed_types, key, map_sp)
+
+    shape = None
+    if not (is_import(node) or is_include(node)):
+        shape = node_shape(node, node_kind(node), key, map_sp)
+    if shape is None:
+        return infer_type_by_checks(node, allowed_types, key, map_sp)
+
+    memo = allowed_types.memo
+    n = memo.get(shape, -1)
+    if n == -1:
+        n = _decide(node, allowed_types, key, map_sp)
+        if len(memo) >= memo_size:
+            memo.clear()
+        memo[shape] = n
+
+    if n is None:
+        return infer_type_by_checks(node, allowed_types, key, map_sp)
+
+    # Types made for the node (null, expressions, data types ...) are made
+    # again, so that no two nodes share them
+    _type = allowed_types[n]
+    if _type.name == "null":
+        return CWLBaseType(name=_type)
+    if _type.name in ["string", "boolean", "int", "long"]:
+        return _type
+    return _type.check(node, key, map_sp).cwl_type
+
+
+def _by_name(explicit_type, allowed_types: TypeList):
+    # What check_types gives for a node that states its class. None for an Any
+    # type asked to be a class, which is left to check_types
+    if not isinstance(explicit_type, str):
+        return None
+
+    if ":" in explicit_type:
+        return CWLNameSpacedType(explicit_type)
+
+    n = allowed_types.names.get(explicit_type)
+    if allowed_types.first_any is not None and (n is None or allowed_types.first_any < n):
+        return None
+    if n is not None:
+        return allowed_types[n]
+
+    return CWLUnknownType(name=explicit_type, expected=[t.name for t in allowed_types])
+
+
+def _decide(node, allowed_types, key: str, map_sp: MapSubjectPredicate):
+    # The position of the type infer_type_by_checks gives for a node that does
+    # not state its class and is not an $import or $include. None if no type matches
+    maybe = None
+    for n, _type in enumerate(allowed_types):
+        if _type.name == "null":
+            if node is None:
+                return n
+            continue
+
+        if _type.name == "string":
+            if node is None:
+                return n
+            if isinstance(node, str) and maybe is None:
+                maybe = n
+            continue
+
+        if _type.name in ['boolean', 'int', 'long']:
+            if node is None or isinstance(node, (str, bool, int)):
+                return n
+            continue
+
+        check_result = _type.check(node, key, map_sp)
+        if check_result.match == Match.Yes:
+            return n
+        if check_result.match == Match.Maybe and maybe is None:
+            maybe = n
+
+    if maybe is None and len(allowed_types) == 1:
+        # As in infer_type_by_checks, a lone type is the answer even if it does not match
+        return 0
+    return maybe
+
+
+def infer_type_by_checks(node, allowed_types,
+                         key: str = None, map_sp: MapSubjectPredicate = None) -> CWLBaseType:
     type_check_results = check_types(node, allowed_types, key, map_sp)
     for tcr in type_check_results:
         if tcr.match == Match.Yes:
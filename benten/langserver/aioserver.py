@@ -0,0 +1,245 @@
+"""An asyncio transport and message loop for the language server.
+
+The connection reads messages on the event loop while earlier ones are being
+handled. Requests and notifications are handled in order, one at a time, on
+an executor thread by the same LangServer.handle (and serve_* methods) as
+the threaded server, so the analysis and everything else that is CPU bound
+stays off the event loop. Responses to requests the server sends the
+client complete a future waiting on the request's id.
+
+The handlers, and the analysis workers publishing diagnostics, write from
+their own threads: writes are handed over to the event loop."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import sys
+
+from .jsonrpc import JSONRPC2Connection, JSONRPC2ProtocolError, codec, frame
+from .server import LangServer
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class AsyncJSONRPC2Connection:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self._next_id = 1
+        # id of a request we sent -> future for the client's response
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    async def read_message(self):
+        """The next request or notification from the client. Responses to our
+        requests are passed on to whoever is waiting for them"""
+        while True:
+            msg = await self._receive()
+            if "method" not in msg and msg.get("id") in self._pending:
+                future = self._pending.pop(msg["id"])
+                if not future.done():
+                    future.set_result(msg)
+                continue
+            return msg
+
+    async def _receive(self):
+        length = None
+        while True:
+            line = await self.reader.readline()
+            if line == b"":
+                raise EOFError()
+            if line == b"\r\n":
+                break
+            header_length = JSONRPC2Connection._read_header_content_length(line)
+            if header_length is not None:
+                length = header_length
+
+        if length is None:
+            raise JSONRPC2ProtocolError("Missing Content-Length header")
+        try:
+            body = await self.reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise EOFError()
+        logger.debug("RECV %s", body)
+        return codec.loads(body)
+
+    def _send(self, body):
+        header, body = frame(body)
+        if self._on_loop():
+            self._write(header, body)
+        else:
+            self.loop.call_soon_threadsafe(self._write, header, body)
+        logger.debug("SEND %s", body)
+
+    def _write(self, header: bytes, body: bytes):
+        if not self.writer.is_closing():
+            self.writer.writelines([header, body])
+
+    def _on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    async def drain(self):
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    def write_response(self, rid, result):
+        self._send({
+            "jsonrpc": "2.0",
+            "id": rid,
+            "result": result,
+        })
+
+    def write_error(self, rid, code, message, data=None):
+        e = {
+            "code": code,
+            "message": message,
+        }
+        if data is not None:
+            e["data"] = data
+        self._send({
+            "jsonrpc": "2.0",
+            "id": rid,
+            "error": e,
+        })
+
+    def send_notification(self, method: str, params):
+        self._send({
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+        })
+
+    async def request(self, method: str, params):
+        """Send a request to the client and wait for its response"""
+        rid = self._next_id
+        self._next_id += 1
+        future = self.loop.create_future()
+        self._pending[rid] = future
+        self._send({
+            "jsonrpc": "2.0",
+            "id": rid,
+            "method": method,
+            "params": params,
+        })
+        try:
+            return await future
+        finally:
+            self._pending.pop(rid, None)
+
+    async def request_batch(self, requests):
+        """Send all the requests, then wait for all the responses, in order"""
+        return await asyncio.gather(*(self.request(method, params) for method, params in requests))
+
+    def send_request(self, method: str, params):
+        """For handlers, which run off the event loop: send a request and block
+        until the client responds"""
+        return asyncio.run_coroutine_threadsafe(self.request(method, params), self.loop).result()
+
+    def send_request_batch(self, requests):
+        return asyncio.run_coroutine_threadsafe(self.request_batch(requests), self.loop).result()
+
+    def cancel_pending(self):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(EOFError())
+        self._pending.clear()
+
+
+class _LoopQueue:
+    """Lets LangServer put messages back in line (when their analysis is done)
+    from any thread"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class AsyncLangServer(LangServer):
+
+    async def serve(self):
+        """Handle messages until the client shuts us down or goes away"""
+        loop = asyncio.get_running_loop()
+        self._queue = _LoopQueue(loop)
+        # Handled one at a time, in the order they came in
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="benten-handler")
+        reader = asyncio.ensure_future(self._read_messages_async())
+
+        try:
+            while self.running:
+                client_query, may_wait = await self._queue.get()
+                if client_query is None:
+                    break
+                try:
+                    await loop.run_in_executor(executor, lambda: self.handle(client_query, may_wait=may_wait))
+                except Exception as e:
+                    logger.error("Unexpected error: %s", e, exc_info=True)
+                await self.conn.drain()
+        finally:
+            reader.cancel()
+            self.conn.cancel_pending()
+            executor.shutdown(wait=False)
+            self.close()
+
+        # Whatever the analysis workers wrote last
+        await asyncio.sleep(0)
+        await self.conn.drain()
+
+    async def _read_messages_async(self):
+        while self.running:
+            try:
+                client_query = await self.conn.read_message()
+            except (EOFError, ConnectionError):
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Unexpected error: %s", e, exc_info=True)
+                continue
+
+            if client_query.get("method") == "$/cancelRequest":
+                self.cancel_request(client_query.get("params", {}).get("id"))
+                continue
+
+            self._enqueue(client_query)
+
+        self._queue.put((None, False))
+
+
+async def serve_stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, config,
+                       server_class=AsyncLangServer):
+    server = server_class(conn=AsyncJSONRPC2Connection(reader, writer), config=config)
+    try:
+        await server.serve()
+    finally:
+        writer.close()
+
+
+async def serve_stdio(config):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout.buffer)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    await serve_stream(reader, writer, config)
+
+
+async def serve_tcp(config, host: str, port: int):
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_stream(reader, writer, config), host, port)
+    async with server:
+        await server.serve_forever()
@@ -4,6 +4,9 @@ from typing import Dict
 from enum import IntEnum
 
 from ..code.document import Document
+from ..code.remotefetcher import remote_fetcher
+from .lspobjects import Position
+from .scheduler import AnalysisScheduler
 
 import logging
 
@@ -50,6 +53,7 @@ class CWLLangServerBase:
         self.fs = None
         self.all_symbols = None
         self.workspace = None
+        self.workspace_index = None
         self.streaming = True
 
         self.open_documents: Dict[str, Document] = {}
@@ -58,3 +62,38 @@ class CWLLangServerBase:
         self.client_capabilities = {}
 
         self.config = config
+
+        self.scheduler = AnalysisScheduler(
+            delay=config.analysis_delay,
+            on_analyzed=self._analysis_finished,
+            workers=config.analysis_workers)
+
+        remote_fetcher.cache_dir = config.scratch_path / "http-cache"
+        remote_fetcher.subscribe(self._remote_file_fetched)
+
+    def close(self):
+        """Let go of what this session holds. Process wide resources (the
+        JavaScript engine, the fetcher) are left running for other sessions"""
+        self.scheduler.shutdown()
+        remote_fetcher.unsubscribe(self._remote_file_fetched)
+
+    def get_document(self, doc_uri: str, loc: Position = None) -> Document:
+        """Return the open document, first bringing its analysis up to date if the
+        current one can not be trusted at `loc` (or anywhere, if `loc` is None).
+        If the analysis of the current text failed, it is not run again: the
+        request is answered from the last good analysis"""
+        doc = self.open_documents[doc_uri]
+        if doc.is_stale and not doc.analysis_failed and (loc is None or not doc.analysis_valid_at(loc)):
+            self.scheduler.flush(doc)
+        return doc
+
+    def _analysis_finished(self, document: Document, ok: bool):
+        # Diagnostics for text that has since changed are of no use to the client
+        if ok and not document.is_stale:
+            self._analysis_done(document)
+
+    def _remote_file_fetched(self, url: str, doc_uris: set):
+        pass
+
+    def _analysis_done(self, document: Document):
+        pass
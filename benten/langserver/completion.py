@@ -18,5 +18,5 @@ class Completion(CWLLangServerBase):
         doc_uri = params["textDocument"]["uri"]
         position = Position(**params["position"])
 
-        doc = self.open_documents[doc_uri]
+        doc = self.get_document(doc_uri, position)
         return doc.completion(position)
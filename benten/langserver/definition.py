@@ -18,6 +18,6 @@ class Definition(CWLLangServerBase):
         doc_uri = params["textDocument"]["uri"]
         position = Position(**params["position"])
 
-        doc = self.open_documents[doc_uri]
+        doc = self.get_document(doc_uri, position)
         return doc.definition(position)
 
@@ -19,7 +19,7 @@ class DocumentSymbol(CWLLangServerBase):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
 
-        doc = self.open_documents[doc_uri]
+        doc = self.get_document(doc_uri)
 
         self._write_out_graph(doc)
         return doc.symbols
@@ -39,7 +39,7 @@ interface TextDocumentItem {
 """
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from .lspobjects import to_dict, PublishDiagnosticsParams
+from .lspobjects import to_dict, PublishDiagnosticsParams, Position, Range
 from .base import CWLLangServerBase
 from ..code.document import Document
 
@@ -58,32 +58,48 @@ class FileOperation(CWLLangServerBase):
             scratch_path=self.config.scratch_path,
             text=params["textDocument"]["text"],
             version=params["textDocument"]["version"],
-            type_dicts=self.config.lang_models)
+            type_dicts=self.config.lang_models,
+            analyze=False,
+            wait_for_remote=False,
+            incremental=self.config.incremental_analysis,
+            yaml_loader=self.config.yaml_loader)
 
         self.open_documents[doc_uri] = document
-        self._mark_document_issues(doc_uri)
+        self.scheduler.schedule(document, delay=0)
 
     def serve_textDocument_didChange(self, client_query):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
 
-        content_changes = params["contentChanges"]
-
-        if len(content_changes) > 1:
-            logger.error("Server can currently only handle full text updates")
+        document = self.open_documents[doc_uri]
 
-        content_change = content_changes[0]
-        if "range" in content_change or "rangeLength" in content_change:
-            logger.error("Server can currently only handle full text updates")
+        # Changes are applied in the order given, each to the result of the previous one
+        for content_change in params["contentChanges"]:
+            _range = content_change.get("range")
+            if _range is not None:
+                _range = Range(start=Position(**_range["start"]), end=Position(**_range["end"]))
+            document.apply_change(_range=_range, new_text=content_change["text"])
 
-        self.open_documents[doc_uri].update(new_text=content_change["text"])
-        self._mark_document_issues(doc_uri)
+        document.version = params["textDocument"].get("version", document.version)
+        self.scheduler.schedule(document)
 
     def serve_textDocument_didClose(self, client_query):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
+        self.scheduler.cancel(doc_uri)
         self.open_documents.pop(doc_uri)
 
+    def _remote_file_fetched(self, url: str, doc_uris: set):
+        for doc_uri in doc_uris:
+            document = self.open_documents.get(doc_uri)
+            if document is not None:
+                document.invalidate()
+                self.scheduler.schedule(document, delay=0)
+
+    def _analysis_done(self, document: Document):
+        if self.open_documents.get(document.doc_uri) is document:
+            self._mark_document_issues(document.doc_uri)
+
     def _mark_document_issues(self, doc_uri):
         document = self.open_documents[doc_uri]
         self.conn.send_notification(
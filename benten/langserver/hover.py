@@ -16,6 +16,6 @@ class Hover(CWLLangServerBase):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
         position = Position(**params["position"])
-        doc = self.open_documents[doc_uri]
+        doc = self.get_document(doc_uri, position)
 
         return doc.hover(position)
@@ -26,10 +26,16 @@ SOFTWARE.
 
 import json
 import logging
+import os
 import queue
 import threading
 from collections import deque
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,33 +43,90 @@ class JSONRPC2ProtocolError(Exception):
     pass
 
 
+class JSONCodec:
+    """The standard library's json. Bodies are UTF-8 bytes"""
+    name = "json"
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def loads(data: bytes):
+        return json.loads(data)
+
+
+class ORJSONCodec(JSONCodec):
+    """orjson, if it is installed. Falls back to json for what orjson won't take"""
+    name = "orjson"
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return JSONCodec.dumps(obj)
+
+    @staticmethod
+    def loads(data: bytes):
+        return orjson.loads(data)
+
+
+codec = ORJSONCodec if orjson is not None else JSONCodec
+
+
 class ReadWriter:
+    """Reads and writes bytes. A message's header and body go out in a single
+    write (os.writev when the writer has a file descriptor)"""
+
     def __init__(self, reader, writer):
         self.reader = reader
         self.writer = writer
+        self._fd = None
+        if writer is not None and hasattr(os, "writev"):
+            try:
+                writer.flush()
+                self._fd = writer.fileno()
+            except (AttributeError, OSError, ValueError):
+                self._fd = None
 
-    def readline(self, *args):
-        return self.reader.readline(*args).decode("utf-8")
+    def readline(self, *args) -> bytes:
+        return self.reader.readline(*args)
 
-    def read(self, *args):
-        return self.reader.read(*args).decode("utf-8")
+    def read(self, *args) -> bytes:
+        return self.reader.read(*args)
 
-    def write(self, out):
-        self.writer.write(out.encode("utf-8"))
-        self.writer.flush()
+    def write(self, *chunks: bytes):
+        if self._fd is not None:
+            _write_all(self._fd, list(chunks))
+        else:
+            for chunk in chunks:
+                self.writer.write(chunk)
+            self.writer.flush()
 
 
 class TCPReadWriter(ReadWriter):
-    def readline(self, *args):
-        data = self.reader.readline(*args)
-        return data.decode("utf-8")
+    pass
+
+
+def _write_all(fd, chunks: list):
+    while chunks:
+        written = os.writev(fd, chunks)
+        while chunks and written >= len(chunks[0]):
+            written -= len(chunks[0])
+            chunks.pop(0)
+        if chunks and written:
+            chunks[0] = memoryview(chunks[0])[written:]
+
+
+content_length_header = b"content-length:"
+content_type_header = b"Content-Type: application/vscode-jsonrpc; charset=utf-8\r\n\r\n"
 
-    def read(self, *args):
-        return self.reader.read(*args).decode("utf-8")
 
-    def write(self, out):
-        self.writer.write(out.encode())
-        self.writer.flush()
+def frame(body) -> tuple:
+    """The header and body of a message, as bytes"""
+    body = codec.dumps(body)
+    return b"Content-Length: %d\r\n" % len(body) + content_type_header, body
 
 
 class JSONRPC2Connection:
@@ -71,31 +134,41 @@ class JSONRPC2Connection:
         self.conn = conn
         self._msg_buffer = deque()
         self._next_id = 1
+        # Analysis results are published from other threads
+        self._write_lock = threading.Lock()
 
-    def _read_header_content_length(self, line):
-        if len(line) < 2 or line[-2:] != "\r\n":
+    @staticmethod
+    def _read_header_content_length(line: bytes):
+        if len(line) < 2 or line[-2:] != b"\r\n":
             raise JSONRPC2ProtocolError("Line endings must be \\r\\n")
-        if line.startswith("Content-Length: "):
-            _, value = line.split("Content-Length: ")
-            value = value.strip()
+        if line[:15].lower() == content_length_header:
+            value = line[15:].strip()
             try:
                 return int(value)
             except ValueError:
                 raise JSONRPC2ProtocolError(
-                    "Invalid Content-Length header: {}".format(value))
+                    "Invalid Content-Length header: {}".format(value.decode("utf-8", "replace")))
 
     def _receive(self):
-        line = self.conn.readline()
-        if line == "":
-            raise EOFError()
-        length = self._read_header_content_length(line)
-        # Keep reading headers until we find the sentinel line for the JSON
-        # request.
-        while line != "\r\n":
+        length = None
+        while True:
             line = self.conn.readline()
+            if line == b"":
+                raise EOFError()
+            # The sentinel line before the JSON body
+            if line == b"\r\n":
+                break
+            header_length = self._read_header_content_length(line)
+            if header_length is not None:
+                length = header_length
+
+        if length is None:
+            raise JSONRPC2ProtocolError("Missing Content-Length header")
         body = self.conn.read(length)
+        if len(body) < length:
+            raise EOFError()
         logger.debug("RECV %s", body)
-        return json.loads(body)
+        return codec.loads(body)
 
     def read_message(self, want=None):
         """Read a JSON RPC message sent over the current connection.
@@ -120,13 +193,9 @@ class JSONRPC2Connection:
             self._msg_buffer.append(msg)
 
     def _send(self, body):
-        body = json.dumps(body, separators=(",", ":"))
-        content_length = len(body)
-        response = (
-            "Content-Length: {}\r\n"
-            "Content-Type: application/vscode-jsonrpc; charset=utf8\r\n\r\n"
-            "{}".format(content_length, body))
-        self.conn.write(response)
+        header, body = frame(body)
+        with self._write_lock:
+            self.conn.write(header, body)
         logger.debug("SEND %s", body)
 
     def write_response(self, rid, result):
@@ -7,10 +7,7 @@ from enum import IntEnum
 
 def to_dict(v):
     if isinstance(v, LSPObject):
-        return {
-            k: to_dict(_v)
-            for k, _v in v.__dict__.items() if _v is not None
-        }
+        return v.to_dict()
     elif isinstance(v, dict):
         return {
             k: to_dict(_v)
@@ -25,15 +22,27 @@ def to_dict(v):
 
 
 class LSPObject:
+    # The objects are slotted: an analysis makes thousands of them. Each class
+    # can write its own to_dict, the default goes by the slots
+    __slots__ = ()
+
     def to_dict(self):
-        return to_dict(self)
+        return {
+            k: to_dict(_v)
+            for k in self.__slots__ for _v in [getattr(self, k)] if _v is not None
+        }
 
 
 class Position(LSPObject):
+    __slots__ = ("line", "character")
+
     def __init__(self, line, character):
         self.line = line
         self.character = character
 
+    def to_dict(self):
+        return {"line": self.line, "character": self.character}
+
     def __hash__(self):
         return hash((self.line, self.character))
 
@@ -43,10 +52,15 @@ class Position(LSPObject):
 
 
 class Range(LSPObject):
+    __slots__ = ("start", "end")
+
     def __init__(self, start: Position, end: Position):
         self.start = start
         self.end = end
 
+    def to_dict(self):
+        return {"start": self.start.to_dict(), "end": self.end.to_dict()}
+
     def __hash__(self):
         return hash((self.start, self.end))
 
@@ -56,12 +70,16 @@ class Range(LSPObject):
 
 
 class TextEdit(LSPObject):
+    __slots__ = ("range", "newText")
+
     def __init__(self, _range: Range, new_text: str):
         self.range = _range
         self.newText = new_text
 
 
 class Location(LSPObject):
+    __slots__ = ("uri", "range")
+
     def __init__(self, uri, _range: Range=Range(Position(0, 0), Position(0, 0))):
         self.uri = uri
         self.range = _range
@@ -75,6 +93,8 @@ class DiagnosticSeverity(IntEnum):
 
 
 class Diagnostic(LSPObject):
+    __slots__ = ("range", "message", "severity", "code", "source")
+
     def __init__(self,
                  _range: Range, message: str,
                  severity: DiagnosticSeverity=None,
@@ -86,6 +106,16 @@ class Diagnostic(LSPObject):
         self.code = code
         self.source = source
 
+    def to_dict(self):
+        d = {"range": self.range.to_dict(), "message": self.message}
+        if self.severity is not None:
+            d["severity"] = self.severity
+        if self.code is not None:
+            d["code"] = self.code
+        if self.source is not None:
+            d["source"] = self.source
+        return d
+
     def __hash__(self):
         return hash((self.range, self.message))
 
@@ -95,6 +125,8 @@ class Diagnostic(LSPObject):
 
 
 class PublishDiagnosticsParams(LSPObject):
+    __slots__ = ("uri", "diagnostics")
+
     def __init__(self, uri, diagnostics: List[Diagnostic]):
         self.uri = uri
         self.diagnostics = diagnostics
@@ -144,6 +176,9 @@ class InsertTextFormat(IntEnum):
 
 
 class CompletionItem(LSPObject):
+    __slots__ = ("label", "kind", "detail", "documentation", "preselect", "sortText", "filterText",
+                 "insertTextFormat", "textEdit", "additionalTextEdits")
+
     def __init__(self,
                  label: str,
                  text_edit: TextEdit = None, additional_text_edits: [TextEdit] = None,
@@ -191,6 +226,8 @@ class CompletionItem(LSPObject):
 
 
 class CompletionList(LSPObject):
+    __slots__ = ("isIncomplete", "items")
+
     def __init__(self, is_incomplete: bool = False, items: [CompletionItem] = None):
         self.isIncomplete = is_incomplete
         self.items = items or []
@@ -226,6 +263,8 @@ class SymbolKind(IntEnum):
 
 
 class DocumentSymbol(LSPObject):
+    __slots__ = ("name", "detail", "kind", "range", "selectionRange", "children")
+
     def __init__(self, name, kind, _range, selection_range, detail=None, children=None):
         self.name = name
         self.detail = detail
@@ -235,7 +274,18 @@ class DocumentSymbol(LSPObject):
         self.children: List[DocumentSymbol] = children
 
 
+class SymbolInformation(LSPObject):
+    __slots__ = ("name", "kind", "location", "containerName")
+
+    def __init__(self, name, kind, location, container_name=None):
+        self.name = name
+        self.kind: SymbolKind = kind
+        self.location: Location = location
+        self.containerName = container_name
+
+
 class Hover(LSPObject):
+    __slots__ = ("contents", "range")
 
     class HoverType(IntEnum):
         Markdown = 1
@@ -258,6 +308,8 @@ class Hover(LSPObject):
 
 
 class MarkupContent(LSPObject):
+    __slots__ = ("kind", "value")
+
     def __init__(self, value, kind="markdown"):
         self.kind = kind
         self.value = value
@@ -0,0 +1,158 @@
+"""Pre-forked TCP workers, for a language server shared by a team.
+
+The threaded TCP server runs every connection in one interpreter, so all of
+them share one core. Here the parent loads every language model, freezes
+the heap (gc.freeze, so the collector does not write to the pages holding
+the models) and forks the workers. The workers share the models copy on
+write, accept connections on the socket they inherit and serve each on a
+thread of their own. A worker that dies is replaced.
+
+Only available where there is os.fork."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import gc
+import os
+import signal
+import socket
+import socketserver
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from ..code.jsengine import js_engine
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def available():
+    return hasattr(os, "fork") and hasattr(gc, "freeze") and resource is not None
+
+
+def memory_stats():
+    """Memory use of this process, in kB. Pss (proportional set size) counts
+    pages shared with other processes in part, so the sum over the workers
+    is what they really take"""
+    stats = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    stats[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        pass
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    stats["MaxRss"] = max_rss // 1024 if os.uname().sysname == "Darwin" else max_rss
+    return stats
+
+
+def format_memory_stats(stats: dict):
+    keys = ["Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "MaxRss"]
+    return ", ".join(f"{k}: {stats[k] / 1024:.1f} MiB" for k in keys if k in stats)
+
+
+class WorkerTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Serves connections on the listening socket it is handed"""
+    daemon_threads = True
+
+    def __init__(self, sock: socket.socket, handler_class):
+        super().__init__(sock.getsockname(), handler_class, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def shutdown_request(self, request):
+        super().shutdown_request(request)
+        with self._lock:
+            self.connections += 1
+            connections = self.connections
+        logger.info(f"Worker {os.getpid()}: {connections} connections served. "
+                    f"{format_memory_stats(memory_stats())}")
+
+
+class PreforkServer:
+
+    def __init__(self, config, host: str, port: int, workers: int, handler_class):
+        self.config = config
+        self.address = (host, port)
+        self.workers = workers
+        self.handler_class = handler_class
+        self.socket = None
+        self.running = False
+        self._children = {}
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.address)
+        sock.listen(128)
+        # Workers that lose the race for a connection go back to waiting
+        sock.setblocking(False)
+        self.socket = sock
+        return sock.getsockname()
+
+    def serve_forever(self):
+        if self.socket is None:
+            self.bind()
+
+        # Everything the workers should share is loaded before they are forked
+        self.config.lang_models.load()
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Parent {os.getpid()}: {format_memory_stats(memory_stats())}")
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        try:
+            while self.running or self._children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                slot = self._children.pop(pid, None)
+                if slot is not None and self.running:
+                    logger.warning(f"Worker {pid} exited ({status}), starting another")
+                    self._spawn(slot)
+        finally:
+            self.socket.close()
+
+    def _spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                logger.info(f"Worker {slot} ({os.getpid()}) started. {format_memory_stats(memory_stats())}")
+                WorkerTCPServer(self.socket, self.handler_class).serve_forever()
+            except BaseException as e:
+                logger.error(f"Worker {os.getpid()} failed: {e}", exc_info=True)
+                code = 1
+            finally:
+                # os._exit skips the atexit handlers
+                js_engine.shutdown()
+                os._exit(code)
+
+        self._children[pid] = slot
+
+    def _stop(self, signum, frame):
+        self.running = False
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,105 @@
+"""Coalesces bursts of document changes into a single analysis and runs
+analyses off the message loop.
+
+Each didChange only edits the document text and (re)starts a timer for that
+document. The analysis runs on a worker pool once the document has been quiet
+for the configured delay, on the latest text. Requests that need an analysis
+the document does not have yet can ask for the pending analysis to be started
+right away, or run it on their own thread."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import Callable, Dict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from ..code.document import Document
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class AnalysisScheduler:
+
+    def __init__(self,
+                 delay: float,
+                 on_analyzed: Callable[[Document, bool], None],
+                 workers: int = 2):
+        self.delay = delay
+        self.on_analyzed = on_analyzed
+        self.workers = workers
+        self._executor = None
+        self._timers: Dict[str, threading.Timer] = {}
+        self._run_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, document: Document, delay: float = None):
+        """Analyze the document on the worker pool once it has been left alone for
+        `delay` seconds. Any analysis already waiting for this document is superseded."""
+        delay = self.delay if delay is None else delay
+        with self._lock:
+            self._cancel_timer(document.doc_uri)
+            if delay > 0:
+                timer = threading.Timer(delay, self._submit, args=(document,))
+                timer.daemon = True
+                self._timers[document.doc_uri] = timer
+                timer.start()
+                return
+
+        self._submit(document)
+
+    def flush(self, document: Document):
+        """Run any pending analysis of this document now, on the caller's thread"""
+        with self._lock:
+            self._cancel_timer(document.doc_uri)
+        if document.is_stale:
+            self._run(document)
+
+    def cancel(self, doc_uri: str):
+        with self._lock:
+            self._cancel_timer(doc_uri)
+            self._run_locks.pop(doc_uri, None)
+
+    def shutdown(self):
+        with self._lock:
+            for doc_uri in list(self._timers.keys()):
+                self._cancel_timer(doc_uri)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _cancel_timer(self, doc_uri: str):
+        timer = self._timers.pop(doc_uri, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _submit(self, document: Document):
+        with self._lock:
+            self._timers.pop(document.doc_uri, None)
+            # Created on first use, so a process that forks after building the
+            # server does not inherit dead worker threads
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="benten-analysis")
+            self._executor.submit(self._run, document)
+
+    def _run(self, document: Document):
+        with self._lock:
+            run_lock = self._run_locks.setdefault(document.doc_uri, threading.Lock())
+
+        # Only one analysis per document at a time. If an analysis of the
+        # latest text finished while we waited, there is nothing left to do
+        with run_lock:
+            if not document.is_stale:
+                return
+            try:
+                document.update()
+                ok = True
+            except Exception as e:
+                logger.error(f"Analysis of {document.doc_uri} failed: {e}", exc_info=True)
+                ok = False
+
+        try:
+            self.on_analyzed(document, ok)
+        except Exception as e:
+            logger.error(f"Error handling analysis of {document.doc_uri}: {e}", exc_info=True)
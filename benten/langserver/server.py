@@ -24,9 +24,12 @@ Expected requests
 """
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+from typing import Dict, List
 from enum import IntEnum
+import queue
+import threading
 
-from .lspobjects import to_dict
+from .lspobjects import to_dict, Position
 from .base import CWLLangServerBase, JSONRPC2Error, ServerError, LSPErrCode
 from .fileoperation import FileOperation
 from .definition import Definition
@@ -34,6 +37,7 @@ from .completion import Completion
 from .documentsymbol import DocumentSymbol
 from .hover import Hover
 from .formatting import Formatting
+from .workspace import Workspace
 
 import logging
 
@@ -49,7 +53,18 @@ class TextDocumentSyncKind(IntEnum):
     Incremental = 2
 
 
+# Requests answered from a document's analysis. If the analysis is out of date
+# where the request points, the request waits until a fresh one is ready
+needs_analysis = {
+    "textDocument/hover",
+    "textDocument/completion",
+    "textDocument/definition",
+    "textDocument/documentSymbol"
+}
+
+
 class LangServer(
+        Workspace,
         Formatting,
         Hover,
         DocumentSymbol,
@@ -58,15 +73,67 @@ class LangServer(
         FileOperation,
         CWLLangServerBase):
 
+    def __init__(self, conn, config):
+        super().__init__(conn, config)
+        # Messages waiting for the dispatcher, as (message, may_wait_for_analysis)
+        self._queue: queue.Queue = None
+        self._cancelled = set()
+        # Ids of the requests that are queued or waiting for an analysis. Only
+        # these can be cancelled
+        self._queued = set()
+        self._waiting: Dict[str, List[dict]] = {}
+        self._waiting_lock = threading.Lock()
+
+    # A reader thread puts messages on a queue, and they are handled in order on
+    # this thread. Analyses run on the scheduler's workers, so the only thing that
+    # can hold up a request is another request.
     def run(self):
+        self._queue = queue.Queue()
+        reader = threading.Thread(target=self._read_messages, name="benten-reader", daemon=True)
+        reader.start()
+
+        while self.running:
+            client_query, may_wait = self._queue.get()
+            if client_query is None:
+                break
+            try:
+                self.handle(client_query, may_wait=may_wait)
+            except Exception as e:
+                logger.error("Unexpected error: %s", e, exc_info=True)
+
+        self.close()
+
+    def _read_messages(self):
         while self.running:
             try:
-                request = self.conn.read_message()
-                self.handle(request)
+                client_query = self.conn.read_message()
             except EOFError:
                 break
             except Exception as e:
                 logger.error("Unexpected error: %s", e, exc_info=True)
+                continue
+
+            # Cancellations take effect right away, even for requests that
+            # are already queued up behind slow ones
+            if client_query.get("method") == "$/cancelRequest":
+                self.cancel_request(client_query.get("params", {}).get("id"))
+                continue
+
+            self._enqueue(client_query)
+
+        self._queue.put((None, False))
+
+    def _enqueue(self, client_query):
+        if "id" in client_query:
+            with self._waiting_lock:
+                self._queued.add(client_query["id"])
+        self._queue.put((client_query, True))
+
+    def cancel_request(self, rid):
+        # A request that has already been answered can not be cancelled
+        with self._waiting_lock:
+            if rid in self._queued:
+                self._cancelled.add(rid)
 
     # Request message:
     # {
@@ -80,9 +147,25 @@ class LangServer(
     # 		...
     # 	}
     # }
-    def handle(self, client_query):
+    def handle(self, client_query, may_wait=False):
         logger.info("Client query: {}".format(client_query.get("method")))
 
+        if client_query.get("method") == "$/cancelRequest":
+            self.cancel_request(client_query.get("params", {}).get("id"))
+            return
+
+        if may_wait and self.wait_for_analysis(client_query):
+            return
+
+        try:
+            self._handle(client_query)
+        finally:
+            if "id" in client_query:
+                with self._waiting_lock:
+                    self._queued.discard(client_query["id"])
+                    self._cancelled.discard(client_query["id"])
+
+    def _handle(self, client_query):
         is_a_request = "id" in client_query
 
         if self.premature_request(client_query, is_a_request):
@@ -91,6 +174,9 @@ class LangServer(
         if self.duplicate_initialization(client_query, is_a_request):
             return
 
+        if self.cancelled_request(client_query, is_a_request):
+            return
+
         try:
             response = to_dict(self._dispatch(client_query))
 
@@ -108,6 +194,77 @@ class LangServer(
                     message=str(e.json_rpc_error.message),
                     data=e.json_rpc_error.data)
 
+    def cancelled_request(self, client_query, is_a_request):
+        if is_a_request and client_query["id"] in self._cancelled:
+            logger.info(f"Request {client_query['id']} cancelled")
+            self.conn.write_error(
+                client_query["id"],
+                code=LSPErrCode.RequestCancelled,
+                message="Request cancelled",
+                data={})
+            return True
+        else:
+            return False
+
+    def wait_for_analysis(self, client_query):
+        """Set the request aside if its document's analysis is out of date where
+        the request points. It is put back on the queue when the analysis is done."""
+        if client_query.get("method") not in needs_analysis:
+            return False
+
+        params = client_query.get("params", {})
+        doc = self.open_documents.get(params.get("textDocument", {}).get("uri"))
+        if doc is None:
+            return False
+
+        loc = params.get("position")
+        loc = Position(**loc) if loc is not None else None
+
+        with self._waiting_lock:
+            if not doc.is_stale or (loc is not None and doc.analysis_valid_at(loc)):
+                return False
+            # Waiting would run the failed analysis again. The request is
+            # answered from the last good analysis (see get_document)
+            if doc.analysis_failed:
+                return False
+            self._waiting.setdefault(doc.doc_uri, []).append(client_query)
+
+        # No point waiting out the debounce delay if someone needs the result
+        self.scheduler.schedule(doc, delay=0)
+        return True
+
+    def _analysis_finished(self, document, ok):
+        super()._analysis_finished(document, ok)
+
+        # If the analysis failed, retrying would just fail again, so the requests
+        # are answered from the last good analysis (see get_document)
+        self._release_waiting(document.doc_uri, may_wait=ok)
+
+    def _release_waiting(self, doc_uri, may_wait):
+        with self._waiting_lock:
+            waiting = self._waiting.pop(doc_uri, [])
+
+        for client_query in waiting:
+            self._queue.put((client_query, may_wait))
+
+    def serve_textDocument_didClose(self, client_query):
+        super().serve_textDocument_didClose(client_query)
+
+        # The requests waiting for the closed document's analysis have nothing
+        # left to be answered from
+        with self._waiting_lock:
+            waiting = self._waiting.pop(client_query["params"]["textDocument"]["uri"], [])
+            for waiting_query in waiting:
+                self._queued.discard(waiting_query["id"])
+                self._cancelled.discard(waiting_query["id"])
+
+        for waiting_query in waiting:
+            self.conn.write_error(
+                waiting_query["id"],
+                code=LSPErrCode.ContentModified,
+                message="Document closed",
+                data={})
+
     def premature_request(self, client_query, is_a_request):
         if not self.initialization_request_received and \
                 client_query.get("method", None) not in ["initialize", "exit"]:
@@ -173,10 +330,18 @@ class LangServer(
         self.client_capabilities = client_query.get("capabilities", {})
         logger.debug("InitOpts: {}".format(client_query))
 
+        if self.config.preload_versions:
+            self.config.lang_models.prewarm(self.config.preload_versions)
+
+        self._start_workspace_index(client_query.get("params", {}))
+
         return {
             "capabilities": {
-                "textDocumentSync": TextDocumentSyncKind.Full,
-                #  Avoid complexity of incremental updates for now
+                "textDocumentSync": {
+                    "openClose": True,
+                    "change": TextDocumentSyncKind.Incremental,
+                    "save": True
+                },
                 "completionProvider": {
                     "resolveProvider": True,
                     "triggerCharacters": [".", "/"]
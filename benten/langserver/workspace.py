@@ -0,0 +1,94 @@
+"""
+workspace/symbol
+textDocument/references
+workspace/didChangeWorkspaceFolders
+workspace/didChangeWatchedFiles
+textDocument/didSave
+
+Answered from the workspace index (code/workspaceindex.py) which is built
+in the background after initialization and kept up to date as files are
+saved.
+"""
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import threading
+
+from .lspobjects import Position, Range, Location
+from .base import CWLLangServerBase
+from ..code.workspaceindex import WorkspaceIndex, index_path_for, roots_from_initialize
+from ..cwl.lib import un_mangle_uri
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Files changed outside the editor are picked up by a refresh (a stat of each
+# file) at most this often
+refresh_interval = 5.0
+
+
+class Workspace(CWLLangServerBase):
+
+    def _start_workspace_index(self, initialize_params: dict):
+        roots = roots_from_initialize(initialize_params)
+        if not roots:
+            return
+
+        index = WorkspaceIndex(
+            index_path=index_path_for(self.config.scratch_path, roots),
+            yaml_loader=self.config.yaml_loader)
+        index.set_roots(roots)
+        self.workspace_index = index
+
+        def build():
+            index.load()
+            index.refresh()
+
+        threading.Thread(target=build, name="benten-workspace-index", daemon=True).start()
+
+    def serve_workspace_symbol(self, client_query):
+        if self.workspace_index is None:
+            return []
+        self.workspace_index.refresh(max_age=refresh_interval, wait=False)
+        return self.workspace_index.symbols(client_query["params"].get("query", ""))
+
+    def serve_textDocument_references(self, client_query):
+        if self.workspace_index is None:
+            return []
+        self.workspace_index.refresh(max_age=refresh_interval, wait=False)
+
+        params = client_query["params"]
+        path = un_mangle_uri(params["textDocument"]["uri"]).resolve()
+        # On a run:, $import or $include, the references are to the file linked to.
+        # Anywhere else, to this file
+        target = self.workspace_index.link_at(path, Position(**params["position"])) or str(path)
+
+        locations = self.workspace_index.references(target)
+        if params.get("context", {}).get("includeDeclaration") and pathlib.Path(target).exists():
+            locations = [Location(pathlib.Path(target).as_uri(), Range(Position(0, 0), Position(0, 0)))] + locations
+        return locations
+
+    def serve_textDocument_didSave(self, client_query):
+        if self.workspace_index is not None:
+            self.workspace_index.refresh_file(un_mangle_uri(client_query["params"]["textDocument"]["uri"]))
+
+    def serve_workspace_didChangeWatchedFiles(self, client_query):
+        if self.workspace_index is not None:
+            for change in client_query["params"].get("changes", []):
+                self.workspace_index.refresh_file(un_mangle_uri(change["uri"]))
+
+    def serve_workspace_didChangeWorkspaceFolders(self, client_query):
+        event = client_query["params"]["event"]
+        removed = {un_mangle_uri(f["uri"]).resolve() for f in event.get("removed", [])}
+        added = [un_mangle_uri(f["uri"]) for f in event.get("added", [])]
+
+        if self.workspace_index is None:
+            self._start_workspace_index({"workspaceFolders": event.get("added", [])})
+            return
+
+        index = self.workspace_index
+        index.set_roots([r for r in index.roots if r not in removed] + added)
+        # The index is saved under a name made from the folders, so the next
+        # session on this set of folders finds it
+        index.index_path = index_path_for(self.config.scratch_path, index.roots)
+        threading.Thread(target=index.refresh, name="benten-workspace-index", daemon=True).start()
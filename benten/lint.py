@@ -0,0 +1,234 @@
+"""benten-lint: check every CWL file under the given paths, outside of an editor.
+
+Each file gets the same analysis (and diagnostics) as an open document in the
+language server. The files are spread over a pool of processes. Each process
+loads a language model once and keeps the linked files (run: targets,
+$import/$include) it has parsed, and files are handed out in runs of files
+from the same directory, which tend to link to the same files.
+
+The diagnostics are printed as text, JSON or SARIF. The exit code is 1 if
+any file has an error, 0 otherwise."""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from typing import List
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import pathlib
+import sys
+
+from .version import __version__
+from .configuration import Configuration
+from .code.document import Document
+from .code.yaml import loaders
+from .code import fastyaml
+from .langserver.lspobjects import DiagnosticSeverity
+
+import logging
+logger = logging.getLogger(__name__)
+
+formats = ["text", "json", "sarif"]
+
+sarif_levels = {
+    DiagnosticSeverity.Error: "error",
+    DiagnosticSeverity.Warning: "warning",
+    DiagnosticSeverity.Information: "note",
+    DiagnosticSeverity.Hint: "note"
+}
+
+# Set in each worker process, or inherited from the parent where workers are forked
+_config: Configuration = None
+
+
+def cwl_files(paths: List[str]) -> List[pathlib.Path]:
+    """The .cwl files given, and those in (and under) the directories given"""
+    files = []
+    for p in paths:
+        p = pathlib.Path(p)
+        if p.is_dir():
+            files += sorted(f for f in p.rglob("*.cwl") if f.is_file())
+        else:
+            files += [p]
+    return list(dict.fromkeys(f.absolute() for f in files))
+
+
+def _init_worker(yaml_loader: str, log_level: int = None):
+    global _config
+    if _config is None:
+        _config = Configuration()
+        _config.initialize()
+    _config.yaml_loader = yaml_loader
+    if log_level is not None:
+        logging.getLogger().setLevel(log_level)
+
+
+def lint_file(path: pathlib.Path):
+    """(path, diagnostics as dicts, or an error message if the file could not be read)"""
+    try:
+        text = path.read_text()
+    except (OSError, UnicodeDecodeError) as e:
+        return str(path), [], f"{e}"
+
+    doc = Document(
+        doc_uri=path.as_uri(),
+        scratch_path=_config.scratch_path,
+        text=text,
+        version=1,
+        type_dicts=_config.lang_models,
+        incremental=False,
+        yaml_loader=_config.yaml_loader)
+
+    diagnostics = sorted((p.to_dict() for p in doc.problems or []), key=lambda d: (
+        d["range"]["start"]["line"], d["range"]["start"]["character"], d["message"]))
+    return str(path), diagnostics, None
+
+
+def lint(files: List[pathlib.Path], jobs: int = None, yaml_loader: str = "fast", log_level: int = None):
+    """Yield lint_file's result for each file, in order"""
+    global _config
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs == 1 or len(files) < 2:
+        _init_worker(yaml_loader, log_level)
+        yield from map(lint_file, files)
+        return
+
+    # Forked workers inherit the configuration instead of making their own
+    if _config is None:
+        _config = Configuration()
+        _config.initialize()
+
+    chunk_size = max(1, min(32, len(files) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(yaml_loader, log_level)) as pool:
+        yield from pool.map(lint_file, files, chunksize=chunk_size)
+
+
+def _severity(d: dict):
+    return DiagnosticSeverity(d.get("severity") or DiagnosticSeverity.Error)
+
+
+def write_text(results, out, root: pathlib.Path):
+    for path, diagnostics, error in results:
+        name = _relative(path, root)
+        if error is not None:
+            out.write(f"{name}: error: {error}\n")
+        for d in diagnostics:
+            start = d["range"]["start"]
+            out.write(f"{name}:{start['line'] + 1}:{start['character'] + 1}: "
+                      f"{_severity(d).name.lower()}: {d['message']}\n")
+
+
+def write_json(results, out, root: pathlib.Path):
+    json.dump([
+        {"file": _relative(path, root), "diagnostics": diagnostics, **({"error": error} if error else {})}
+        for path, diagnostics, error in results
+    ], out, indent=2)
+    out.write("\n")
+
+
+def write_sarif(results, out, root: pathlib.Path):
+    sarif_results = []
+    for path, diagnostics, error in results:
+        uri = _relative(path, root)
+        if error is not None:
+            diagnostics = [{
+                "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 0}},
+                "message": error,
+                "severity": DiagnosticSeverity.Error
+            }]
+        for d in diagnostics:
+            start, end = d["range"]["start"], d["range"]["end"]
+            sarif_results += [{
+                "ruleId": d.get("code") or "benten",
+                "level": sarif_levels[_severity(d)],
+                "message": {"text": d["message"]},
+                "locations": [{
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": uri},
+                        "region": {
+                            "startLine": start["line"] + 1,
+                            "startColumn": start["character"] + 1,
+                            "endLine": end["line"] + 1,
+                            "endColumn": end["character"] + 1
+                        }
+                    }
+                }]
+            }]
+
+    json.dump({
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {
+                "driver": {
+                    "name": "benten-lint",
+                    "version": __version__,
+                    "informationUri": "https://github.com/rabix/benten"
+                }
+            },
+            "results": sarif_results
+        }]
+    }, out, indent=2)
+    out.write("\n")
+
+
+writers = {
+    "text": write_text,
+    "json": write_json,
+    "sarif": write_sarif
+}
+
+
+def _relative(path: str, root: pathlib.Path):
+    try:
+        return pathlib.Path(path).relative_to(root).as_posix()
+    except ValueError:
+        return pathlib.Path(path).as_posix()
+
+
+def main(argv: List[str] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="benten-lint",
+        description="Check CWL files and report the problems the language server would show")
+    parser.add_argument(
+        "paths", nargs="+", metavar="PATH",
+        help="CWL files, or directories to search for .cwl files")
+    parser.add_argument(
+        "--format", default="text", choices=formats, help="how to print the diagnostics")
+    parser.add_argument(
+        "--output", "-o", metavar="FILE", help="write the diagnostics to this file instead of stdout")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None, metavar="N",
+        help="number of processes checking files (default: one per CPU)")
+    parser.add_argument(
+        "--yaml-loader", default="fast", choices=loaders,
+        help="YAML loader. 'fast' needs PyYAML, 'rt' is ruamel's round trip loader")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    yaml_loader = args.yaml_loader
+    if yaml_loader == "fast" and not fastyaml.available():
+        yaml_loader = "rt"
+
+    files = cwl_files(args.paths)
+    results = list(lint(files, jobs=args.jobs, yaml_loader=yaml_loader, log_level=logging.CRITICAL))
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        writers[args.format](results, out, pathlib.Path.cwd())
+    finally:
+        if args.output:
+            out.close()
+
+    has_errors = any(error is not None or any(_severity(d) == DiagnosticSeverity.Error for d in diagnostics)
+                     for _, diagnostics, error in results)
+    return 1 if has_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
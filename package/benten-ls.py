@@ -1,2 +1,6 @@
+import multiprocessing
 import benten.__main__
+
+# Expressions are evaluated in child processes
+multiprocessing.freeze_support()
 benten.__main__.main()
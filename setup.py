@@ -26,9 +26,16 @@ setup(
         "dukpy >= 0.2.2",
         "cwlformat >= 2021.1.5"
     ],
+    extras_require={
+        # For the fast YAML loader (benten/code/fastyaml.py)
+        "fast-yaml": ["PyYAML >= 5.1"],
+        # Faster JSON-RPC messages (benten/langserver/jsonrpc.py)
+        "fast-json": ["orjson >= 3.0"]
+    },
     entry_points={
         'console_scripts': [
-            'benten-ls = benten.__main__:main'
+            'benten-ls = benten.__main__:main',
+            'benten-lint = benten.lint:main'
         ],
     },
 
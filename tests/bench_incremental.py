@@ -0,0 +1,66 @@
+"""Time re-analysis of a 200 step workflow after editing one step, with and
+without taking over the unchanged steps from the previous analysis
+
+    cd tests; python bench_incremental.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import shutil
+import tempfile
+import time
+
+from benten.code.document import Document
+from benten.code.yaml import parse_yaml
+
+from lib import load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+
+def workflow(n_steps):
+    lines = ["cwlVersion: v1.0", "class: Workflow", "inputs:", "  in1: string", "steps:"]
+    for n in range(n_steps):
+        lines += [
+            f"  step{n}:",
+            "    run: clt1.cwl",
+            "    in:",
+            f"      in1: {'in1' if n == 0 else f'step{n - 1}/out1'}",
+            "    out: [out1]"]
+    lines += ["outputs:", "  out1:", "    type: File", f"    outputSource: step{n_steps - 1}/out1"]
+    return "\n".join(lines) + "\n"
+
+
+def best_of(fn, runs=10):
+    times = []
+    for n in range(runs):
+        t0 = time.perf_counter()
+        fn(n)
+        times += [time.perf_counter() - t0]
+    return min(times)
+
+
+def main():
+    type_dicts = load_type_dicts()
+    tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"))
+    shutil.copy(current_path / "cwl" / "misc" / "clt1.cwl", tmp_dir / "clt1.cwl")
+    path = tmp_dir / "wf.cwl"
+    text = workflow(200)
+    edited = text.replace("step99/out1", "step98/out1")
+
+    # Loading the YAML is the same for both, and is not affected by reuse
+    t_yaml = best_of(lambda n: parse_yaml(edited if n % 2 == 0 else text))
+    print(f"{'YAML load':12}: {t_yaml * 1000:8.1f} ms/update")
+
+    for incremental in [False, True]:
+        doc = Document(path.as_uri(), str(tmp_dir), text, 1, type_dicts, incremental=incremental)
+        t = best_of(lambda n: doc.update(edited if n % 2 == 0 else text))
+        label = "Incremental" if incremental else "Full"
+        print(f"{label:12}: {t * 1000:8.1f} ms/update, {(t - t_yaml) * 1000:8.1f} ms after YAML load")
+
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
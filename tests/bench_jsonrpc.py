@@ -0,0 +1,57 @@
+"""Messages per second through a pipe, from one JSONRPC2Connection to another,
+with each of the JSON codecs available
+
+    cd tests; python bench_jsonrpc.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import threading
+import time
+
+import benten.langserver.jsonrpc as jsonrpc
+from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter, JSONCodec, ORJSONCodec
+
+
+def diagnostics(n):
+    return {
+        "uri": "file:///work/wf.cwl",
+        "diagnostics": [{
+            "range": {"start": {"line": k, "character": 4}, "end": {"line": k, "character": 12}},
+            "message": f"Unknown field: inputBinding_{k} (référence)",
+            "severity": 2
+        } for k in range(n)]
+    }
+
+
+def messages_per_second(params, count):
+    r, w = os.pipe()
+    sender = JSONRPC2Connection(ReadWriter(None, os.fdopen(w, "wb")))
+    receiver = JSONRPC2Connection(ReadWriter(os.fdopen(r, "rb"), None))
+
+    def send():
+        for _ in range(count):
+            sender.send_notification("textDocument/publishDiagnostics", params)
+
+    t0 = time.perf_counter()
+    thread = threading.Thread(target=send)
+    thread.start()
+    for _ in range(count):
+        receiver.read_message()
+    t = time.perf_counter() - t0
+    thread.join()
+    return count / t
+
+
+def main():
+    codecs = [JSONCodec] + ([ORJSONCodec] if jsonrpc.orjson is not None else [])
+    for codec in codecs:
+        jsonrpc.codec = codec
+        for n, count in [(0, 20000), (10, 10000), (1000, 200)]:
+            rate = max(messages_per_second(diagnostics(n), count) for _ in range(3))
+            print(f"{codec.name:7}: {n:5} diagnostics/message: {rate:10.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
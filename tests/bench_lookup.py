@@ -0,0 +1,61 @@
+"""Compare cursor-to-node lookups using a linear scan of the lookup table with
+lookups through the line index, on every position of every file in tests/cwl
+
+    cd tests; python bench_lookup.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import time
+
+from benten.langserver.lspobjects import Position
+
+from lib import load, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+
+def linear_lookup(lookup_table, loc: Position):
+    for n in lookup_table:
+        if n.loc.start.line <= loc.line <= n.loc.end.line:
+            if loc.line > n.loc.start.line or loc.character >= n.loc.start.character:
+                if loc.line < n.loc.end.line or loc.character <= n.loc.end.character:
+                    return n.intelligence_node
+
+
+def main():
+    type_dicts = load_type_dicts()
+    t_linear, t_index, lookups, mismatches = 0, 0, 0, 0
+    for fname in sorted((current_path / "cwl").rglob("*.cwl")):
+        if "remote" in fname.name:
+            continue
+        doc = load(doc_path=fname, type_dicts=type_dicts)
+        code_intel = doc.code_intelligence
+        if code_intel is None:
+            continue
+
+        positions = [Position(ln, c)
+                     for ln, txt in enumerate(doc.text.splitlines())
+                     for c in range(0, len(txt) + 1, 4)]
+        code_intel.get_doc_element(Position(0, 0))  # Build the index
+
+        t0 = time.perf_counter()
+        expected = [linear_lookup(code_intel.lookup_table, p) for p in positions]
+        t1 = time.perf_counter()
+        got = [code_intel.get_doc_element(p) for p in positions]
+        t2 = time.perf_counter()
+
+        t_linear += t1 - t0
+        t_index += t2 - t1
+        lookups += len(positions)
+        mismatches += sum(1 for a, b in zip(expected, got) if a is not b)
+
+    print(f"{lookups} lookups")
+    print(f"Linear scan: {t_linear * 1e6 / lookups:8.2f} us/lookup")
+    print(f"Line index:  {t_index * 1e6 / lookups:8.2f} us/lookup")
+    print(f"Lookups returning a different node: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Peak memory and time of the analysis of a 200 step workflow, and the time
+to turn its symbols, diagnostics and lookup ranges into JSON ready dicts
+
+    cd tests; python bench_lsp_objects.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import shutil
+import tempfile
+import tracemalloc
+
+from benten.code.document import Document
+from benten.langserver.lspobjects import to_dict
+
+from lib import load_type_dicts
+from bench_incremental import workflow, best_of
+
+current_path = pathlib.Path(__file__).parent
+
+
+def main():
+    type_dicts = load_type_dicts()
+    tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"))
+    shutil.copy(current_path / "cwl" / "misc" / "clt1.cwl", tmp_dir / "clt1.cwl")
+    path = tmp_dir / "wf.cwl"
+    text = workflow(200)
+
+    def analyze(n=0):
+        return Document(path.as_uri(), str(tmp_dir), text, 1, type_dicts, incremental=False)
+
+    analyze()
+    t_analysis = best_of(analyze)
+
+    tracemalloc.start()
+    doc = analyze()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ranges = [ln.loc for ln in doc.code_intelligence.lookup_table]
+    t_to_dict = best_of(lambda n: to_dict([doc.symbols, doc.problems, ranges]))
+
+    print(f"Analysis : {t_analysis * 1000:8.1f} ms, peak {peak / 2 ** 20:6.2f} MiB, "
+          f"{current / 2 ** 20:6.2f} MiB kept")
+    print(f"to_dict  : {t_to_dict * 1000:8.1f} ms for {len(doc.symbols)} symbols, "
+          f"{len(doc.problems)} diagnostics and {len(ranges)} ranges")
+
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
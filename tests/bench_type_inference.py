@@ -0,0 +1,111 @@
+"""Time the analysis of the test corpus, and the type inference within it,
+with every allowed type checked in turn, with nodes that state their class
+looked up by name and with the decision remembered for each shape of node
+
+    cd tests; python bench_type_inference.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import tempfile
+import time
+
+import benten.code.document
+import benten.cwl.arraytype
+import benten.cwl.lomtype
+import benten.cwl.recordtype
+import benten.cwl.typeinference as typeinference
+from benten.code.document import Document
+
+from lib import load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+callers = [benten.code.document, benten.cwl.arraytype, benten.cwl.lomtype, benten.cwl.recordtype]
+
+
+def recorded_calls(analyze):
+    calls = []
+
+    def infer_type(node, allowed_types, key=None, map_sp=None):
+        calls.append((node, allowed_types, key, map_sp))
+        return typeinference.infer_type(node, allowed_types, key, map_sp)
+
+    for module in callers:
+        module.infer_type = infer_type
+    try:
+        analyze()
+    finally:
+        for module in callers:
+            module.infer_type = typeinference.infer_type
+    return calls
+
+
+def best_of(fns, runs=20):
+    # The runs of each fn are interleaved, so a busy spell on the machine does
+    # not favour one of them
+    times = [[] for _ in fns]
+    for _ in range(runs):
+        for fn, fn_times in zip(fns, times):
+            t0 = time.perf_counter()
+            fn()
+            fn_times += [time.perf_counter() - t0]
+    return [min(fn_times) for fn_times in times]
+
+
+def main():
+    type_dicts = load_type_dicts()
+    scratch = tempfile.mkdtemp(prefix="benten-bench")
+    documents = [(p.as_uri(), p.read_text()) for p in sorted((current_path / "cwl").glob("**/*.cwl"))]
+
+    def analyze():
+        for uri, text in documents:
+            Document(uri, scratch, text, 1, type_dicts, yaml_loader="fast", incremental=False)
+
+    calls = recorded_calls(analyze)
+
+    node_shape = typeinference.node_shape
+    labels = ["Each type", "Index", "Index, memo"]
+
+    def use(label):
+        # Every allowed type checked in turn, the index of class names alone,
+        # or the index and the memo of decisions
+        infer = typeinference.infer_type_by_checks if label == "Each type" else typeinference.infer_type
+        for module in callers:
+            module.infer_type = infer
+        typeinference.node_shape = node_shape if label == "Index, memo" else lambda *args: None
+        return infer
+
+    def run(fn, label):
+        return lambda: fn(use(label))
+
+    def analyze_with(infer):
+        analyze()
+
+    def infer_all(infer):
+        for node, allowed_types, key, map_sp in calls:
+            infer(node, allowed_types, key, map_sp)
+
+    t_analysis = best_of([run(analyze_with, label) for label in labels])
+    t_infer = best_of([run(infer_all, label) for label in labels])
+    use("Index, memo")
+    for label, t_a, t_i in zip(labels, t_analysis, t_infer):
+        print(f"{label:12}: {t_a * 1000:8.1f} ms to analyze {len(documents)} documents, "
+              f"{t_i * 1000:8.1f} ms for their {len(calls)} infer_type calls")
+
+    # The calls for nodes that state their class, which only the index speeds up
+    explicit = [c for c in calls if typeinference.get_explicit_type_str(c[0], c[2], c[3]) is not None]
+
+    def infer_explicit(infer):
+        for _ in range(100):
+            for node, allowed_types, key, map_sp in explicit:
+                infer(node, allowed_types, key, map_sp)
+
+    t_explicit = best_of([run(infer_explicit, label) for label in labels[:2]])
+    use("Index, memo")
+    for label, t in zip(labels, t_explicit):
+        print(f"{label:12}: {t * 1000:8.1f} ms for 100 x {len(explicit)} calls with a stated class")
+
+
+if __name__ == "__main__":
+    main()
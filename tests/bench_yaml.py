@@ -0,0 +1,40 @@
+"""Time loading the YAML of a 200 step workflow, and a re-analysis of it,
+with ruamel's round trip loader and with the fast loader
+
+    cd tests; python bench_yaml.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import shutil
+import tempfile
+
+from benten.code.document import Document
+from benten.code.yaml import parse_yaml
+
+from lib import load_type_dicts
+from bench_incremental import workflow, best_of
+
+current_path = pathlib.Path(__file__).parent
+
+
+def main():
+    type_dicts = load_type_dicts()
+    tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"))
+    shutil.copy(current_path / "cwl" / "misc" / "clt1.cwl", tmp_dir / "clt1.cwl")
+    path = tmp_dir / "wf.cwl"
+    text = workflow(200)
+    edited = text.replace("step99/out1", "step98/out1")
+
+    for loader in ["rt", "fast"]:
+        t_yaml = best_of(lambda n: parse_yaml(edited if n % 2 == 0 else text, loader=loader))
+        doc = Document(path.as_uri(), str(tmp_dir), text, 1, type_dicts, yaml_loader=loader)
+        t = best_of(lambda n: doc.update(edited if n % 2 == 0 else text))
+        print(f"{loader:4}: YAML load {t_yaml * 1000:8.1f} ms, update {t * 1000:8.1f} ms")
+
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
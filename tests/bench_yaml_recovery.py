@@ -0,0 +1,58 @@
+"""Time parsing the test CWL files while a key is being typed in (the line is
+cut short, so the key is missing its ":") against parsing the complete files
+
+    cd tests; python bench_yaml_recovery.py
+"""
+
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import random
+import time
+
+from benten.code.yaml import parse_yaml, yaml_blocks
+
+current_path = pathlib.Path(__file__).parent
+
+
+def typing(text: str, rnd: random.Random):
+    """The text as each character of a key is typed, for a few keys"""
+    lines = text.splitlines()
+    keys = [n for n, line in enumerate(lines)
+            if ":" in line and not line.lstrip().startswith(("#", "-"))]
+    for n in rnd.sample(keys, min(3, len(keys))):
+        line = lines[n]
+        indent = len(line) - len(line.lstrip())
+        for end in range(indent + 1, line.index(":")):
+            yield "\n".join(lines[:n] + [line[:end]] + lines[n + 1:]) + "\n"
+
+
+def main():
+    texts = [path.read_text() for path in sorted((current_path / "cwl").glob("**/*.cwl"))]
+    texts = [text for text in texts if text.count("\n") > 30]
+
+    for loader in ["rt", "fast"]:
+        rnd = random.Random(0)
+        yaml_blocks.clear()
+        t_clean, t_typing, keystrokes, recoveries, failures = 0, 0, 0, [], 0
+        for text in texts:
+            t0 = time.perf_counter()
+            parse_yaml(text, loader=loader)
+            t_clean += time.perf_counter() - t0
+
+            for n, typed in enumerate(typing(text, rnd)):
+                t0 = time.perf_counter()
+                cwl, problems = parse_yaml(typed, loader=loader, recoveries=recoveries)
+                t_typing += time.perf_counter() - t0
+                keystrokes += 1
+                failures += cwl is None
+
+        t_clean /= len(texts)
+        t_typing /= keystrokes
+        print(f"{loader:4}: complete file {t_clean * 1000:6.2f} ms, "
+              f"while typing {t_typing * 1000:6.2f} ms ({t_typing / t_clean:4.2f}x) "
+              f"over {keystrokes} keystrokes, {len(recoveries)} recoveries, {failures} not recovered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import asyncio
+import pathlib
+import socket
+import threading
+import time
+
+from benten.configuration import Configuration
+from benten.langserver.aioserver import AsyncLangServer, serve_stream
+from benten.langserver.base import LSPErrCode
+from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter
+
+current_path = pathlib.Path(__file__).parent
+
+
+class AskingLangServer(AsyncLangServer):
+    def serve_test_slow(self, client_query):
+        time.sleep(0.3)
+        return "done"
+
+    def serve_test_ask(self, client_query):
+        # A request of our own to the client, from the handler thread
+        answer = self.conn.send_request("test/question", {"q": client_query["params"]["q"]})
+        return answer["result"] * 2
+
+
+def start_server(config):
+    server_sock, client_sock = socket.socketpair()
+
+    async def serve():
+        reader, writer = await asyncio.open_connection(sock=server_sock)
+        await serve_stream(reader, writer, config, server_class=AskingLangServer)
+
+    thread = threading.Thread(target=lambda: asyncio.run(serve()), daemon=True)
+    thread.start()
+    client = JSONRPC2Connection(ReadWriter(client_sock.makefile("rb"), client_sock.makefile("wb")))
+    return thread, client
+
+
+def test_message_loop():
+    config = Configuration()
+    config.initialize()
+    server_thread, client = start_server(config)
+
+    def request(rid, method, params):
+        client._send({"jsonrpc": "2.0", "id": rid, "method": method, "params": params})
+
+    request(0, "initialize", {})
+    assert client.read_message()["id"] == 0
+
+    path = current_path / "cwl" / "misc" / "wf-when-input.cwl"
+    client.send_notification("textDocument/didOpen", {
+        "textDocument": {"uri": path.as_uri(), "text": path.read_text(), "version": 1}})
+    request(1, "textDocument/hover", {
+        "textDocument": {"uri": path.as_uri()}, "position": {"line": 10, "character": 6}})
+
+    messages = [client.read_message() for _ in range(2)]
+    hover = next(m for m in messages if m.get("id") == 1)
+    assert "Sibling" in hover["result"]["contents"]["value"]
+
+    # The cancellation is read while the slow request is being handled
+    request(2, "test/slow", {})
+    request(3, "textDocument/hover", {
+        "textDocument": {"uri": path.as_uri()}, "position": {"line": 10, "character": 6}})
+    client.send_notification("$/cancelRequest", {"id": 3})
+
+    assert client.read_message()["result"] == "done"
+    cancelled = client.read_message()
+    assert cancelled["id"] == 3
+    assert cancelled["error"]["code"] == LSPErrCode.RequestCancelled
+
+    # The server asks the client something while handling a request
+    request(4, "test/ask", {"q": 21})
+    question = client.read_message()
+    assert question["method"] == "test/question"
+    client.write_response(question["id"], question["params"]["q"])
+    assert client.read_message() == {"jsonrpc": "2.0", "id": 4, "result": 42}
+
+    request(5, "shutdown", {})
+    assert client.read_message()["id"] == 5
+    server_thread.join(timeout=5)
+    assert not server_thread.is_alive()
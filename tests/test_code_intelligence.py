@@ -200,3 +200,14 @@ def test_docs_on_hover():
     hov = doc.hover(Position(10, 6))
     assert "Sibling" in hov.contents.value
     assert hov.contents.kind == "markdown"
+
+
+def test_key_intelligence_is_shared():
+    doc1 = load(doc_path=path, type_dicts=type_dicts)
+    doc2 = load(doc_path=path, type_dicts=type_dicts)
+
+    # The key "label" of the Workflow
+    node = doc1.code_intelligence.get_doc_element(Position(5, 2))
+    assert node is doc2.code_intelligence.get_doc_element(Position(5, 2))
+    assert "Sibling" in node.doc
+    assert "steps" in [c.label for c in node.completion()]
@@ -34,3 +34,74 @@ def test_basic(monkeypatch):
     assert config.scratch_path.exists()
 
     assert "v1.0" in config.lang_models
+
+
+def test_language_model_cache(monkeypatch):
+    monkeypatch.setitem(os.environ, "XDG_DATA_HOME", test_dir)
+
+    config = Configuration()
+    config.initialize()
+    for version in config.lang_models:
+        _ = config.lang_models[version]
+    cached = list(config.cache_path.glob("*.pickle"))
+    assert len(cached) == len(config.lang_models)
+
+    # Second start should be served from the cache
+    config2 = Configuration()
+    config2.initialize()
+    assert set(config2.lang_models["v1.0"].keys()) == set(config.lang_models["v1.0"].keys())
+    assert "steps" in config2.lang_models["v1.2.0"]["Workflow"].fields
+    assert set(config2.cache_path.glob("*.pickle")) == set(cached)
+
+    # A corrupted cache is ignored and rewritten
+    cached[0].write_bytes(cached[0].read_bytes()[:-10])
+    config3 = Configuration()
+    config3.initialize()
+    for version in config3.lang_models:
+        _ = config3.lang_models[version]
+    assert len(list(config3.cache_path.glob("*.pickle"))) == len(cached)
+
+
+def test_lazy_language_models(monkeypatch):
+    monkeypatch.setitem(os.environ, "XDG_DATA_HOME", test_dir)
+
+    config = Configuration()
+    config.initialize()
+    assert "v1.2.0" in config.lang_models
+    assert "v0.9" not in config.lang_models
+    assert config.lang_models.loaded() == []
+
+    assert "Workflow" in config.lang_models.get("v1.2.0")
+    assert config.lang_models.loaded() == ["v1.2.0"]
+
+    config.lang_models.prewarm(["v1.0", "v0.9"]).join()
+    assert config.lang_models.loaded() == ["v1.0", "v1.2.0"]
+
+
+def test_code_digest_covers_pickled_classes():
+    # Every class in a pickled model, and every class it inherits from, is
+    # defined in a file whose source goes into the cache key
+    import io
+    import sys
+    import json
+    import pickle
+    from benten.cwl.modelcache import pickled_sources
+    from benten.cwl.specification import parse_schema
+
+    classes = set()
+
+    class RecordingUnpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            cls = super().find_class(module, name)
+            classes.add(cls)
+            return cls
+
+    schema_file = pathlib.Path(__file__).parent.parent / "benten_schemas" / "schema-v1.0.json"
+    data = pickle.dumps(parse_schema(json.loads(schema_file.read_text())), protocol=pickle.HIGHEST_PROTOCOL)
+    RecordingUnpickler(io.BytesIO(data)).load()
+
+    sources = {str(p.resolve()) for p in pickled_sources()}
+    modules = {c.__module__ for cls in classes for c in cls.__mro__ if c.__module__.startswith("benten.")}
+    assert "benten.code.intelligence" in modules
+    for module in modules:
+        assert str(pathlib.Path(sys.modules[module].__file__).resolve()) in sources
@@ -0,0 +1,74 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+
+from benten.code.textbuffer import TextBuffer
+from benten.langserver.lspobjects import Position, Range
+
+from lib import load, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+
+def _range(l0, c0, l1, c1):
+    return Range(Position(l0, c0), Position(l1, c1))
+
+
+def test_text_buffer_edits():
+    buf = TextBuffer("class: Workflow\ninputs: []\nsteps: []\n")
+
+    buf.apply_change(_range(0, 7, 0, 15), "CommandLineTool")
+    assert buf.text == "class: CommandLineTool\ninputs: []\nsteps: []\n"
+
+    # Multi-line delete
+    buf.apply_change(_range(1, 0, 2, 0), "")
+    assert buf.text == "class: CommandLineTool\nsteps: []\n"
+
+    # Multi-line insert
+    buf.apply_change(_range(1, 0, 1, 0), "inputs:\n  in1: File\n")
+    assert buf.text == "class: CommandLineTool\ninputs:\n  in1: File\nsteps: []\n"
+    assert buf.line_count == 4
+
+    # Append at the very end
+    buf.apply_change(_range(4, 0, 4, 0), "outputs: []")
+    assert buf.text.endswith("steps: []\noutputs: []")
+
+
+def test_text_buffer_lsp_line_breaks():
+    # Only \n, \r\n and \r end a line. Form feeds, NEL and the Unicode line
+    # separators are part of the line
+    buf = TextBuffer("doc: a\x0cb\u2028c\x85d\r\nlabel: x\rid: y\n")
+    assert len(buf.lines) == 3
+
+    buf.apply_change(_range(1, 7, 1, 8), "z")
+    assert buf.text == "doc: a\x0cb\u2028c\x85d\r\nlabel: z\rid: y\n"
+
+    buf.apply_change(_range(2, 4, 2, 5), "w")
+    assert buf.text.endswith("\rid: w\n")
+
+
+def test_text_buffer_utf16_columns():
+    buf = TextBuffer("doc: \U0001F600 smile\n")
+    # The emoji is two UTF-16 code units wide
+    buf.apply_change(_range(0, 8, 0, 13), "frown")
+    assert buf.text == "doc: \U0001F600 frown\n"
+
+
+def test_incremental_update_matches_full_update():
+    type_dicts = load_type_dicts()
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    full_text = path.read_text()
+
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    lines = full_text.splitlines(keepends=True)
+
+    # Delete a line and put it back in two edits
+    doc.apply_change(_range(10, 0, 11, 0), "")
+    doc.update()
+    doc.apply_change(_range(10, 0, 10, 0), lines[10])
+    doc.update()
+
+    assert doc.text == full_text
+    assert len(doc.problems) == 0
+    cmpl = doc.completion(Position(10, 14))
+    assert "in1" in [c.label for c in cmpl]
@@ -2,7 +2,13 @@
 
 import pathlib
 
+from ruamel.yaml import YAML
+
 from benten.langserver.lspobjects import Position
+import benten.cwl.expressiontype as expressiontype
+from benten.code.jsengine import JSEngine, ExpressionTimeout, JSWorkerFailed
+from benten.cwl.expressiontype import expression_results, evaluate_expression, ExpressionType
+from benten.code.jobfile import job_files
 
 from lib import load, load_type_dicts
 
@@ -49,3 +55,144 @@ def test_v1_1_runtime():
 
     hov = doc.hover(loc=Position(31, 34))
     assert "exitCode" in hov.contents.value
+
+
+def test_expression_lib_is_loaded_once():
+    engine = JSEngine(workers=1)
+    lib = ["var calls = 0; function twice(x) { calls += 1; return 2 * x; }"]
+
+    assert engine.evaljs(lib, "twice(dukpy.inputs.x)", inputs={"x": 2}) == 4
+    assert engine.evaljs(lib, "twice(dukpy.inputs.x)", inputs={"x": 5}) == 10
+    # The library ran once, its state carried over
+    assert engine.evaljs(lib, "calls", inputs={}) == 2
+    # A different library gets its own interpreter
+    assert engine.evaljs(["var calls = 10;"], "calls", inputs={}) == 10
+    engine.shutdown()
+
+
+def test_runaway_expression_is_stopped():
+    engine = JSEngine(workers=1, timeout=0.5)
+    try:
+        engine.evaljs([], "while(true) {}", inputs={})
+        assert False, "Expected a timeout"
+    except ExpressionTimeout:
+        pass
+
+    # The worker is replaced
+    assert engine.evaljs([], "1 + 1", inputs={}) == 2
+    assert engine.info()["timeouts"] == 1
+    engine.shutdown()
+
+
+def test_expression_results_are_reused():
+    path = current_path / "cwl" / "misc" / "clt1.cwl"
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    job_file = doc.code_intelligence.execution_context.write_sample_data_file()
+
+    hov = doc.hover(loc=Position(10, 19))
+    info = expression_results.info()
+    assert doc.hover(loc=Position(10, 19)).contents.value == hov.contents.value
+    assert expression_results.info()["hits"] > info["hits"]
+    assert expression_results.info()["misses"] == info["misses"]
+
+    # Editing the sample job invalidates the results
+    job_file.write_text("#custom\n" + job_file.read_text())
+    doc.hover(loc=Position(10, 19))
+    assert expression_results.info()["misses"] > info["misses"]
+
+
+def test_worker_failures_are_not_kept(monkeypatch):
+    class Engine:
+        def __init__(self, *results):
+            self.results = list(results)
+
+        def evaljs(self, *args, **kwargs):
+            res = self.results.pop(0)
+            if isinstance(res, Exception):
+                raise res
+            return res
+
+    def evaluate():
+        return evaluate_expression("inputs.x + 1", ExpressionType.ParameterReference, [], {}, {"x": 41}, None)
+
+    monkeypatch.setattr(expressiontype, "js_engine", Engine(
+        JSWorkerFailed("JavaScript worker failed: EOF"), ExpressionTimeout("Too slow"), 42))
+    assert evaluate() == "JavaScript worker failed: EOF"
+    assert evaluate() == "Too slow"
+    assert evaluate() == "42"
+    # Now it is kept
+    assert evaluate() == "42"
+
+
+def test_sample_data_is_generated_on_demand():
+    path = current_path / "cwl" / "misc" / "wf-when-input.cwl"
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    execution_context = doc.code_intelligence.execution_context
+
+    # Only the step's sources get sample values
+    hov = doc.hover(loc=Position(15, 22))
+    assert "/path/to/in2_" in hov.contents.value
+    job_files.wait(execution_context.get_sample_data_file_path())
+    assert list(execution_context.sample_job().inputs.keys()) == ["in1", "in2"]
+    assert execution_context.sample_job().outputs == {}
+    assert not execution_context.get_sample_data_file_path().exists()
+
+
+def test_sample_job_file_is_written_on_request(tmp_path):
+    clt = current_path / "cwl" / "misc" / "clt1.cwl"
+    path = tmp_path / "wf.cwl"
+    path.write_text(
+        "cwlVersion: v1.0\n"
+        "class: Workflow\n"
+        "requirements:\n"
+        "  StepInputExpressionRequirement: {}\n"
+        "  InlineJavascriptRequirement: {}\n"
+        "inputs: {in1: string, in2: File, in3: string, in4: File}\n"
+        "steps:\n"
+        "  step1:\n"
+        f"    run: {clt}\n"
+        "    in:\n"
+        "      in1:\n"
+        "        source: in2\n"
+        "        valueFrom: $(self.basename)\n"
+        "    out: [out1]\n"
+        "  step2:\n"
+        f"    run: {clt}\n"
+        "    in:\n"
+        "      in1: in3\n"
+        "    out: [out1]\n"
+        "outputs: []\n")
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    execution_context = doc.code_intelligence.execution_context
+    job_file = execution_context.get_sample_data_file_path()
+
+    doc.hover(loc=Position(12, 23))
+    job_files.wait(job_file)
+    assert list(execution_context.sample_job().inputs.keys()) == ["in2"]
+    assert not job_file.exists()
+
+    # The whole job is generated when the user asks for the file, with the
+    # value the hover used
+    in2 = execution_context.sample_job().inputs["in2"]
+    execution_context.write_sample_data_file()
+    job = job_files.custom_job(job_file) or YAML(typ="safe").load(job_file.read_text())
+    assert sorted(job["inputs"]) == ["in1", "in2", "in3", "in4", "step1/out1", "step2/out1"]
+    assert job["inputs"]["in2"] == in2
+    assert job_files.info()["pending"] == 0
+
+
+def test_sample_job_is_kept_across_updates():
+    path = current_path / "cwl" / "misc" / "clt1.cwl"
+    doc = load(doc_path=path, type_dicts=type_dicts)
+
+    hov = doc.hover(loc=Position(7, 25))
+    doc.update(doc.text + "\n# An edit")
+    assert doc.hover(loc=Position(7, 25)).contents.value == hov.contents.value
+
+    # A customized job is read once per change
+    job_file = doc.code_intelligence.execution_context.write_sample_data_file()
+    job_file.write_text("#custom\n" + job_file.read_text().replace("in1_", "Custom_"))
+    reads = job_files.info()["reads"]
+    for _ in range(3):
+        assert doc.hover(loc=Position(7, 25)).contents.value.startswith("```\nA_Custom_")
+    assert job_files.info()["reads"] == reads + 1
@@ -0,0 +1,78 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+
+import pytest
+
+from benten.code import fastyaml
+from benten.code.yaml import parse_yaml, fast_yaml_load, yaml_to_string, _yaml_loader
+from benten.code.document import Document
+from benten.langserver.lspobjects import Position
+
+from lib import load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+pytestmark = pytest.mark.skipif(not fastyaml.available(), reason="PyYAML is not installed")
+
+
+def _positions(node, path=()):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            yield path + (k,), node.lc.key(k), node.lc.value(k)
+            yield from _positions(v, path + (k,))
+    elif isinstance(node, list):
+        for n, v in enumerate(node):
+            yield path + (n,), node.lc.item(n)
+            yield from _positions(v, path + (n,))
+
+
+def test_same_as_round_trip():
+    for path in (current_path / "cwl").glob("**/*.cwl"):
+        text = path.read_text()
+        rt, rt_problems = parse_yaml(text, loader="rt")
+        fast, fast_problems = parse_yaml(text, loader="fast")
+
+        assert [p.range for p in fast_problems] == [p.range for p in rt_problems], path
+        assert fast == rt, path
+        assert list(_positions(fast)) == list(_positions(rt)), path
+
+
+def test_scalars_and_missing_values():
+    text = "a: 1\na: 2\nb:\n\n# c\nc: [yes, 1:20, 0o17, 0x1F, .inf, ~]\nd: &A {x: 1}\ne: *A\n"
+    fast, rt = fastyaml.load(text), _yaml_loader.load(text)
+    assert fast == rt
+    assert list(_positions(fast)) == list(_positions(rt))
+
+    fast = fastyaml.load("d: &A {x: 1, y: 1}\ne:\n  <<: *A\n  y: 2\n")
+    assert fast["e"] == {"y": 2, "x": 1}
+
+
+def test_write_out():
+    assert yaml_to_string(fastyaml.load("a: {b: [1, 2]}")) == yaml_to_string({"a": {"b": [1, 2]}})
+
+
+def test_healing():
+    cwl, problems = parse_yaml("class: Workflow\ninputs\nsteps:\n  step1:\n", loader="fast")
+    assert not problems
+    assert "inputs" in cwl
+
+
+def test_analysis(tmp_path):
+    type_dicts = load_type_dicts()
+    path = current_path / "cwl" / "ebi" / "workflows" / "cmsearch-multimodel-wf.cwl"
+    docs = [Document(path.as_uri(), tmp_path, path.read_text(), 1, type_dicts, yaml_loader=loader)
+            for loader in ["rt", "fast"]]
+    assert [(p.range, p.message) for p in docs[0].problems] == [(p.range, p.message) for p in docs[1].problems]
+    assert [(s.name, s.range) for s in docs[0].symbols] == [(s.name, s.range) for s in docs[1].symbols]
+
+
+def test_linked_files(tmp_path):
+    assert isinstance(fast_yaml_load("a: [1, 2]"), fastyaml.PositionalMap)
+    assert fast_yaml_load("a: [1, 2") is None
+
+    # The hover on a linked type writes out the map the fast loader read
+    path = current_path / "cwl" / "misc" / "cl-schemadef-import.cwl"
+    doc = Document(path.as_uri(), tmp_path, path.read_text(), 1, load_type_dicts(), yaml_loader="fast")
+    assert not doc.problems
+    assert "type: record" in doc.hover(Position(4, 12)).contents.value
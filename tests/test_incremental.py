@@ -0,0 +1,71 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import shutil
+
+from benten.langserver.lspobjects import Position
+
+from lib import load, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+type_dicts = load_type_dicts()
+
+
+def _problems(doc):
+    return sorted((p.range.start.line, p.range.start.character, p.message) for p in doc.problems)
+
+
+def test_unchanged_steps_are_reused(tmp_path):
+    for f in ["wf-when-input.cwl", "clt1.cwl"]:
+        shutil.copy(current_path / "cwl" / "misc" / f, tmp_path / f)
+    path = tmp_path / "wf-when-input.cwl"
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    text = doc.text
+
+    # Moving the step down leaves its analysis intact, just moved
+    doc.update("# A comment\n# and another\n" + text)
+    assert doc.code_intelligence.step_reuse.reused == 1
+    full = load(doc_path=path, type_dicts=type_dicts)
+    full.update(doc.text)
+    assert _problems(doc) == _problems(full)
+    hov = doc.hover(Position(17, 22))
+    assert "/path/to/in2_" in hov.contents.value
+    assert hov.range.start.line == 17
+
+    # An edited step is parsed again
+    doc.update(text.replace("new_input: in1", "new_input: in2", 1))
+    assert doc.code_intelligence.step_reuse.reused == 0
+
+    # As is one whose run target changed
+    doc.update(text)
+    (tmp_path / "clt1.cwl").write_text((tmp_path / "clt1.cwl").read_text() + "\n")
+    doc.update(text + "\n")
+    assert doc.code_intelligence.step_reuse.reused == 0
+
+
+def test_step_is_parsed_again_when_run_imports_change(tmp_path):
+    for f in ["cl-schemadef-import.cwl", "paired_end_record.yml"]:
+        shutil.copy(current_path / "cwl" / "misc" / f, tmp_path / f)
+    path = tmp_path / "wf.cwl"
+    text = (
+        "cwlVersion: v1.0\n"
+        "class: Workflow\n"
+        "inputs: []\n"
+        "steps:\n"
+        "  step1:\n"
+        "    run: cl-schemadef-import.cwl\n"
+        "    in: []\n"
+        "    out: []\n"
+        "outputs: []\n")
+    path.write_text(text)
+    doc = load(doc_path=path, type_dicts=type_dicts)
+
+    doc.update(text + "\n")
+    assert doc.code_intelligence.step_reuse.reused == 1
+
+    # The run target is untouched, but a file it $imports changed
+    types_file = tmp_path / "paired_end_record.yml"
+    types_file.write_text(types_file.read_text() + "\n")
+    doc.update(text)
+    assert doc.code_intelligence.step_reuse.reused == 0
@@ -0,0 +1,64 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import io
+import os
+import threading
+
+import pytest
+
+import benten.langserver.jsonrpc as jsonrpc
+from benten.langserver.jsonrpc import (
+    JSONRPC2Connection, JSONRPC2ProtocolError, ReadWriter, JSONCodec, ORJSONCodec)
+
+
+codecs = [JSONCodec] + ([ORJSONCodec] if jsonrpc.orjson is not None else [])
+
+
+@pytest.mark.parametrize("codec", codecs)
+def test_content_length_counts_bytes(monkeypatch, codec):
+    monkeypatch.setattr(jsonrpc, "codec", codec)
+    out = io.BytesIO()
+    conn = JSONRPC2Connection(ReadWriter(None, out))
+    conn.send_notification("window/showMessage", {"message": "Référence à «inputs» ✓"})
+
+    header, body = out.getvalue().split(b"\r\n\r\n")
+    assert b"Content-Length: %d\r\n" % len(body) in header + b"\r\n"
+    assert len(body) > len(body.decode("utf-8"))
+
+    # And it reads back
+    conn = JSONRPC2Connection(ReadWriter(io.BytesIO(out.getvalue()), None))
+    assert conn.read_message()["params"]["message"] == "Référence à «inputs» ✓"
+
+
+def test_headers():
+    body = '{"jsonrpc":"2.0","method":"initialized","params":{"note":"é"}}'.encode("utf-8")
+    stream = (
+        b"Content-Type: application/vscode-jsonrpc; charset=utf-8\r\n"
+        b"content-length: %d\r\n\r\n" % len(body) + body +
+        b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    conn = JSONRPC2Connection(ReadWriter(io.BytesIO(stream), None))
+    assert conn.read_message()["params"]["note"] == "é"
+    assert conn.read_message()["method"] == "initialized"
+    with pytest.raises(EOFError):
+        conn.read_message()
+
+    conn = JSONRPC2Connection(ReadWriter(io.BytesIO(b"Content-Length: 10\n\r\n{}"), None))
+    with pytest.raises(JSONRPC2ProtocolError):
+        conn.read_message()
+
+    conn = JSONRPC2Connection(ReadWriter(io.BytesIO(b"Content-Type: x\r\n\r\n{}"), None))
+    with pytest.raises(JSONRPC2ProtocolError):
+        conn.read_message()
+
+
+def test_pipe():
+    r, w = os.pipe()
+    sender = JSONRPC2Connection(ReadWriter(None, os.fdopen(w, "wb")))
+    receiver = JSONRPC2Connection(ReadWriter(os.fdopen(r, "rb"), None))
+
+    # Bigger than a pipe's buffer, so the write is partial
+    params = {"items": ["ünïcödé"] * 20000}
+    thread = threading.Thread(target=lambda: sender.send_notification("test/big", params))
+    thread.start()
+    assert receiver.read_message()["params"] == params
+    thread.join()
@@ -0,0 +1,298 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import queue
+import pathlib
+import threading
+import time
+
+from benten.configuration import Configuration
+from benten.langserver.server import LangServer
+from benten.langserver.base import LSPErrCode
+from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter
+from benten.langserver.lspobjects import (
+    to_dict, Position, Range, Diagnostic, DiagnosticSeverity, CompletionItem, CompletionList, TextEdit)
+
+current_path = pathlib.Path(__file__).parent
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.responses = []
+        self.notifications = []
+
+    def write_response(self, rid, result):
+        self.responses += [(rid, result)]
+
+    def write_error(self, rid, code, message, data=None):
+        self.responses += [(rid, {"code": code, "message": message})]
+
+    def send_notification(self, method, params):
+        self.notifications += [(method, params)]
+
+
+def make_server(analysis_delay=0.05):
+    config = Configuration()
+    config.initialize()
+    config.analysis_delay = analysis_delay
+    conn = RecordingConnection()
+    server = LangServer(conn=conn, config=config)
+    server.handle({"id": 0, "method": "initialize", "params": {}})
+    return server, conn
+
+
+def wait_for(condition, timeout=5):
+    t0 = time.time()
+    while not condition():
+        if time.time() - t0 > timeout:
+            raise TimeoutError()
+        time.sleep(0.01)
+
+
+def did_open(server, path, version=1):
+    doc_uri = path.as_uri()
+    server.handle({
+        "method": "textDocument/didOpen",
+        "params": {"textDocument": {"uri": doc_uri, "text": path.read_text(), "version": version}}})
+    return doc_uri
+
+
+def did_change(server, doc_uri, version, start, end, text):
+    server.handle({
+        "method": "textDocument/didChange",
+        "params": {
+            "textDocument": {"uri": doc_uri, "version": version},
+            "contentChanges": [{
+                "range": {"start": {"line": start[0], "character": start[1]},
+                          "end": {"line": end[0], "character": end[1]}},
+                "text": text}]}})
+
+
+def test_change_burst_is_analyzed_once():
+    server, conn = make_server(analysis_delay=0.2)
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc_uri = did_open(server, path)
+    wait_for(lambda: len(conn.notifications) == 1)
+
+    doc = server.open_documents[doc_uri]
+    analyses = []
+    _update = doc.update
+    doc.update = lambda *args, **kwargs: analyses.append(1) or _update(*args, **kwargs)
+
+    # Type "abc" one character at a time at the end of the file
+    end_line = doc.text.count("\n")
+    for n, c in enumerate("abc"):
+        did_change(server, doc_uri, n + 2, (end_line, n), (end_line, n), c)
+
+    assert analyses == []
+    wait_for(lambda: len(conn.notifications) == 2)
+    assert analyses == [1]
+    assert len(conn.notifications) == 2
+    assert doc.text.endswith("abc")
+
+
+def test_request_forces_pending_analysis():
+    server, conn = make_server(analysis_delay=10)
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc_uri = did_open(server, path)
+    doc = server.open_documents[doc_uri]
+    wait_for(lambda: not doc.is_stale)
+
+    # An edit below the cursor does not invalidate the existing analysis ...
+    end_line = doc.text.count("\n")
+    did_change(server, doc_uri, 2, (end_line, 0), (end_line, 0), "#")
+    server.handle({
+        "id": 1, "method": "textDocument/completion",
+        "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 10, "character": 14}}})
+    assert doc.is_stale
+    assert "in1" in [c["label"] for c in conn.responses[-1][1]]
+
+    # ... but one above it does
+    did_change(server, doc_uri, 3, (0, 0), (0, 0), "\n")
+    server.handle({
+        "id": 2, "method": "textDocument/completion",
+        "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 11, "character": 14}}})
+    assert not doc.is_stale
+    assert "in1" in [c["label"] for c in conn.responses[-1][1]]
+
+
+class SlowLangServer(LangServer):
+    def serve_test_slow(self, client_query):
+        time.sleep(0.3)
+        return "done"
+
+
+def test_message_loop():
+    config = Configuration()
+    config.initialize()
+
+    client_to_server, server_to_client = os.pipe(), os.pipe()
+    server = SlowLangServer(
+        conn=JSONRPC2Connection(ReadWriter(
+            os.fdopen(client_to_server[0], "rb"), os.fdopen(server_to_client[1], "wb"))),
+        config=config)
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+
+    client = JSONRPC2Connection(ReadWriter(
+        os.fdopen(server_to_client[0], "rb"), os.fdopen(client_to_server[1], "wb")))
+
+    def request(rid, method, params):
+        client._send({"jsonrpc": "2.0", "id": rid, "method": method, "params": params})
+
+    request(0, "initialize", {})
+    assert client.read_message()["id"] == 0
+
+    # A hover right after opening waits for the first analysis, without
+    # holding up the requests behind it
+    path = current_path / "cwl" / "misc" / "wf-when-input.cwl"
+    client.send_notification("textDocument/didOpen", {
+        "textDocument": {"uri": path.as_uri(), "text": path.read_text(), "version": 1}})
+    request(1, "textDocument/hover", {
+        "textDocument": {"uri": path.as_uri()}, "position": {"line": 10, "character": 6}})
+
+    messages = [client.read_message() for _ in range(2)]
+    hover = next(m for m in messages if m.get("id") == 1)
+    assert "Sibling" in hover["result"]["contents"]["value"]
+
+    # A request queued behind a slow one can be cancelled
+    request(2, "test/slow", {})
+    request(3, "textDocument/hover", {
+        "textDocument": {"uri": path.as_uri()}, "position": {"line": 10, "character": 6}})
+    client.send_notification("$/cancelRequest", {"id": 3})
+
+    assert client.read_message()["result"] == "done"
+    cancelled = client.read_message()
+    assert cancelled["id"] == 3
+    assert cancelled["error"]["code"] == LSPErrCode.RequestCancelled
+
+    request(4, "shutdown", {})
+    assert client.read_message()["id"] == 4
+    server_thread.join(timeout=5)
+    assert not server_thread.is_alive()
+
+
+def test_lsp_objects_to_dict():
+    _range = Range(Position(1, 2), Position(1, 5))
+    assert to_dict(Diagnostic(_range, "Unknown field", severity=DiagnosticSeverity.Warning)) == {
+        "range": {"start": {"line": 1, "character": 2}, "end": {"line": 1, "character": 5}},
+        "message": "Unknown field",
+        "severity": DiagnosticSeverity.Warning
+    }
+
+    items = CompletionList(items=[CompletionItem(label="run", text_edit=TextEdit(_range, "run"))])
+    assert to_dict(items) == {
+        "isIncomplete": False,
+        "items": [{
+            "label": "run",
+            "kind": 1,
+            "textEdit": {"range": to_dict(_range), "newText": "run"}
+        }]
+    }
+
+
+def test_failed_analysis_is_not_rerun_for_requests():
+    server, conn = make_server(analysis_delay=10)
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc_uri = did_open(server, path)
+    doc = server.open_documents[doc_uri]
+    wait_for(lambda: not doc.is_stale)
+
+    analyses = []
+
+    def failing_analysis(*args):
+        analyses.append(1)
+        raise RuntimeError("analysis failed")
+
+    doc._analyze = failing_analysis
+    server._queue = queue.Queue()
+    did_change(server, doc_uri, 2, (0, 0), (0, 0), "\n")
+    server.handle({
+        "id": 1, "method": "textDocument/completion",
+        "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 11, "character": 14}}},
+        may_wait=True)
+
+    # The request waits for the analysis, which fails, and is then answered
+    # from the previous analysis without running it again
+    client_query, may_wait = server._queue.get(timeout=5)
+    assert doc.analysis_failed
+    server.handle(client_query, may_wait=may_wait)
+    assert analyses == [1]
+    assert conn.responses[-1][0] == 1
+
+    # Later requests on the same text do not wait for another analysis either
+    server.handle({
+        "id": 2, "method": "textDocument/hover",
+        "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 11, "character": 14}}},
+        may_wait=True)
+    assert conn.responses[-1][0] == 2
+    assert server._queue.empty() and server._waiting == {}
+    assert analyses == [1]
+
+
+def test_close_answers_waiting_requests():
+    server, conn = make_server(analysis_delay=10)
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc_uri = did_open(server, path)
+    doc = server.open_documents[doc_uri]
+    wait_for(lambda: not doc.is_stale)
+
+    analyze, go_on = doc._analyze, threading.Event()
+
+    def slow_analysis(*args):
+        go_on.wait(5)
+        return analyze(*args)
+
+    doc._analyze = slow_analysis
+    server._queue = queue.Queue()
+    did_change(server, doc_uri, 2, (0, 0), (0, 0), "\n")
+    server._enqueue({
+        "id": 1, "method": "textDocument/completion",
+        "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 11, "character": 14}}})
+    server.handle(*server._queue.get())
+    assert server._waiting
+
+    server.handle({"method": "textDocument/didClose", "params": {"textDocument": {"uri": doc_uri}}})
+    assert conn.responses[-1] == (1, {"code": LSPErrCode.ContentModified, "message": "Document closed"})
+    assert server._waiting == {} and server._queued == set()
+    go_on.set()
+
+
+def test_late_cancellation_is_not_kept():
+    server, conn = make_server()
+    server._queue = queue.Queue()
+    server._enqueue({"id": 1, "method": "initialized"})
+    server.handle(server._queue.get()[0])
+    server.cancel_request(1)
+    assert server._cancelled == set()
+
+    server._enqueue({"id": 2, "method": "initialized"})
+    server.cancel_request(2)
+    server.handle(server._queue.get()[0])
+    assert conn.responses[-1][1]["code"] == LSPErrCode.RequestCancelled
+    assert server._cancelled == set() and server._queued == set()
+
+
+class ClosedConnection(RecordingConnection):
+    def read_message(self):
+        raise EOFError()
+
+
+def test_session_end_leaves_shared_engine_running():
+    from benten.code.jsengine import js_engine
+    from benten.code.remotefetcher import remote_fetcher
+
+    other, _ = make_server()
+    assert js_engine.evaljs([], "1 + 1") == 2
+
+    config = Configuration()
+    config.initialize()
+    server = LangServer(conn=ClosedConnection(), config=config)
+    server.run()
+
+    # One client going away does not stop what the other sessions use
+    assert js_engine.info()["running"] > 0
+    assert js_engine.evaljs([], "2 + 2") == 4
+    assert server._remote_file_fetched not in remote_fetcher._subscribers
+    assert other._remote_file_fetched in remote_fetcher._subscribers
+    other.close()
@@ -0,0 +1,37 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import pathlib
+import shutil
+
+from benten.code.linkedfilecache import linked_file_cache
+
+from lib import load, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+
+def test_linked_files_are_read_once(tmp_path):
+    for fname in ["wf-port-completer.cwl", "clt1.cwl"]:
+        shutil.copy(current_path / "cwl" / "misc" / fname, tmp_path / fname)
+    path = tmp_path / "wf-port-completer.cwl"
+    type_dicts = load_type_dicts()
+
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    assert len(doc.problems) == 0
+    misses = linked_file_cache.info()["misses"]
+
+    # Re-analysis does not touch unchanged linked files
+    doc.update()
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    assert linked_file_cache.info()["misses"] == misses
+    assert len(doc.problems) == 0
+
+    # But does notice when they change
+    linked = tmp_path / "clt1.cwl"
+    st = linked.stat()
+    linked.write_text(linked.read_text().replace("in1", "in_new"))
+    os.utime(linked, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    doc.update()
+    assert linked_file_cache.info()["misses"] == misses + 1
+    assert len(doc.problems) > 0
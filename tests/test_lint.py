@@ -0,0 +1,49 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import json
+import pathlib
+import shutil
+
+from benten import lint
+
+current_path = pathlib.Path(__file__).parent
+
+
+def make_tree(tmp_path):
+    misc = current_path / "cwl" / "misc"
+    shutil.copy(misc / "clt1.cwl", tmp_path / "clt1.cwl")
+    (tmp_path / "sub").mkdir()
+    shutil.copy(misc / "wf-unused-input.cwl", tmp_path / "sub" / "wf-unused-input.cwl")
+    shutil.copy(misc / "wf-unk-version.cwl", tmp_path / "sub" / "wf-unk-version.cwl")
+    return tmp_path
+
+
+def test_lint_formats(tmp_path, capsys):
+    (tmp_path / "tree").mkdir()
+    root = make_tree(tmp_path / "tree")
+
+    assert lint.main([str(root / "clt1.cwl"), "-j", "1"]) == 0
+    assert capsys.readouterr().out == ""
+
+    assert lint.main([str(root), "-j", "1"]) == 1
+    text = capsys.readouterr().out
+    assert "wf-unused-input.cwl:5:3: warning: Unused input" in text
+    assert "wf-unk-version.cwl:2:13: error:" in text
+
+    out = tmp_path / "lint.json"
+    assert lint.main([str(root), "-j", "1", "--format", "json", "-o", str(out)]) == 1
+    results = {pathlib.Path(r["file"]).name: r["diagnostics"] for r in json.loads(out.read_text())}
+    assert results["clt1.cwl"] == []
+    assert results["wf-unused-input.cwl"][0]["range"]["start"] == {"line": 4, "character": 2}
+
+    assert lint.main([str(root), "-j", "1", "--format", "sarif", "-o", str(out)]) == 1
+    sarif = json.loads(out.read_text())
+    sarif_results = sarif["runs"][0]["results"]
+    warning = next(r for r in sarif_results if r["level"] == "warning")
+    assert warning["locations"][0]["physicalLocation"]["region"]["startLine"] == 5
+    assert any(r["level"] == "error" for r in sarif_results)
+
+
+def test_workers_agree(tmp_path):
+    files = lint.cwl_files([str(current_path / "cwl" / "misc")])
+    assert list(lint.lint(files, jobs=2)) == list(lint.lint(files, jobs=1))
@@ -0,0 +1,58 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benten.langserver import prefork
+from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def connect(port, timeout=60):
+    t0 = time.time()
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port))
+        except ConnectionRefusedError:
+            if time.time() - t0 > timeout:
+                raise
+            time.sleep(0.1)
+
+
+@pytest.mark.skipif(not prefork.available(), reason="needs os.fork")
+def test_workers_serve_connections():
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benten", "--mode", "tcp", "--addr", str(port), "--workers", "2"])
+    try:
+        socks = [connect(port) for _ in range(3)]
+        for n, sock in enumerate(socks):
+            conn = JSONRPC2Connection(ReadWriter(sock.makefile("rb"), sock.makefile("wb")))
+            conn._send({"jsonrpc": "2.0", "id": n, "method": "initialize", "params": {}})
+            response = conn.read_message()
+            assert response["id"] == n
+            assert response["result"]["capabilities"]["hoverProvider"]
+            sock.close()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=10)
+
+
+@pytest.mark.skipif(not prefork.available(), reason="needs os.fork")
+def test_memory_stats():
+    stats = prefork.memory_stats()
+    assert stats["MaxRss"] > 0
+    if os.path.exists("/proc/self/smaps_rollup"):
+        assert stats["Pss"] > 0
+    assert "MiB" in prefork.format_memory_stats(stats)
@@ -0,0 +1,190 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from benten.code.remotefetcher import RemoteFetcher
+from benten.langserver.lspobjects import Position
+
+from test_langserver import make_server, wait_for, did_open
+
+current_path = pathlib.Path(__file__).parent
+
+clt = (current_path / "cwl" / "misc" / "clt1.cwl").read_bytes()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+    proxy_authorization = None
+    delay = 0.5
+    failing = False
+
+    def do_GET(self):
+        Handler.requests += [(self.path, self.headers.get("If-None-Match"))]
+        Handler.proxy_authorization = self.headers.get("Proxy-Authorization")
+        if self.path.startswith("/slow"):
+            time.sleep(Handler.delay)
+
+        if Handler.failing:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path.endswith("/clt1.cwl"):
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(clt)))
+            self.end_headers()
+            self.wfile.write(clt)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def do_CONNECT(self):
+        # A proxy that lets no https through
+        Handler.requests += [("CONNECT " + self.path, None)]
+        Handler.proxy_authorization = self.headers.get("Proxy-Authorization")
+        self.send_response(403)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_host():
+    Handler.requests = []
+    Handler.failing = False
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_is_cached(http_host, tmp_path):
+    fetcher = RemoteFetcher(cache_dir=tmp_path)
+    url = http_host + "/clt1.cwl"
+
+    remote = fetcher.get(url)
+    assert remote.ok and remote.node_dict["class"] == "CommandLineTool"
+    assert fetcher.get(url) is remote
+    assert len(Handler.requests) == 1
+
+    # A new fetcher (think server restart) revalidates what is on disk
+    fetcher = RemoteFetcher(cache_dir=tmp_path, max_age=0)
+    remote = fetcher.get(url)
+    assert remote.node_dict["class"] == "CommandLineTool"
+    assert Handler.requests[-1] == ("/clt1.cwl", '"v1"')
+    assert fetcher.revalidated == 1
+
+
+def test_failed_refetch_keeps_contents(http_host, tmp_path):
+    fetcher = RemoteFetcher(cache_dir=tmp_path, max_age=0, retry_after=0)
+    url = http_host + "/clt1.cwl"
+    assert fetcher.get(url).ok
+
+    Handler.failing = True
+    remote = fetcher.get(url)
+    assert not remote.ok and remote.error == "HTTP 503"
+    assert remote.node_dict["class"] == "CommandLineTool"
+
+    # Once the host is back, the stale copy is revalidated
+    Handler.failing = False
+    remote = fetcher.get(url)
+    assert remote.ok and remote.node_dict["class"] == "CommandLineTool"
+    assert Handler.requests[-1] == ("/clt1.cwl", '"v1"')
+    assert fetcher.fetches == 3 and fetcher.revalidated == 1
+
+
+def test_failures_are_cached(http_host):
+    fetcher = RemoteFetcher()
+    url = http_host + "/no-such.cwl"
+
+    assert fetcher.get(url).missing
+    assert fetcher.get(url).missing
+    assert len(Handler.requests) == 1
+
+
+def test_fetch_timeout(http_host):
+    fetcher = RemoteFetcher(timeout=0.1)
+    t0 = time.time()
+    remote = fetcher.get(http_host + "/slow/clt1.cwl")
+    assert not remote.ok and not remote.missing
+    assert time.time() - t0 < Handler.delay
+
+
+def test_analysis_does_not_wait_for_fetch(http_host, tmp_path):
+    path = tmp_path / "wf.cwl"
+    path.write_text(
+        "cwlVersion: v1.0\n"
+        "class: Workflow\n"
+        "inputs:\n"
+        "  in1: string\n"
+        "steps:\n"
+        "  step1:\n"
+        f"    run: {http_host}/slow/clt1.cwl\n"
+        "    in:\n"
+        "      in1: in1\n"
+        "    out: [out1]\n"
+        "  step2:\n"
+        f"    run: {http_host}/slow/clt1.cwl\n"
+        "    in:\n"
+        "      in1: step1/out1\n"
+        "    out: [out1]\n"
+        "outputs:\n"
+        "  out1:\n"
+        "    type: File\n"
+        "    outputSource: step2/out1\n")
+
+    server, conn = make_server()
+    t0 = time.time()
+    doc_uri = did_open(server, path)
+
+    # The first analysis is published without the steps' process, and
+    # without complaints about their ports ...
+    wait_for(lambda: len(conn.notifications) == 1)
+    assert time.time() - t0 < Handler.delay
+    assert conn.notifications[-1][1]["diagnostics"] == []
+
+    # ... and the document is analyzed again once it is fetched
+    wait_for(lambda: len(conn.notifications) == 2)
+    assert conn.notifications[-1][1]["diagnostics"] == []
+    assert "class: CommandLineTool" in server.open_documents[doc_uri].hover(
+        Position(6, 12)).contents.value
+
+
+def test_fetch_through_proxy(http_host, tmp_path, monkeypatch):
+    # The test host stands in for the proxy: it is asked for the full URL
+    monkeypatch.setenv("http_proxy", "http://user:secret@" + http_host.split("://")[1])
+    monkeypatch.delenv("no_proxy", raising=False)
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    fetcher = RemoteFetcher(cache_dir=tmp_path)
+
+    remote = fetcher.get("http://cwl.example.com/tools/clt1.cwl")
+    assert remote.ok and remote.node_dict["class"] == "CommandLineTool"
+    assert Handler.requests == [("http://cwl.example.com/tools/clt1.cwl", None)]
+    assert Handler.proxy_authorization == "Basic dXNlcjpzZWNyZXQ="
+
+    # Hosts in no_proxy are asked directly
+    monkeypatch.setenv("no_proxy", "127.0.0.1")
+    assert fetcher.get(http_host + "/clt1.cwl").ok
+    assert Handler.requests[-1] == ("/clt1.cwl", None)
+
+    # https is tunneled with CONNECT
+    monkeypatch.setenv("https_proxy", "http://user:secret@" + http_host.split("://")[1])
+    remote = fetcher.get("https://cwl.example.com/tools/clt1.cwl")
+    assert not remote.ok and "403" in remote.error
+    assert Handler.requests[-1] == ("CONNECT cwl.example.com:443", None)
+    assert Handler.proxy_authorization == "Basic dXNlcjpzZWNyZXQ="
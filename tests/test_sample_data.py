@@ -0,0 +1,51 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+from benten.code.sampledata import generate_values
+
+
+ports = {
+    "reads": "File[]",
+    "sample": "Sample",
+    "threads": "int",
+    "mode": {"type": "enum", "symbols": ["fast", "slow", "exact"]}
+}
+
+user_types = {
+    "Sample": {
+        "type": "record",
+        "fields": {f"field{n}": "string" for n in range(50)}
+    }
+}
+
+
+def test_values_are_stable():
+    seed = "file:///work/wf.cwl"
+    values = generate_values(ports, user_types, seed=seed)
+    assert generate_values(ports, user_types, seed=seed) == values
+
+    # A port's value does not depend on which other ports are generated with it
+    assert generate_values(ports, user_types, names=["threads"], seed=seed)["threads"] == values["threads"]
+
+    # Different documents get different values
+    assert generate_values(ports, user_types, seed="file:///work/other.cwl") != values
+
+
+def test_values_are_made_per_item_and_field():
+    values = generate_values(
+        {"samples": {"type": "array", "items": "Sample"}, "reads": "File[]"}, user_types, seed="x")
+    samples = values["samples"]
+    assert len(samples) == 4 and len(samples[0]) == 50
+    assert [s["field0"].rsplit("_", 1)[0] for s in samples] == [f"samples/{i}/field0" for i in range(4)]
+    assert len({f["path"] for f in values["reads"]}) == 4
+
+    # Fields of the same type each get their own value
+    pair = {"Pair": {"type": "record", "fields": {"normal": "Sample", "tumor": "Sample"}}}
+    value = generate_values({"pair": "Pair"}, {**user_types, **pair}, seed="x")["pair"]
+    assert value["normal"]["field0"].startswith("pair/normal/field0_")
+    assert value["tumor"]["field0"].startswith("pair/tumor/field0_")
+
+
+def test_recursive_types_end():
+    node = {"Node": {"type": "record", "fields": {"label": "string", "next": "Node?"}}}
+    value = generate_values({"list": "Node"}, node, seed="x")["list"]
+    assert value["next"] is None
@@ -0,0 +1,97 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+
+import benten.cwl.typeinference as typeinference
+from benten.cwl.typeinference import infer_type_by_checks
+from benten.cwl.expressiontype import CWLExpression
+from benten.code.document import Document
+
+from lib import load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+callers = ["benten.code.document", "benten.cwl.arraytype", "benten.cwl.lomtype", "benten.cwl.recordtype"]
+
+
+def test_memo_agrees_with_checks(monkeypatch, tmp_path):
+    type_dicts = load_type_dicts()
+    calls, differences = [0], []
+
+    def infer_type(node, allowed_types, key=None, map_sp=None):
+        res = typeinference.infer_type(node, allowed_types, key, map_sp)
+        calls[0] += 1
+        expected = infer_type_by_checks(node, allowed_types, key, map_sp)
+        if type(res) is not type(expected) or str(res.name) != str(expected.name):
+            differences.append((node, res.name, expected.name))
+        return res
+
+    for module in callers:
+        monkeypatch.setattr(f"{module}.infer_type", infer_type)
+
+    # Twice, so the second time every shape is in the memo
+    for _ in range(2):
+        for path in sorted((current_path / "cwl").glob("**/*.cwl")):
+            Document(path.as_uri(), str(tmp_path), path.read_text(), 1, type_dicts, incremental=False)
+
+    assert calls[0] > 1000
+    assert differences == []
+
+
+def test_explicit_class(monkeypatch):
+    type_dicts = load_type_dicts()
+    allowed_types = type_dicts["v1.0"]["CommandLineTool"].fields["requirements"].types[0].types
+    assert isinstance(allowed_types, typeinference.TypeList)
+    assert allowed_types[allowed_types.names["DockerRequirement"]].name == "DockerRequirement"
+
+    # Looked up by name, without checking each allowed type
+    def check_types(*args):
+        raise AssertionError("check_types called")
+
+    monkeypatch.setattr(typeinference, "check_types", check_types)
+
+    node = {"class": "DockerRequirement", "dockerPull": "ubuntu"}
+    assert typeinference.infer_type(node, allowed_types).name == "DockerRequirement"
+
+    unknown = typeinference.infer_type({"class": "NoSuchRequirement"}, allowed_types)
+    assert unknown.name == "NoSuchRequirement"
+    assert "DockerRequirement" in unknown.expected
+
+
+def tool_with_inputs(n_inputs):
+    lines = ["cwlVersion: v1.0", "class: CommandLineTool", "baseCommand: echo", "inputs:"]
+    for n in range(n_inputs):
+        lines += [
+            f"  in{n}:",
+            "    type: string",
+            "    inputBinding:",
+            f"      position: {n}",
+            f"      prefix: --in{n}",
+            f"      valueFrom: $(self + '{n}')"]
+    lines += ["outputs: []"]
+    return "\n".join(lines) + "\n"
+
+
+def test_repeated_shapes_are_decided_once(monkeypatch, tmp_path):
+    type_dicts = load_type_dicts()
+    decisions = [0]
+
+    decide = typeinference._decide
+
+    def counted_decide(*args):
+        decisions[0] += 1
+        return decide(*args)
+
+    monkeypatch.setattr(typeinference, "_decide", counted_decide)
+
+    Document("file:///work/tool1.cwl", str(tmp_path), tool_with_inputs(5), 1, type_dicts, incremental=False)
+    decisions[0] = 0
+    doc = Document("file:///work/tool2.cwl", str(tmp_path), tool_with_inputs(50), 1, type_dicts, incremental=False)
+    # Only the map of inputs itself has a shape not seen before
+    assert decisions[0] == 1
+    assert not doc.problems
+
+    # Expressions are still made for each node
+    expressions = [ln.intelligence_node for ln in doc.code_intelligence.lookup_table
+                   if isinstance(ln.intelligence_node, CWLExpression)]
+    assert len(expressions) == 50
+    assert len({id(e) for e in expressions}) == 50
@@ -31,3 +31,27 @@ def test_connections():
     doc = load(doc_path=path, type_dicts=load_type_dicts())
 
     assert len(doc.problems) == 0
+
+
+def test_connection_messages_are_sorted(tmp_path):
+    path = tmp_path / "wf.cwl"
+    path.write_text("""class: Workflow
+cwlVersion: v1.0
+inputs: {zeta: string, alpha: string, mu: string}
+steps:
+  step1:
+    run:
+      class: CommandLineTool
+      inputs: {z: string, a: string, m: string}
+      outputs: []
+    in:
+      b: alpha
+      z: beta
+    out: []
+outputs: []
+""")
+    doc = load(doc_path=path, type_dicts=load_type_dicts())
+    assert sorted(p.message for p in doc.problems) == [
+        "Expecting one of: ['a', 'm', 'z']",
+        "No such workflow input. Expecting one of ['alpha', 'mu', 'zeta']",
+        "Unused input", "Unused input", "Unused input"]
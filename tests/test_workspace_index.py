@@ -0,0 +1,157 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import os
+import pathlib
+import shutil
+import threading
+
+from benten.code.workspaceindex import WorkspaceIndex, index_path_for
+from benten.langserver.lspobjects import Position, SymbolKind
+
+from test_langserver import make_server, wait_for
+
+current_path = pathlib.Path(__file__).parent
+
+
+def make_tree(tmp_path):
+    misc = current_path / "cwl" / "misc"
+    root = tmp_path / "ws"
+    (root / "sub").mkdir(parents=True)
+    shutil.copy(misc / "clt1.cwl", root / "clt1.cwl")
+    shutil.copy(misc / "wf-port-completer.cwl", root / "wf-port-completer.cwl")
+    shutil.copy(misc / "cl-schemadef-import.cwl", root / "sub" / "cl-schemadef-import.cwl")
+    return root.resolve()
+
+
+def make_index(tmp_path, root):
+    index = WorkspaceIndex(index_path=index_path_for(tmp_path / "scratch", [root]))
+    index.set_roots([root])
+    index.load()
+    index.refresh()
+    return index
+
+
+def test_symbols_and_references(tmp_path):
+    root = make_tree(tmp_path)
+    index = make_index(tmp_path, root)
+    assert index.parsed == 3
+
+    symbols = index.symbols("STEP")
+    assert [(s.name, s.kind, s.containerName) for s in symbols] == [
+        ("step1", SymbolKind.Class, "wf-port-completer"),
+        ("step2", SymbolKind.Class, "wf-port-completer")]
+    assert symbols[0].location.range.start.line == 7
+
+    [clt] = index.symbols("clt1")
+    assert clt.containerName == "CommandLineTool"
+    assert [s.name for s in index.symbols("in1") if s.kind == SymbolKind.Interface] == ["in1", "in1", "in1"]
+
+    wf = root / "wf-port-completer.cwl"
+    references = index.references(root / "clt1.cwl")
+    assert [(r.uri, r.range.start.line, r.range.start.character) for r in references] == [
+        (wf.as_uri(), 8, 9), (wf.as_uri(), 14, 9)]
+
+    # A link that points outside the workspace is indexed too
+    target = index.link_at(root / "sub" / "cl-schemadef-import.cwl", Position(12, 20))
+    assert target == str(root / "sub" / "paired_end_record.yml")
+    assert len(index.references(target)) == 1
+    assert index.link_at(wf, Position(8, 9)) == str(root / "clt1.cwl")
+    assert index.link_at(wf, Position(9, 9)) is None
+
+
+def test_refresh_is_incremental(tmp_path):
+    root = make_tree(tmp_path)
+    index = make_index(tmp_path, root)
+    assert index.index_path.exists()
+
+    # A new session picks up the saved index and parses nothing
+    index = make_index(tmp_path, root)
+    assert index.parsed == 0
+    assert len(index.references(root / "clt1.cwl")) == 2
+
+    wf = root / "wf-port-completer.cwl"
+    wf.write_text(wf.read_text().replace("run: clt1.cwl", "run: sub/clt2.cwl", 1))
+    st = wf.stat()
+    os.utime(wf, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    (root / "clt1.cwl").rename(root / "clt3.cwl")
+
+    index.refresh(max_age=60)
+    assert index.parsed == 0
+
+    index.refresh()
+    assert index.parsed == 2
+    assert len(index.references(root / "clt1.cwl")) == 1
+    assert len(index.references(root / "sub" / "clt2.cwl")) == 1
+    assert str(root / "clt1.cwl") not in index.files
+
+
+def test_workspace_requests(tmp_path):
+    root = make_tree(tmp_path)
+    server, conn = make_server()
+    server.config.scratch_path = tmp_path / "scratch"
+    server.workspace_index = None
+    server._start_workspace_index({"workspaceFolders": [{"uri": root.as_uri(), "name": "ws"}]})
+    wait_for(lambda: server.workspace_index.last_refresh is not None)
+
+    wf_uri = (root / "wf-port-completer.cwl").as_uri()
+    server.handle({"id": 1, "method": "workspace/symbol", "params": {"query": "step2"}})
+    server.handle({"id": 2, "method": "textDocument/references", "params": {
+        "textDocument": {"uri": wf_uri}, "position": {"line": 8, "character": 12},
+        "context": {"includeDeclaration": False}}})
+    server.handle({"id": 3, "method": "textDocument/references", "params": {
+        "textDocument": {"uri": (root / "clt1.cwl").as_uri()}, "position": {"line": 0, "character": 0},
+        "context": {"includeDeclaration": True}}})
+
+    responses = dict(conn.responses)
+    assert [s["name"] for s in responses[1]] == ["step2"]
+    assert responses[1][0]["location"]["uri"] == wf_uri
+    assert [r["range"]["start"]["line"] for r in responses[2]] == [8, 14]
+    assert [r["uri"] for r in responses[3]] == [(root / "clt1.cwl").as_uri(), wf_uri, wf_uri]
+
+
+def test_saved_file_waits_for_refresh(tmp_path):
+    root = make_tree(tmp_path)
+    index = make_index(tmp_path, root)
+
+    wf = root / "wf-port-completer.cwl"
+    wf.write_text(wf.read_text().replace("run: clt1.cwl", "run: sub/clt2.cwl", 1))
+
+    # A refresh is under way: the saved file is indexed once it is done
+    index._refresh_lock.acquire()
+    saved = threading.Thread(target=index.refresh_file, args=(wf,))
+    saved.start()
+    saved.join(timeout=0.2)
+    assert saved.is_alive()
+    assert len(index.references(root / "clt1.cwl")) == 2
+
+    index._refresh_lock.release()
+    saved.join()
+    assert len(index.references(root / "clt1.cwl")) == 1
+    assert len(index.references(root / "sub" / "clt2.cwl")) == 1
+    assert list(index.index_path.parent.glob("*.tmp")) == []
+
+
+def test_index_follows_workspace_folders(tmp_path):
+    root = make_tree(tmp_path)
+    other = (tmp_path / "other").resolve()
+    other.mkdir()
+    shutil.copy(root / "clt1.cwl", other / "clt1.cwl")
+
+    server, conn = make_server()
+    server.config.scratch_path = tmp_path / "scratch"
+    server.workspace_index = None
+    server._start_workspace_index({"workspaceFolders": [{"uri": root.as_uri(), "name": "ws"}]})
+    wait_for(lambda: server.workspace_index.last_refresh is not None)
+
+    server.handle({"method": "workspace/didChangeWorkspaceFolders", "params": {"event": {
+        "added": [{"uri": other.as_uri(), "name": "other"}], "removed": []}}})
+    index_path = index_path_for(tmp_path / "scratch", [other, root])
+    assert server.workspace_index.index_path == index_path
+    wait_for(lambda: index_path.exists() and str(other / "clt1.cwl") in index_path.read_text())
+
+    # A new session on both folders picks up the saved index
+    index = WorkspaceIndex(index_path=index_path_for(tmp_path / "scratch", [root, other]))
+    index.set_roots([root, other])
+    index.load()
+    index.refresh()
+    assert index.parsed == 0
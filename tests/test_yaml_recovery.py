@@ -0,0 +1,73 @@
+#  Copyright (c) 2021 Seven Bridges. See LICENSE
+
+import pathlib
+
+from benten.code.yaml import parse_yaml, yaml_blocks, loaders
+
+from lib import load, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+wf = """class: Workflow
+cwlVersion: v1.0
+inputs:
+  in1: string
+  in2
+steps:
+  step1:
+    run: clt1.cwl
+    in:
+      in1: in1
+    out: [out1]
+outputs: []
+"""
+
+
+def test_missing_colon():
+    for loader in loaders:
+        recoveries = []
+        cwl, problems = parse_yaml(wf, loader=loader, recoveries=recoveries)
+        assert not problems
+        assert recoveries == ["Added ':' to line 5"]
+        assert list(cwl.keys()) == ["class", "cwlVersion", "inputs", "steps", "outputs"]
+        assert cwl["inputs"] == {"in1": "string", "in2": None}
+        assert cwl.lc.key("steps") == (5, 0)
+        assert cwl["steps"]["step1"].lc.key("run") == (7, 4)
+
+        # The same as if the user had typed the ":"
+        complete, _ = parse_yaml(wf.replace("in2", "in2:"), loader=loader)
+        assert cwl == complete
+
+
+def test_unchanged_blocks_are_reused():
+    yaml_blocks.clear()
+    parse_yaml(wf, loader="fast")
+    misses = yaml_blocks.misses
+    parse_yaml(wf.replace("in2", "in2_"), loader="fast")
+    # Only the block being typed in is parsed again
+    assert yaml_blocks.misses == misses + 1
+
+
+def test_flow_style_across_blocks():
+    text = "class: CommandLineTool\narguments: [\n  a, b\n]\ninputs\noutputs: []\n"
+    cwl, problems = parse_yaml(text, loader="fast")
+    assert not problems
+    assert cwl["arguments"] == ["a", "b"]
+    assert "inputs" in cwl
+
+
+def test_not_recovered():
+    text = wf.replace("in1: string", "in1: 'string")
+    for loader in loaders:
+        cwl, problems = parse_yaml(text, loader=loader)
+        assert cwl is None
+        assert len(problems) == 1
+        assert problems[0].code == "YAML err"
+
+
+def test_document_reports_recoveries():
+    type_dicts = load_type_dicts()
+    doc = load(doc_path=current_path / "cwl" / "misc" / "clt1.cwl", type_dicts=type_dicts)
+    assert doc.yaml_recoveries == 0
+    doc.update(doc.text.replace("inputs:", "inputs", 1))
+    assert doc.yaml_recoveries == 1